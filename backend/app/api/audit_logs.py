@@ -1,22 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.database import get_db
 from app.schemas.audit_log import AuditLog
 from app.services.audit_service import AuditService
+from app.core.pagination import InvalidCursorError, set_next_cursor
 
 router = APIRouter()
 
 # Este endpoint recupera el historial de auditoría del sistema con filtros opcionales
 @router.get("/", response_model=List[AuditLog])
 def get_audit_logs(
+    response: Response,
     entity: Optional[str] = None,
     entity_id: Optional[int] = None,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """
-    Get audit logs with optional filtering
+    Get audit logs with optional filtering (cursor paging via X-Next-Cursor, or offset with skip)
     """
-    return AuditService.get_logs(db, entity, entity_id, skip, limit)
+    try:
+        page = AuditService.get_logs(db, entity, entity_id, skip, limit, cursor)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return set_next_cursor(response, page)
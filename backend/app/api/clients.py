@@ -1,10 +1,11 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 
 from ..database import get_db
 from ..models.client import Client as ClientModel
 from ..schemas.client import Client, ClientCreate, ClientUpdate
+from ..core.pagination import paginate_response
 from .deps import get_current_active_user
 from ..models.user import User
 from ..services.audit_service import AuditService
@@ -51,16 +52,17 @@ def create_client(
 # Este endpoint obtiene la lista paginada de todos los clientes registrados
 @router.get("/", response_model=List[Client])
 def read_clients(
+    response: Response,
     db: Session = Depends(get_db),
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_active_user)
 ) -> Any:
     """
-    Retrieve clients.
+    Retrieve clients (cursor paging via X-Next-Cursor, or offset with skip).
     """
-    clients = db.query(ClientModel).offset(skip).limit(limit).all()
-    return clients
+    return paginate_response(response, db.query(ClientModel), [(ClientModel.id, False)], cursor, skip, limit)
 
 # Este endpoint obtiene los detalles de un cliente específico según su ID
 @router.get("/{id}", response_model=Client)
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+from ..database import get_db
+from ..models import User
+from ..services import EventService, TooManySubscribersError
+from .deps import get_current_active_user
+
+router = APIRouter()
+
+# Este endpoint abre un stream Server-Sent Events con los cambios de stock, alertas, ventas y recepciones de OC
+@router.get("/")
+async def stream_events(
+    types: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Eventos: stock.changed, alert.raised, alert.cleared, sale.created, purchase_order.received.
+    types filtra por una lista separada por comas. Un evento resync indica que el cliente se atrasó
+    y debe volver a consultar los endpoints REST.
+    """
+    # La conexión a la base de datos solo se usa para autenticar: liberarla antes de mantener abierto el stream
+    db.close()
+    try:
+        subscriber = EventService.subscribe({name.strip() for name in types.split(",") if name.strip()} if types else None)
+    except TooManySubscribersError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return StreamingResponse(
+        EventService.stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Este endpoint expone la cantidad de clientes conectados al stream de eventos de este proceso
+@router.get("/stats", response_model=dict)
+def get_event_stats(current_user: User = Depends(get_current_active_user)):
+    """Clientes conectados, eventos en cola y resincronizaciones (por proceso)"""
+    return EventService.stats()
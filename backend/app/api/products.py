@@ -1,55 +1,233 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import csv
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from ..database import get_db
-from ..schemas import Product as ProductSchema, ProductCreate, ProductUpdate
-from ..models import Product, User, ProductSupplier
+from ..schemas import Product as ProductSchema, ProductCreate, ProductUpdate, ProductBarcode as ProductBarcodeSchema, ProductBarcodeCreate, ProductLot as ProductLotSchema, ProductScan, ProductImportResult, ProductBulkUpdate, ProductBulkResult, ProductChanges
+from ..models import Product, User, ProductSupplier, ProductBarcode, ProductLot
 from ..models.stock_movement import StockMovement
-from ..services import AlertService, AuditService
+from ..services import AlertService, AuditService, ProductSearchService, ProductCacheService, BarcodeIndexService, ProductImportService, ProductBulkService, ChangeCounterService, ProductChangeService
+from ..core.pagination import paginate_response
+from ..core.projection import Projection, parse_fields, projected_response
 from .deps import get_current_active_user
 
 router = APIRouter()
 
+# Columnas que se pueden pedir con ?fields= (p. ej. fields=id,sku,name,price_sale,stock para el POS)
+PRODUCT_FIELDS = Projection(Product, ProductSchema, computed={"gross_profit": Product.price_sale - Product.price_purchase})
+
 # Este endpoint obtiene la lista de productos y permite aplicar filtros (búsqueda, categoría, bajo stock)
 @router.get("/", response_model=List[ProductSchema])
 def get_products(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     search: Optional[str] = None,
     category: Optional[str] = None,
-    low_stock: Optional[bool] = False
+    low_stock: Optional[bool] = False,
+    fields: Optional[str] = None
 ):
     """
-    Recuperar productos con sus filtros (RF04, RF03)
+    Recuperar productos con sus filtros (RF04, RF03).
+    Paginación por cursor (X-Next-Cursor) u offset con skip.
+    Con search los resultados vienen ordenados por relevancia (índices de búsqueda) y se paginan con skip;
+    search junto con cursor responde 400.
+    Con fields solo se consultan y devuelven esas columnas, sin relaciones anidadas;
+    sin fields las fichas salen del caché del catálogo (validadas contra change_version, con stock leído de la base de datos).
+    Con If-None-Match responde 304 sin consultar los productos si no hubo cambios (ETag).
     """
-    query = db.query(Product).filter(Product.archived == False)
-    
-    if search:
-        query = query.filter(
-            (Product.name.ilike(f"%{search}%")) | 
-            (Product.sku.ilike(f"%{search}%"))
-        )
+    if search and cursor:
+        raise HTTPException(status_code=400, detail="La búsqueda (search) se pagina con skip; no admite cursor")
+    names = parse_fields(PRODUCT_FIELDS, fields)
+    not_modified = ChangeCounterService.not_modified(db, request, response, ("products", "product_supplier"))
+    if not_modified is not None:
+        return not_modified
+    if names:
+        query = PRODUCT_FIELDS.query(db, names, order_columns=[Product.id])
+    else:
+        # Solo IDs, versión y stock: las fichas completas salen del caché (validadas con change_version)
+        query = db.query(Product.id, Product.change_version, Product.stock)
+    query = query.filter(Product.archived == False)
     
     if category:
         query = query.filter(Product.category == category)
         
     if low_stock:
         query = query.filter(Product.stock <= Product.min_stock)
-        
-    return query.offset(skip).limit(limit).all()
+    
+    if search:
+        products = ProductSearchService.apply(query, search).offset(skip).limit(limit).all()
+    else:
+        products = paginate_response(response, query, [(Product.id, False)], cursor, skip, limit)
+    
+    if names:
+        return projected_response(products, names, response)
+    entries = ProductCacheService.get_many(
+        db, [row.id for row in products], current={row.id: (row.change_version, row.stock) for row in products}
+    )
+    return [entries[row.id] for row in products if row.id in entries]
+
+# Este endpoint devuelve solo los productos cambiados, eliminados o archivados desde un token de versión (sincronización del POS)
+@router.get("/changes", response_model=ProductChanges)
+def get_product_changes(
+    since: Optional[int] = Query(None, ge=0),
+    limit: int = Query(1000, ge=1, le=5000),
+    db: Session = Depends(get_db)
+):
+    """
+    Sin since devuelve el catálogo activo completo y el token inicial.
+    Con since devuelve lo cambiado desde ese token (changed) y las bajas (deleted);
+    si has_more es verdadero hay que volver a consultar con el nuevo token.
+    """
+    return ProductChangeService.changes(db, since, limit)
+
+# Este endpoint expone los contadores (aciertos, fallos, desalojos) del caché del catálogo de productos
+@router.get("/cache/stats", response_model=dict)
+def get_product_cache_stats(current_user: User = Depends(get_current_active_user)):
+    """
+    Estadísticas del caché en memoria del catálogo y del índice de códigos de barras (por proceso)
+    """
+    return {**ProductCacheService.stats(), "barcode_index": BarcodeIndexService.stats()}
+
+# Este endpoint resuelve un código escaneado en caja (EAN/UPC, alias o SKU) desde el índice en memoria
+@router.get("/by-code/{code}", response_model=ProductScan, response_model_exclude_none=True)
+def get_product_by_code(code: str, with_stock: bool = False, db: Session = Depends(get_db)):
+    """
+    Respuesta mínima para el POS (id, sku, name, price_sale, unit).
+    El stock solo se incluye con with_stock=true y se lee de la base de datos.
+    """
+    product = BarcodeIndexService.lookup(db, code)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Código no registrado")
+    if with_stock:
+        product = {**product, "stock": db.query(Product.stock).filter(Product.id == product["id"]).scalar()}
+    return product
+
+# Este endpoint lista los códigos de barras y alias registrados para un producto
+@router.get("/{product_id}/barcodes", response_model=List[ProductBarcodeSchema])
+def get_product_barcodes(product_id: int, db: Session = Depends(get_db)):
+    """
+    Códigos de escaneo del producto
+    """
+    return db.query(ProductBarcode).filter(ProductBarcode.product_id == product_id).order_by(ProductBarcode.id).all()
+
+# Este endpoint lista los lotes de un producto en el orden en que se consumen (primero el que vence antes)
+@router.get("/{product_id}/lots", response_model=List[ProductLotSchema])
+def get_product_lots(product_id: int, include_empty: bool = False, db: Session = Depends(get_db)):
+    """
+    Lotes del producto (RF24), orden FEFO; include_empty=true agrega los lotes ya agotados
+    """
+    query = db.query(ProductLot).filter(ProductLot.product_id == product_id)
+    if not include_empty:
+        query = query.filter(ProductLot.quantity > 0)
+    return query.order_by(ProductLot.expiration_date.is_(None), ProductLot.expiration_date, ProductLot.id).all()
+
+# Este endpoint registra un nuevo código de barras o alias para un producto
+@router.post("/{product_id}/barcodes", response_model=ProductBarcodeSchema, status_code=status.HTTP_201_CREATED)
+def add_product_barcode(
+    product_id: int,
+    barcode: ProductBarcodeCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Asociar un código EAN/UPC o alias al producto (único entre todos los productos)
+    """
+    product = db.query(Product).filter(Product.id == product_id).first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    code = BarcodeIndexService.normalize(barcode.code)
+    if not code:
+        raise HTTPException(status_code=400, detail="El código no puede estar vacío")
+    
+    # El código no puede repetirse ni coincidir con el SKU de otro producto
+    owner = db.query(ProductBarcode.product_id).filter(ProductBarcode.code == code).scalar()
+    if owner is None:
+        owner = db.query(Product.id).filter(func.lower(Product.sku) == code.lower(), Product.id != product_id).limit(1).scalar()
+    if owner is not None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"El código {code} ya está asignado al producto #{owner}")
+    
+    db_barcode = ProductBarcode(product_id=product_id, code=code, code_type=barcode.code_type)
+    db.add(db_barcode)
+    
+    # Historial de Auditoría
+    AuditService.log_action(
+        db=db,
+        entity="producto",
+        entity_id=product_id,
+        action="agregar_codigo",
+        user_id=current_user.id,
+        changes={"code": code, "code_type": barcode.code_type},
+        commit=False
+    )
+    
+    db.commit()
+    db.refresh(db_barcode)
+    BarcodeIndexService.refresh(db, product_id)
+    return db_barcode
+
+# Este endpoint elimina un código de barras o alias de un producto
+@router.delete("/{product_id}/barcodes/{code}", status_code=status.HTTP_204_NO_CONTENT)
+def remove_product_barcode(
+    product_id: int,
+    code: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Quitar un código de escaneo del producto
+    """
+    code = BarcodeIndexService.normalize(code)
+    db_barcode = db.query(ProductBarcode).filter(
+        ProductBarcode.product_id == product_id,
+        ProductBarcode.code == code
+    ).first()
+    if not db_barcode:
+        raise HTTPException(status_code=404, detail="Código no encontrado para este producto")
+    
+    db.delete(db_barcode)
+    
+    # Historial de Auditoría
+    AuditService.log_action(
+        db=db,
+        entity="producto",
+        entity_id=product_id,
+        action="quitar_codigo",
+        user_id=current_user.id,
+        changes={"code": code},
+        commit=False
+    )
+    
+    db.commit()
+    BarcodeIndexService.refresh(db, product_id)
+    return None
 
 # Este endpoint recupera un producto específico usando su ID
 @router.get("/{product_id}", response_model=ProductSchema)
 def get_product(product_id: int, db: Session = Depends(get_db)):
     """
-    Obtener producto por ID (RF02)
+    Obtener producto por ID (RF02); servido desde el caché del catálogo (el stock se lee siempre fresco)
     """
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = ProductCacheService.get(db, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return product
 
+# Este helper rechaza (409) un SKU que coincide con el código de barras de otro producto (son claves del mismo índice de escaneo)
+def _check_sku_against_barcodes(db: Session, sku: str, product_id: Optional[int] = None):
+    code = BarcodeIndexService.normalize(sku)
+    query = db.query(ProductBarcode.product_id).filter(ProductBarcode.code == code)
+    if product_id is not None:
+        query = query.filter(ProductBarcode.product_id != product_id)
+    owner = query.limit(1).scalar()
+    if owner is not None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"El código {code} ya está asignado al producto #{owner}")
+
 # Este endpoint crea un nuevo producto, asocia proveedores si aplica y registra el stock inicial
 @router.post("/", response_model=ProductSchema, status_code=status.HTTP_201_CREATED)
 def create_product(
@@ -64,6 +242,7 @@ def create_product(
     existing = db.query(Product).filter(Product.sku == product.sku).first()
     if existing:
         raise HTTPException(status_code=400, detail=f"Product with SKU {product.sku} already exists")
+    _check_sku_against_barcodes(db, product.sku)
     
     # Extraer el supplier_id (proveedor) si está presente
     supplier_id = product.supplier_id
@@ -102,13 +281,66 @@ def create_product(
         entity_id=db_product.id,
         action="crear",
         user_id=current_user.id,
-        changes=product.model_dump(mode='json')
+        changes=product.model_dump(mode='json'),
+        commit=False
     )
     
+    ProductCacheService.invalidate(db, db_product.id)
+    ProductChangeService.touch(db, db_product.id)
+    AlertService.track(db, db_product.id)
     db.commit()
     db.refresh(db_product)
+    BarcodeIndexService.refresh(db, db_product.id)
     return db_product
 
+# Este endpoint importa productos en bloque desde un archivo CSV o NDJSON (una fila/línea por producto)
+@router.post("/import", response_model=ProductImportResult)
+def import_products(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Alta masiva de productos (RF03) con las mismas validaciones que POST /api/products.
+    El archivo se lee como flujo y se guarda por bloques (product_import_chunk_size filas por transacción);
+    las filas inválidas o con SKU existente se informan en errors sin detener la importación.
+    """
+    try:
+        file_format = format or ProductImportService.detect_format(file.filename, file.content_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        return ProductImportService.import_rows(
+            db, ProductImportService.iter_rows(file.file, file_format), user_id=current_user.id
+        )
+    except UnicodeDecodeError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="El archivo debe estar codificado en UTF-8")
+    except csv.Error as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"CSV inválido: {str(e)}")
+
+# Este endpoint aplica el mismo cambio (valor fijo, porcentaje o margen sobre el costo) a todos los productos de un filtro
+@router.patch("/bulk", response_model=ProductBulkResult)
+def bulk_update_products(
+    bulk: ProductBulkUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Actualización masiva (RF04) con un único UPDATE por conjunto; devuelve el valor anterior y el nuevo
+    de cada producto y deja un registro de auditoría por producto.
+    """
+    try:
+        changes = ProductBulkService.update(
+            db, bulk.filter, bulk.field, bulk.operation, bulk.value, user_id=current_user.id
+        )
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"updated": len(changes), "changes": changes}
+
 # Este endpoint actualiza la información de un producto existente y registra auditoría
 @router.put("/{product_id}", response_model=ProductSchema)
 def update_product(
@@ -131,6 +363,8 @@ def update_product(
     # Actualizar solo los campos que han sido alterados en la solicitud
     update_data = product_update.model_dump(exclude_unset=True)
     supplier_id = update_data.pop("supplier_id", None)
+    if update_data.get("sku") and update_data["sku"] != product.sku:
+        _check_sku_against_barcodes(db, update_data["sku"], product.id)
     
     for field, value in update_data.items():
         setattr(product, field, value)
@@ -176,11 +410,16 @@ def update_product(
         changes={
             "nombre_actual": product.name,
             **{field: {"old": old_values[field], "new": value} for field, value in update_data.items() if field in old_values}
-        }
+        },
+        commit=False
     )
     
+    ProductCacheService.invalidate(db, product.id)
+    ProductChangeService.touch(db, product.id)
+    AlertService.track(db, product.id)
     db.commit()
     db.refresh(product)
+    BarcodeIndexService.refresh(db, product.id)
     return product
 
 # Este endpoint elimina un producto permanentemente (falla si el producto tiene historial)
@@ -211,9 +450,13 @@ def delete_product(
             entity_id=p_id,
             action="eliminar",
             user_id=current_user.id,
-            changes={"nombre": p_name}
+            changes={"nombre": p_name},
+            commit=False
         )
         
+        ProductCacheService.invalidate(db, p_id)
+        ProductChangeService.delete(db, product)
+        AlertService.track(db, p_id)
         db.commit()
     except Exception:
         db.rollback()
@@ -221,6 +464,7 @@ def delete_product(
             status_code=400, 
             detail="No se puede eliminar el producto porque tiene historial (ventas o movimientos). Te recomendamos archivarlo en su lugar."
         )
+    BarcodeIndexService.refresh(db, p_id)
     return None
 
 # Este endpoint archiva o desarchiva un producto (borrado lógico) sin afectar el historial
@@ -245,11 +489,16 @@ def archive_product(
         entity="producto",
         entity_id=product.id,
         action="archivar" if product.archived else "desarchivar",
-        user_id=current_user.id
+        user_id=current_user.id,
+        commit=False
     )
     
+    ProductCacheService.invalidate(db, product.id)
+    ProductChangeService.touch(db, product.id)
+    AlertService.track(db, product.id)
     db.commit()
     db.refresh(product)
+    BarcodeIndexService.refresh(db, product.id)
     return product
 
 # Este endpoint devuelve todos los productos cuyo stock actual sea menor o igual a su stock mínimo
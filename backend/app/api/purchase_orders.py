@@ -1,31 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 from ..database import get_db
 from ..schemas import PurchaseOrder as PurchaseOrderSchema, PurchaseOrderCreate, PurchaseOrderReceive
-from ..models import PurchaseOrder, PurchaseOrderItem, User, ProductSupplier
-from ..services import StockService, AuditService
+from ..models import PurchaseOrder, PurchaseOrderItem, ProductSupplier, User
+from ..services import StockService, AuditService, IdempotencyService, IdempotencyConflictError, EventService, LotService
+from ..core.pagination import paginate_response
+from ..core.loading import load_for
+from ..core.projection import Projection, parse_fields, projected_response
 from .deps import get_current_active_user
 
 router = APIRouter()
 
+# Columnas de la orden de compra que se pueden pedir con ?fields=
+PURCHASE_ORDER_FIELDS = Projection(PurchaseOrder, PurchaseOrderSchema)
+
 # Este endpoint obtiene el historial paginado de todas las órdenes de compra emitidas
 @router.get("/", response_model=List[PurchaseOrderSchema])
 def get_purchase_orders(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Consultar flujo de órdenes de compra"""
-    pos = db.query(PurchaseOrder).order_by(PurchaseOrder.created_at.desc()).offset(skip).limit(limit).all()
-    return pos
+    """Consultar flujo de órdenes de compra (paginación por cursor X-Next-Cursor u offset con skip; fields= proyecta columnas)"""
+    names = parse_fields(PURCHASE_ORDER_FIELDS, fields)
+    if names:
+        query = PURCHASE_ORDER_FIELDS.query(db, names, order_columns=[PurchaseOrder.created_at, PurchaseOrder.id])
+    else:
+        query = load_for(db.query(PurchaseOrder), PurchaseOrder, PurchaseOrderSchema)
+    pos = paginate_response(
+        response, query,
+        [(PurchaseOrder.created_at, True), (PurchaseOrder.id, True)], cursor, skip, limit
+    )
+    return projected_response(pos, names, response) if names else pos
 
 # Este endpoint consulta el máximo detalle de una orden de compra usando su ID único
 @router.get("/{po_id}", response_model=PurchaseOrderSchema)
 def get_purchase_order(po_id: int, db: Session = Depends(get_db)):
     """Localizar una orden por su número de control"""
-    po = db.query(PurchaseOrder).filter(PurchaseOrder.id == po_id).first()
+    po = load_for(db.query(PurchaseOrder), PurchaseOrder, PurchaseOrderSchema).filter(PurchaseOrder.id == po_id).first()
     if not po:
         raise HTTPException(status_code=404, detail="Purchase order not found")
     return po
@@ -42,11 +59,16 @@ def create_purchase_order(
     for item in po.items:
         if item.quantity <= 0:
             raise HTTPException(status_code=400, detail="Las cantidades deben ser mayores a 0")
-    # Validar que los productos pertenecen al catálogo del proveedor
-    allowed_product_ids = [ps.product_id for ps in db.query(ProductSupplier).filter(ProductSupplier.supplier_id == po.supplier_id).all()]
+    # Validar que los productos pertenecen al catálogo del proveedor (una consulta IN directa: el caché es por proceso)
+    catalogue_ids = {
+        product_id for (product_id,) in db.query(ProductSupplier.product_id).filter(
+            ProductSupplier.supplier_id == po.supplier_id,
+            ProductSupplier.product_id.in_({item.product_id for item in po.items})
+        ).all()
+    }
     
     for item in po.items:
-        if item.product_id not in allowed_product_ids:
+        if item.product_id not in catalogue_ids:
             raise HTTPException(
                 status_code=400, 
                 detail=f"El producto ID {item.product_id} no pertenece al catálogo de este proveedor"
@@ -78,10 +100,7 @@ def create_purchase_order(
         )
         db.add(po_item)
     
-    db.commit()
-    db.refresh(db_po)
-    
-    # Audit Log
+    # Audit Log (en la misma transacción que la orden)
     AuditService.log_action(
         db=db,
         entity="orden_compra",
@@ -90,11 +109,15 @@ def create_purchase_order(
         user_id=current_user.id,
         changes={
             "total": db_po.total, 
-            "items_count": len(db_po.items),
+            "items_count": len(po.items),
             "name": db_po.supplier.name if db_po.supplier else f"Proveedor #{db_po.supplier_id}"
-        }
+        },
+        commit=False
     )
     
+    db.commit()
+    db.refresh(db_po)
+    
     return db_po
 
 # Este endpoint funciona como un interruptor ("Toggle") para cambiar rápidamente el estado de pagado a no-pagado (y viceversa) de la orden
@@ -135,11 +158,24 @@ def receive_purchase_order(
     po_id: int, 
     reception_data: PurchaseOrderReceive,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """
-    Registrar ingreso parcial de artículos a una orden (RF36 - Recepción Parcial)
+    Registrar ingreso parcial de artículos a una orden (RF36 - Recepción Parcial).
+    Con Idempotency-Key un reintento devuelve la orden sin volver a sumar stock.
     """
+    if idempotency_key:
+        try:
+            replayed_id = IdempotencyService.begin(
+                db, "purchase_order_receive", idempotency_key,
+                IdempotencyService.fingerprint(str(po_id), reception_data.model_dump_json()), current_user.id
+            )
+        except IdempotencyConflictError as e:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+        if replayed_id is not None:
+            return get_purchase_order(replayed_id, db)
+
     po = db.query(PurchaseOrder).filter(PurchaseOrder.id == po_id).first()
     if not po:
         raise HTTPException(status_code=404, detail="Purchase order not found")
@@ -181,25 +217,45 @@ def receive_purchase_order(
                 reference_id=po_id,
                 user_id=current_user.id
             )
+            LotService.receive(
+                db,
+                product_id=item.product_id,
+                quantity=recv_item.received_quantity,
+                lot_code=recv_item.lot_code or f"OC{po_id}-{item.id}",
+                expiration_date=recv_item.expiration_date,
+                purchase_order_id=po_id
+            )
         
         # Validar si este recibo cierra por completo la orden o no
         all_completed = all(item.received_quantity >= item.quantity for item in po.items)
         po.status = "completado" if all_completed else "parcial"
         po.received_at = datetime.now()
         
-        db.commit()
-        db.refresh(po)
+        if idempotency_key:
+            IdempotencyService.complete(db, "purchase_order_receive", idempotency_key, po.id)
         
-        # Historial de Auditoría
+        # Historial de Auditoría (en la misma transacción que la recepción)
         AuditService.log_action(
             db=db,
             entity="orden_compra",
             entity_id=po.id,
             action="recibir",
             user_id=current_user.id,
-            changes={"status": po.status}
+            changes={"status": po.status},
+            commit=False
+        )
+        EventService.emit(
+            db, "purchase_order.received",
+            purchase_order_id=po.id, status=po.status,
+            items=[
+                {"product_id": po_items[recv_item.item_id].product_id, "quantity": recv_item.received_quantity}
+                for recv_item in reception_data.items
+            ]
         )
         
+        db.commit()
+        db.refresh(po)
+        
         return po
         
     except HTTPException:
@@ -230,7 +286,8 @@ def delete_purchase_order(
         entity="orden_compra",
         entity_id=po.id,
         action="eliminar",
-        user_id=current_user.id
+        user_id=current_user.id,
+        commit=False
     )
     
     db.delete(po)
@@ -1,19 +1,25 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import func
+from typing import Optional
 from ..database import get_db
-from ..models import Product, Sale, SaleItem
-from ..services import AlertService
-from datetime import date
+from ..models import Product, Sale, SaleItem, DailySalesRollup
+from ..services import AlertService, ChangeCounterService, StockLedgerService, RollupService
+from ..core.date_window import apply_date_window
+from datetime import date, datetime, time, timedelta
 
 router = APIRouter()
 
 # Este endpoint genera un reporte completo sobre la valoración actual de todo el inventario
 @router.get("/valuation")
-def get_stock_valuation(db: Session = Depends(get_db)):
+def get_stock_valuation(request: Request, response: Response, db: Session = Depends(get_db)):
     """
-    Get stock valuation report
+    Get stock valuation report (304 con If-None-Match si el inventario no cambió)
     """
+    not_modified = ChangeCounterService.not_modified(db, request, response, ("products",))
+    if not_modified is not None:
+        return not_modified
+
     products = db.query(Product).filter(Product.archived == False).all()
     
     valuation_data = []
@@ -49,85 +55,199 @@ def get_stock_valuation(db: Session = Depends(get_db)):
         "total_products": len(valuation_data)
     }
 
-from sqlalchemy.orm import joinedload
+# Este endpoint reconstruye el inventario al cierre de una fecha pasada (último corte de stock + movimientos posteriores)
+@router.get("/stock-as-of")
+def get_stock_as_of(
+    as_of_date: date = Query(..., alias="date"),
+    db: Session = Depends(get_db)
+):
+    """
+    Stock per product at the end of the given day, from the nearest stock checkpoint plus the
+    movements since then. Valued at the current purchase/sale prices (historical costs are not stored).
+    """
+    at = StockLedgerService.day_start(as_of_date + timedelta(days=1))
+    checkpoint_at, rows = StockLedgerService.stock_as_of(db, at)
+
+    products = []
+    total_cost_value = 0
+    total_sale_value = 0
+    for row in rows:
+        stock = int(row.quantity)
+        cost_value = stock * row.price_purchase
+        sale_value = stock * row.price_sale
+        total_cost_value += cost_value
+        total_sale_value += sale_value
+        products.append({
+            "id": row.id,
+            "name": row.name,
+            "sku": row.sku,
+            "category": row.category,
+            "stock": stock,
+            "unit_cost": row.price_purchase,
+            "unit_price": row.price_sale,
+            "total_cost": round(cost_value, 2),
+            "total_sale": round(sale_value, 2)
+        })
+
+    return {
+        "date": as_of_date.isoformat(),
+        "as_of": at.isoformat(),
+        "checkpoint_at": checkpoint_at.isoformat() if checkpoint_at else None,
+        "products": products,
+        "total_units": sum(product["stock"] for product in products),
+        "total_cost_value": round(total_cost_value, 2),
+        "total_sale_value": round(total_sale_value, 2),
+        "total_products": len(products)
+    }
+
+# Este helper indica si un límite de ventana cae exactamente en la medianoche (se puede resolver con el rollup diario)
+def _is_day_aligned(value: Optional[datetime]) -> bool:
+    return value is None or value.time() == time.min
+
+# Este helper filtra el rollup diario por el rango de fechas semiabierto [desde, hasta)
+def _rollup_window(query, date_from: Optional[date], date_to: Optional[date]):
+    if date_from is not None:
+        query = query.filter(DailySalesRollup.sale_date >= date_from)
+    if date_to is not None:
+        query = query.filter(DailySalesRollup.sale_date < date_to)
+    return query
+
+# Este helper calcula el resumen de ventas leyendo solo las filas del rollup diario
+def _sales_summary_from_rollup(db: Session, date_from: Optional[date], date_to: Optional[date]):
+    totals = _rollup_window(
+        db.query(
+            func.coalesce(func.sum(DailySalesRollup.sales_count), 0),
+            func.coalesce(func.sum(DailySalesRollup.revenue), 0),
+            func.coalesce(func.sum(DailySalesRollup.cogs), 0),
+            func.coalesce(func.sum(DailySalesRollup.discount), 0),
+            func.coalesce(func.sum(DailySalesRollup.units_sold), 0)
+        ),
+        date_from, date_to
+    ).one()
+
+    payment_methods = {
+        method: int(count)
+        for method, count in _rollup_window(
+            db.query(DailySalesRollup.payment_method, func.sum(DailySalesRollup.sales_count)),
+            date_from, date_to
+        ).group_by(DailySalesRollup.payment_method).all()
+        if count
+    }
+    return totals, payment_methods
+
+# Este helper calcula el resumen de ventas con agregaciones sobre sales/sale_items (ventanas que no caen en días completos)
+def _sales_summary_from_sales(db: Session, date_from: Optional[datetime], date_to: Optional[datetime]):
+    total_sales, total_revenue, total_discount = apply_date_window(
+        db.query(
+            func.count(Sale.id),
+            func.coalesce(func.sum(Sale.total), 0),
+            func.coalesce(func.sum(Sale.discount), 0)
+        ),
+        Sale.created_at, date_from, date_to
+    ).one()
+
+    # COGS con el costo capturado en cada línea al momento de la venta (sin join contra products)
+    items_query = db.query(
+        func.coalesce(func.sum(SaleItem.line_cost), 0),
+        func.coalesce(func.sum(SaleItem.quantity), 0)
+    ).select_from(SaleItem)
+    if date_from is not None or date_to is not None:
+        items_query = apply_date_window(
+            items_query.join(Sale, Sale.id == SaleItem.sale_id), Sale.created_at, date_from, date_to
+        )
+    total_cost_of_sales, total_units_sold = items_query.one()
+
+    payment_methods = dict(
+        apply_date_window(
+            db.query(Sale.payment_method, func.count(Sale.id)),
+            Sale.created_at, date_from, date_to
+        ).group_by(Sale.payment_method).all()
+    )
+    return (total_sales, total_revenue, total_cost_of_sales, total_discount, total_units_sold), payment_methods
 
 # Este endpoint devuelve un resumen gerencial de las ventas (ingresos, costos y ganancias netas)
 @router.get("/sales-summary")
-def get_sales_summary(db: Session = Depends(get_db)):
+def get_sales_summary(
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    db: Session = Depends(get_db)
+):
     """
-    Get sales analysis summary.
+    Get sales analysis summary, optionally restricted to the half-open window [from, to).
+    Whole-day windows are served from daily_sales_rollup; other windows aggregate sales in SQL.
     total_units_sold = SUM(quantity) de sale_items (unidades vendidas, no registros).
     """
-    # Optimize with joinedload to avoid N+1 query problem during cost calculation
-    sales = db.query(Sale).options(
-        joinedload(Sale.items).joinedload(SaleItem.product)
-    ).all()
-    
-    total_sales = len(sales)
-    total_revenue = sum(sale.total for sale in sales)
-    total_discount = sum(sale.discount for sale in sales)
-    
-    # Calculate real cost of goods sold (COGS) to find net profit
-    total_cost_of_sales = 0
-    for sale in sales:
-        for item in sale.items:
-            # We use the product's CURRENT purchase price as a proxy if it wasn't captured at sale time
-            # Ideally, sale_items should have the purchase_price at that moment.
-            total_cost_of_sales += (item.quantity * (item.product.price_purchase if item.product else 0))
+    if _is_day_aligned(date_from) and _is_day_aligned(date_to):
+        totals, payment_methods = _sales_summary_from_rollup(
+            db,
+            date_from.date() if date_from else None,
+            date_to.date() if date_to else None
+        )
+    else:
+        totals, payment_methods = _sales_summary_from_sales(db, date_from, date_to)
 
+    total_sales, total_revenue, total_cost_of_sales, total_discount, total_units_sold = totals
+    total_sales = int(total_sales)
+    total_revenue = float(total_revenue)
+    total_cost_of_sales = float(total_cost_of_sales)
     net_profit = total_revenue - total_cost_of_sales
-    
-    # SUM(quantity) de sale_items - unidades totales vendidas
-    total_units_result = db.query(func.coalesce(func.sum(SaleItem.quantity), 0)).scalar()
-    total_units_sold = int(total_units_result) if total_units_result else 0
-
-    # Daily sales
-    today = date.today()
-    daily_sales = db.query(Sale).filter(func.date(Sale.created_at) == today).all()
-    daily_revenue = sum(sale.total for sale in daily_sales)
-    
-    payment_methods = {}
-    for sale in sales:
-        method = sale.payment_method
-        payment_methods[method] = payment_methods.get(method, 0) + 1
+
+    # Daily sales: una sola fecha del rollup
+    today = RollupService.current_day(db)
+    daily_revenue = _rollup_window(
+        db.query(func.coalesce(func.sum(DailySalesRollup.revenue), 0)),
+        today, today + timedelta(days=1)
+    ).scalar()
     
     return {
         "total_sales": total_sales,
         "total_revenue": round(total_revenue, 2),
         "total_cost_of_sales": round(total_cost_of_sales, 2),
         "net_profit": round(net_profit, 2),
-        "daily_revenue": round(daily_revenue, 2),
-        "total_discount": round(total_discount, 2),
-        "total_units_sold": total_units_sold,
+        "daily_revenue": round(float(daily_revenue), 2),
+        "total_discount": round(float(total_discount), 2),
+        "total_units_sold": int(total_units_sold),
         "payment_methods": payment_methods,
         "average_sale": round(total_revenue / total_sales, 2) if total_sales > 0 else 0
     }
 
-# Este endpoint elabora el reporte de corte de caja de las ventas realizadas en el día actual
+# Este endpoint elabora el reporte de corte de caja del día actual o de cualquier rango de días pasado
 @router.get("/daily-closure")
-def get_daily_closure(db: Session = Depends(get_db)):
+def get_daily_closure(
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    db: Session = Depends(get_db)
+):
     """
-    Daily closure report (RF10/Cierre de Caja)
+    Daily closure report (RF10/Cierre de Caja).
+    Sin parámetros cubre el día actual; con from/to cubre el rango [from, to) leyendo el rollup diario.
     """
-    today = date.today()
-    sales = db.query(Sale).filter(func.date(Sale.created_at) == today).all()
-    
-    total_revenue = sum(sale.total for sale in sales)
-    total_discount = sum(sale.discount for sale in sales)
+    date_from = date_from or RollupService.current_day(db)
+    date_to = date_to or date_from + timedelta(days=1)
+
+    rows = _rollup_window(
+        db.query(
+            DailySalesRollup.payment_method,
+            func.sum(DailySalesRollup.sales_count).label("sales_count"),
+            func.sum(DailySalesRollup.units_sold).label("units_sold"),
+            func.sum(DailySalesRollup.revenue).label("revenue"),
+            func.sum(DailySalesRollup.discount).label("discount")
+        ),
+        date_from, date_to
+    ).group_by(DailySalesRollup.payment_method).all()
     
     methods = {}
-    items_count = 0
-    
-    for sale in sales:
-        methods[sale.payment_method] = methods.get(sale.payment_method, 0.0) + sale.total
-        items_count += sum(item.quantity for item in sale.items)
+    for row in rows:
+        if row.sales_count:
+            methods[row.payment_method] = round(float(row.revenue or 0), 2)
         
     return {
-        "date": today.isoformat(),
-        "total_sales_count": len(sales),
-        "total_items_sold": items_count,
-        "total_revenue": round(total_revenue, 2),
-        "total_discount": round(total_discount, 2),
+        "date": date_from.isoformat(),
+        "date_to": date_to.isoformat(),
+        "total_sales_count": int(sum(row.sales_count or 0 for row in rows)),
+        "total_items_sold": int(sum(row.units_sold or 0 for row in rows)),
+        "total_revenue": round(sum(float(row.revenue or 0) for row in rows), 2),
+        "total_discount": round(sum(float(row.discount or 0) for row in rows), 2),
         "by_payment_method": methods
     }
 
@@ -135,17 +255,24 @@ def get_daily_closure(db: Session = Depends(get_db)):
 @router.get("/top-products")
 def get_top_products(db: Session = Depends(get_db)):
     """
-    Get top 5 products by units sold (quantity).
+    Get top 5 products by units sold (quantity), read from the daily rollup.
     """
+    total_sold = func.sum(DailySalesRollup.units_sold)
+    top = db.query(
+        DailySalesRollup.product_id.label("product_id"),
+        total_sold.label("total_sold")
+    ).group_by(DailySalesRollup.product_id) \
+     .order_by(total_sold.desc()) \
+     .limit(5) \
+     .subquery()
+
     results = db.query(
         Product.id,
         Product.name,
         Product.stock,
-        func.sum(SaleItem.quantity).label("total_sold")
-    ).join(SaleItem, Product.id == SaleItem.product_id) \
-     .group_by(Product.id) \
-     .order_by(func.sum(SaleItem.quantity).desc()) \
-     .limit(5) \
+        top.c.total_sold
+    ).join(top, top.c.product_id == Product.id) \
+     .order_by(top.c.total_sold.desc()) \
      .all()
     
     top_products = []
@@ -161,8 +288,25 @@ def get_top_products(db: Session = Depends(get_db)):
 
 # Este endpoint consolida y devuelve todas las alertas activas del sistema (stock bajo y fechas de expiración)
 @router.get("/alerts")
-def get_all_alerts(db: Session = Depends(get_db)):
+def get_all_alerts(request: Request, response: Response, db: Session = Depends(get_db)):
     """
-    Get all inventory alerts (low stock + expiring)
+    Get all inventory alerts (low stock + expiring); 304 con If-None-Match si nada cambió
     """
+    # Las alertas de vencimiento también dependen de la fecha del día
+    not_modified = ChangeCounterService.not_modified(
+        db, request, response, ("inventory_alerts", "products", "product_lots"), date.today().isoformat()
+    )
+    if not_modified is not None:
+        return not_modified
     return AlertService.get_all_alerts(db)
+
+# Este endpoint devuelve solo la cantidad de alertas por tipo y severidad (indicador del panel, sin leer productos)
+@router.get("/alerts/counts")
+def get_alert_counts(request: Request, response: Response, db: Session = Depends(get_db)):
+    """
+    Alert badge counts from inventory_alerts; 304 con If-None-Match si las alertas no cambiaron
+    """
+    not_modified = ChangeCounterService.not_modified(db, request, response, ("inventory_alerts",))
+    if not_modified is not None:
+        return not_modified
+    return AlertService.get_alert_counts(db)
@@ -0,0 +1,72 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+from typing import List
+from ..database import get_db
+from ..schemas import Reservation as ReservationSchema, ReservationCreate, ProductAvailability
+from ..models import StockReservation, User
+from ..services import ReservationService, ReservationUnavailableError, InsufficientStockError
+from ..core.loading import load_for
+from .deps import get_current_active_user
+
+router = APIRouter()
+
+# Este endpoint reserva stock para un carrito abierto durante un tiempo limitado
+@router.post("/", response_model=ReservationSchema, status_code=status.HTTP_201_CREATED)
+def create_reservation(
+    reservation: ReservationCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Retener cantidades hasta expires_at. Las ventas de otros carritos no pueden tomar esas unidades;
+    la venta que envía este reservation_id las consume. Vencida la reserva, el stock vuelve a estar disponible.
+    """
+    try:
+        return ReservationService.create(db, reservation.items, reservation.ttl_seconds, user_id=current_user.id)
+    except InsufficientStockError as e:
+        db.rollback()
+        missing = any(shortfall["reason"] == "not_found" for shortfall in e.shortfalls)
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND if missing else status.HTTP_409_CONFLICT,
+            content={"detail": str(e), "shortfalls": e.shortfalls}
+        )
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Este endpoint devuelve el stock disponible para vender (stock menos reservas activas) de varios productos
+@router.get("/availability", response_model=List[ProductAvailability])
+def get_availability(
+    product_id: List[int] = Query(..., min_length=1),
+    db: Session = Depends(get_db)
+):
+    """Disponible = stock - unidades retenidas por reservas activas y vigentes"""
+    return ReservationService.availability(db, product_id)
+
+# Este endpoint obtiene una reserva por su ID
+@router.get("/{reservation_id}", response_model=ReservationSchema)
+def get_reservation(reservation_id: int, db: Session = Depends(get_db)):
+    """Consultar estado, vencimiento y líneas de una reserva"""
+    reservation = load_for(db.query(StockReservation), StockReservation, ReservationSchema) \
+        .filter(StockReservation.id == reservation_id).first()
+    if not reservation:
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    return reservation
+
+# Este endpoint libera una reserva antes de su vencimiento (carrito cancelado)
+@router.delete("/{reservation_id}", status_code=status.HTTP_204_NO_CONTENT)
+def release_reservation(
+    reservation_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Devolver de inmediato al disponible las unidades retenidas"""
+    if db.get(StockReservation, reservation_id) is None:
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    try:
+        ReservationService.release(db, reservation_id)
+    except ReservationUnavailableError as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return None
@@ -1,15 +1,19 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
 from sqlalchemy.orm import Session
 
 from ..database import get_db
 from ..models.return_sale import ReturnSale as ReturnModel, ReturnItem as ReturnItemModel
 from ..models.sale import Sale as SaleModel
 from ..schemas.return_sale import ReturnSale, ReturnSaleCreate
+from ..core.pagination import paginate_response
+from ..core.loading import load_for
 from .deps import get_current_active_user
 from ..models.user import User
 from ..services.stock_service import StockService
 from ..services.audit_service import AuditService
+from ..services.rollup_service import RollupService
+from ..services.idempotency_service import IdempotencyService, IdempotencyConflictError
 
 router = APIRouter()
 
@@ -19,11 +23,23 @@ def create_return(
     *,
     db: Session = Depends(get_db),
     return_in: ReturnSaleCreate,
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ) -> Any:
     """
     Create a new return and restore stock.
+    A retried request with the same Idempotency-Key returns the original return.
     """
+    if idempotency_key:
+        try:
+            replayed_id = IdempotencyService.begin(
+                db, "return", idempotency_key, IdempotencyService.fingerprint(return_in.model_dump_json()), current_user.id
+            )
+        except IdempotencyConflictError as e:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+        if replayed_id is not None:
+            return load_for(db.query(ReturnModel), ReturnModel, ReturnSale).filter(ReturnModel.id == replayed_id).first()
+
     # Verify sale exists
     sale = db.query(SaleModel).filter(SaleModel.id == return_in.sale_id).first()
     if not sale:
@@ -65,10 +81,13 @@ def create_return(
         
         returned_items_info.append({"product_id": item.product_id, "qty": item.quantity})
 
-    db.commit()
-    db.refresh(db_obj)
+    # Acumular la devolución en el rollup diario dentro de la misma transacción
+    RollupService.record_return(db, sale, return_in.items, db_obj.id)
 
-    # Log action
+    if idempotency_key:
+        IdempotencyService.complete(db, "return", idempotency_key, db_obj.id)
+
+    # Log action (same transaction as the return)
     AuditService.log_action(
         db=db,
         user_id=current_user.id,
@@ -79,21 +98,27 @@ def create_return(
             "sale_id": sale.id,
             "reason": return_in.reason,
             "items": returned_items_info
-        }
+        },
+        commit=False
     )
 
+    db.commit()
+    db.refresh(db_obj)
+
     return db_obj
 
 # Este endpoint devuelve en forma de lista paginada todas las devoluciones históricas
 @router.get("/", response_model=List[ReturnSale])
 def read_returns(
+    response: Response,
     db: Session = Depends(get_db),
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_active_user)
 ) -> Any:
     """
-    Retrieve returns.
+    Retrieve returns (cursor paging via X-Next-Cursor, or offset with skip).
     """
-    returns = db.query(ReturnModel).offset(skip).limit(limit).all()
-    return returns
+    query = load_for(db.query(ReturnModel), ReturnModel, ReturnSale)
+    return paginate_response(response, query, [(ReturnModel.id, False)], cursor, skip, limit)
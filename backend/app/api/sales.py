@@ -1,27 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import insert
+from typing import List, Optional
+from datetime import datetime
 from ..database import get_db
-from ..schemas import Sale as SaleSchema, SaleCreate
+from ..schemas import Sale as SaleSchema, SaleCreate, SaleBatchCreate, SaleBatchResponse, SaleQuoteCreate, SaleQuote
 from ..models import Sale, SaleItem, Product
-from ..services import StockService, ProfitService, AuditService
+from ..services import StockService, InsufficientStockError, ProfitService, AuditService, RollupService, IdempotencyService, IdempotencyConflictError, SaleService, SaleBatchService, ReservationService, ReservationUnavailableError, EventService
+from ..core.pagination import paginate_response
+from ..core.loading import load_for
+from ..core.projection import Projection, parse_fields, projected_response
 from .deps import get_current_active_user
 from ..models import User
 
 router = APIRouter()
 
+# Columnas de la cabecera de venta que se pueden pedir con ?fields=
+SALE_FIELDS = Projection(Sale, SaleSchema)
+
 # Este endpoint obtiene el historial de ventas paginado
 @router.get("/", response_model=List[SaleSchema])
 def get_sales(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """
-    Obtener todas las ventas registradas (RF07, RF43)
+    Obtener todas las ventas registradas (RF07, RF43).
+    Paginación por cursor (X-Next-Cursor) u offset con skip.
+    Con fields solo se devuelven esas columnas de la cabecera (sin items).
     """
-    sales = db.query(Sale).order_by(Sale.created_at.desc()).offset(skip).limit(limit).all()
-    return sales
+    names = parse_fields(SALE_FIELDS, fields)
+    if names:
+        query = SALE_FIELDS.query(db, names, order_columns=[Sale.created_at, Sale.id])
+    else:
+        query = load_for(db.query(Sale), Sale, SaleSchema)
+    sales = paginate_response(response, query, [(Sale.created_at, True), (Sale.id, True)], cursor, skip, limit)
+    return projected_response(sales, names, response) if names else sales
 
 # Este endpoint obtiene el detalle completo de una venta específica por su ID
 @router.get("/{sale_id}", response_model=SaleSchema)
@@ -29,7 +48,7 @@ def get_sale(sale_id: int, db: Session = Depends(get_db)):
     """
     Obtener detalle exacto de la venta solicitada por ID
     """
-    sale = db.query(Sale).filter(Sale.id == sale_id).first()
+    sale = load_for(db.query(Sale), Sale, SaleSchema).filter(Sale.id == sale_id).first()
     if not sale:
         raise HTTPException(status_code=404, detail="Sale not found")
     return sale
@@ -39,42 +58,29 @@ def get_sale(sale_id: int, db: Session = Depends(get_db)):
 def create_sale(
     sale: SaleCreate, 
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """
-    Registrar una venta e inducir una deducción de inventario automática (RF41, RF43)
+    Registrar una venta e inducir una deducción de inventario automática (RF41, RF43).
+    Con reservation_id la venta consume esa reserva; sin ella solo puede vender lo no retenido por otros carritos.
+    Con Idempotency-Key un reintento devuelve la venta original sin volver a descontar stock.
     """
+    if idempotency_key:
+        try:
+            replayed_id = IdempotencyService.begin(
+                db, "sale", idempotency_key, IdempotencyService.fingerprint(sale.model_dump_json()), current_user.id
+            )
+        except IdempotencyConflictError as e:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+        if replayed_id is not None:
+            return get_sale(replayed_id, db)
+
     try:
-        # Iniciar el calculo del total de la venta
-        total = 0
-        sale_items_data = []
-        
-        for item in sale.items:
-            # Verificar que este producto existe y coincide en base de datos
-            product = db.query(Product).filter(Product.id == item.product_id).first()
-            if not product:
-                raise HTTPException(status_code=404, detail=f"Product {item.product_id} not found")
-            # No permitir ventas si stock es 0 o insuficiente
-            if product.stock <= 0:
-                raise HTTPException(status_code=400, detail=f"No hay stock disponible de {product.name}")
-            if item.quantity > product.stock:
-                raise HTTPException(status_code=400, detail=f"Stock insuficiente de {product.name}. Disponible: {product.stock}, solicitado: {item.quantity}")
-            if item.quantity <= 0:
-                raise HTTPException(status_code=400, detail="La cantidad debe ser mayor a 0")
-            
-            # Calcular el subtotal sumando cada unidad pagada (Cantidad x Precio)
-            subtotal = item.quantity * item.unit_price
-            total += subtotal
-            
-            sale_items_data.append({
-                "product_id": item.product_id,
-                "quantity": item.quantity,
-                "unit_price": item.unit_price,
-                "subtotal": subtotal
-            })
-        
-        # Restar los montos de descuentos o promociones aplicadas en la pasarela
-        total -= sale.discount
+        # Calcular el total (Cantidad x Precio de cada línea, menos el descuento) y agrupar cantidades por producto;
+        # la misma lógica que usa la cotización POST /quote
+        quantities = SaleService.cart_quantities(sale.items)
+        total = SaleService.cart_total(sale.items, sale.discount)
         
         # Instanciar tabla maestra de cabecera en BD
         db_sale = Sale(
@@ -86,29 +92,43 @@ def create_sale(
         db.add(db_sale)
         db.flush()  # Obtener el ID temporal de la venta instanciada
         
-        # Crear objetos dependientes de detalle y emitir alerta de deducción de stock (RF41)
-        for item_data in sale_items_data:
-            # Crear el registro por cada elemento individual vendido
-            sale_item = SaleItem(
-                sale_id=db_sale.id,
-                **item_data
-            )
-            db.add(sale_item)
-            
-            # Reducir stock valiéndose de los servicios estáticos del sistema
-            StockService.reduce_stock(
-                db=db,
-                product_id=item_data["product_id"],
-                quantity=item_data["quantity"],
-                reason="Venta",
-                reference_type="sale",
-                reference_id=db_sale.id
-            )
+        # Consumir la reserva del carrito antes de descontar: sus unidades dejan de estar retenidas para esta venta
+        if sale.reservation_id is not None:
+            ReservationService.consume(db, sale.reservation_id, db_sale.id)
         
-        db.commit()
-        db.refresh(db_sale)
+        # Validar y descontar el stock de todo el carrito en bloque (RF41); informa todos los faltantes a la vez
+        products = StockService.reduce_stock_batch(
+            db=db,
+            quantities=quantities,
+            reason="Venta",
+            reference_type="sale",
+            reference_id=db_sale.id
+        )
+        
+        # Capturar el costo de compra vigente para que los reportes de COGS no dependan del producto
+        sale_items_data = []
+        for item in sale.items:
+            unit_cost = products[item.product_id].price_purchase
+            sale_items_data.append({
+                "sale_id": db_sale.id,
+                "product_id": item.product_id,
+                "quantity": item.quantity,
+                "unit_price": item.unit_price,
+                "subtotal": item.quantity * item.unit_price,
+                "unit_cost": unit_cost,
+                "line_cost": item.quantity * unit_cost
+            })
+        # Un carrito vacío no tiene partidas: un executemany sin filas emitiría INSERT ... DEFAULT VALUES
+        if sale_items_data:
+            db.execute(insert(SaleItem), sale_items_data)
+
+        # Acumular la venta en el rollup diario dentro de la misma transacción
+        RollupService.record_sale(db, db_sale, sale_items_data)
         
-        # Historial de Auditoría
+        if idempotency_key:
+            IdempotencyService.complete(db, "sale", idempotency_key, db_sale.id)
+        
+        # Historial de Auditoría (en la misma transacción que la venta)
         AuditService.log_action(
             db=db,
             entity="venta",
@@ -117,13 +137,34 @@ def create_sale(
             user_id=current_user.id,
             changes={
                 "total": db_sale.total,
-                "items_count": len(db_sale.items),
+                "items_count": len(sale_items_data),
                 "client_id": db_sale.client_id
-            }
+            },
+            commit=False
+        )
+        EventService.emit(
+            db, "sale.created",
+            sale_id=db_sale.id, total=db_sale.total, items_count=len(sale_items_data), client_id=db_sale.client_id
         )
         
+        db.commit()
+        db.refresh(db_sale)
+        
         return db_sale
         
+    except HTTPException:
+        db.rollback()
+        raise
+    except ReservationUnavailableError as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except InsufficientStockError as e:
+        db.rollback()
+        missing = any(shortfall["reason"] == "not_found" for shortfall in e.shortfalls)
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND if missing else status.HTTP_400_BAD_REQUEST,
+            content={"detail": str(e), "shortfalls": e.shortfalls}
+        )
     except ValueError as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
@@ -131,13 +172,53 @@ def create_sale(
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error creating sale: {str(e)}")
 
+# Este endpoint cotiza un carrito completo (precios vigentes, disponibilidad y total) sin registrar nada
+@router.post("/quote", response_model=SaleQuote)
+def quote_sale(
+    cart: SaleQuoteCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Validar el carrito antes de cobrar: una sola consulta IN para todas las líneas.
+    Usa el mismo cálculo que create_sale; las líneas sin unit_price se cotizan al price_sale vigente.
+    """
+    try:
+        return SaleService.quote(db, cart)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Este endpoint sincroniza en bloque las ventas registradas por una terminal mientras estuvo sin conexión
+@router.post("/batch", response_model=SaleBatchResponse)
+def create_sales_batch(
+    batch: SaleBatchCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Sincronizar ventas fuera de línea en orden (RF41, RF43).
+    Cada venta trae su client_sale_id; las ya sincronizadas se reportan como duplicadas
+    y las que no tienen stock suficiente como rechazadas, sin detener el resto del lote.
+    """
+    return SaleBatchService.sync(db, batch.sales, user_id=current_user.id)
+
 # Este endpoint calcula la ganancia bruta total de todas las ventas
 @router.get("/profit/total", response_model=dict)
-def get_total_profit(db: Session = Depends(get_db)):
+def get_total_profit(
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    category: Optional[str] = None,
+    skip: int = 0,
+    limit: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_db)
+):
     """
-    Calcular la rentabilidad y ganancia bruta total de los activos (RF08)
+    Calcular la rentabilidad y ganancia bruta total de los activos (RF08).
+    Ventana opcional [from, to) sobre la fecha de venta y desglose por producto paginado.
     """
-    return ProfitService.calculate_total_profit(db)
+    return ProfitService.calculate_total_profit(
+        db, date_from=date_from, date_to=date_to, category=category, skip=skip, limit=limit
+    )
 
 # Este endpoint calcula la ganancia bruta específica de un único producto
 @router.get("/profit/{product_id}", response_model=dict)
@@ -1,10 +1,13 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 
 from ..database import get_db
 from ..models import StockMovement as StockMovementModel, Product, User
-from ..schemas.stock_movement import StockMovement, StockMovementCreate
+from ..schemas.stock_movement import StockMovement, StockMovementCreate, KardexEntry
+from ..core.pagination import paginate_response, set_next_cursor, InvalidCursorError
+from ..services import ProductCacheService, ProductChangeService, AlertService, EventService, LotService, StockLedgerService
 from .deps import get_current_active_user
 
 router = APIRouter()
@@ -39,6 +42,8 @@ def create_stock_movement(
         product.stock += movement_in.quantity
     else:
         product.stock -= movement_in.quantity
+        # Las salidas consumen los lotes que vencen primero (FEFO)
+        LotService.allocate(db, {product.id: movement_in.quantity})
 
     # Forzar que el tipo guardado sea el normalizado
     db_obj = StockMovementModel(
@@ -48,28 +53,35 @@ def create_stock_movement(
     )
     db.add(product) # Asegurar que el cambio en producto se persiste
     db.add(db_obj)
+    ProductCacheService.invalidate_stock(db, product.id)
+    ProductChangeService.touch(db, product.id)
+    AlertService.track(db, product.id)
+    EventService.emit(db, "stock.changed", product_id=product.id, stock=product.stock)
     db.commit()
     db.refresh(db_obj)
     
-    # Podriamos disparar alertas aqui (RF17) si product.stock <= product.min_stock
+    # Las alertas de stock bajo (RF17) ya quedaron reconciliadas en inventory_alerts dentro del commit
     
     return db_obj
 
 # Este endpoint recupera el historial cronológico general de todos los movimientos de inventario efectuados
 @router.get("/", response_model=List[StockMovement])
 def get_all_stock_movements(
+    response: Response,
     db: Session = Depends(get_db),
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_active_user)
 ) -> Any:
     """
-    Despliegue unificado de asientos y movimientos (Línea general del inventario)
+    Despliegue unificado de asientos y movimientos (Línea general del inventario).
+    Paginación por cursor (X-Next-Cursor) u offset con skip.
     """
-    movements = db.query(StockMovementModel)\
-        .order_by(StockMovementModel.created_at.desc())\
-        .offset(skip).limit(limit).all()
-    return movements
+    return paginate_response(
+        response, db.query(StockMovementModel),
+        [(StockMovementModel.created_at, True), (StockMovementModel.id, True)], cursor, skip, limit
+    )
 
 # Este endpoint recupera todo el historial de movimientos de inventario pero exclusivo de un producto
 @router.get("/{product_id}", response_model=List[StockMovement])
@@ -88,3 +100,24 @@ def read_stock_movements(
         .order_by(StockMovementModel.created_at.desc())\
         .offset(skip).limit(limit).all()
     return movements
+
+# Este endpoint devuelve el kardex de un producto: cada movimiento con su cantidad con signo y el saldo acumulado
+@router.get("/{product_id}/kardex", response_model=List[KardexEntry])
+def read_kardex(
+    product_id: int,
+    response: Response,
+    db: Session = Depends(get_db),
+    since: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    """
+    Kardex con saldos calculados en SQL (RF12), en orden cronológico desde since (o el primer movimiento).
+    La siguiente página se pide con el cursor de X-Next-Cursor.
+    """
+    try:
+        page = StockLedgerService.kardex(db, product_id, since, cursor, limit)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return set_next_cursor(response, page)
@@ -4,7 +4,8 @@ from typing import List
 from ..database import get_db
 from ..schemas import Supplier as SupplierSchema, SupplierCreate, SupplierUpdate, ProductSupplier as ProductSupplierSchema, ProductSupplierCreate
 from ..models import Supplier, ProductSupplier, Product, User
-from ..services import AuditService
+from ..services import AuditService, ProductCacheService, ProductChangeService
+from ..core.loading import load_for
 from .deps import get_current_active_user
 
 router = APIRouter()
@@ -17,14 +18,14 @@ def get_suppliers(
     db: Session = Depends(get_db)
 ):
     """Get all suppliers"""
-    suppliers = db.query(Supplier).offset(skip).limit(limit).all()
+    suppliers = load_for(db.query(Supplier), Supplier, SupplierSchema).order_by(Supplier.id).offset(skip).limit(limit).all()
     return suppliers
 
 # Este endpoint recupera los detalles completos de un proveedor buscando por su ID
 @router.get("/{supplier_id}", response_model=SupplierSchema)
 def get_supplier(supplier_id: int, db: Session = Depends(get_db)):
     """Get supplier by ID"""
-    supplier = db.query(Supplier).filter(Supplier.id == supplier_id).first()
+    supplier = load_for(db.query(Supplier), Supplier, SupplierSchema).filter(Supplier.id == supplier_id).first()
     if not supplier:
         raise HTTPException(status_code=404, detail="Supplier not found")
     return supplier
@@ -94,9 +95,14 @@ def delete_supplier(supplier_id: int, db: Session = Depends(get_db)):
         entity="proveedor",
         entity_id=supplier.id,
         action="eliminar",
-        changes={"name": supplier.name}
+        changes={"name": supplier.name},
+        commit=False
     )
     
+    # Las asociaciones del catálogo se borran en cascada: refrescar la ficha de esos productos
+    catalogue_ids = [association.product_id for association in supplier.product_associations]
+    ProductCacheService.invalidate(db, *catalogue_ids)
+    ProductChangeService.touch(db, *catalogue_ids)
     db.delete(supplier)
     db.commit()
     return None
@@ -105,7 +111,8 @@ def delete_supplier(supplier_id: int, db: Session = Depends(get_db)):
 @router.get("/{supplier_id}/catalogue", response_model=List[ProductSupplierSchema])
 def get_supplier_catalogue(supplier_id: int, db: Session = Depends(get_db)):
     """Get all products in the supplier's catalogue"""
-    catalogue = db.query(ProductSupplier).filter(ProductSupplier.supplier_id == supplier_id).all()
+    catalogue = load_for(db.query(ProductSupplier), ProductSupplier, ProductSupplierSchema) \
+        .filter(ProductSupplier.supplier_id == supplier_id).all()
     return catalogue
 
 # Este endpoint asocia un producto ya existente al catálogo del proveedor para registrar su costo de compra
@@ -128,6 +135,8 @@ def add_to_catalogue(
         ProductSupplier.product_id == item.product_id
     ).first()
     
+    ProductCacheService.invalidate(db, item.product_id)
+    ProductChangeService.touch(db, item.product_id)
     if existing:
         existing.cost_price_by_supplier = item.cost_price_by_supplier
         db.commit()
@@ -155,6 +164,8 @@ def remove_from_catalogue(supplier_id: int, product_id: int, db: Session = Depen
     if not db_item:
         raise HTTPException(status_code=404, detail="Item not found in catalogue")
     
+    ProductCacheService.invalidate(db, product_id)
+    ProductChangeService.touch(db, product_id)
     db.delete(db_item)
     db.commit()
     return None
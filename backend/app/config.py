@@ -14,6 +14,44 @@ class Settings(BaseSettings):
     smtp_user: str = ""
     smtp_password: str = ""
     
+    # Idempotency-Key (reintentos seguros en ventas, devoluciones y recepción de OC)
+    idempotency_ttl_hours: int = 24
+    idempotency_cache_size: int = 1024
+    
+    # Auditoría diferida: los registros que no van en la transacción del llamador se escriben en bloque
+    audit_buffer_enabled: bool = False
+    audit_buffer_size: int = 200
+    audit_buffer_flush_seconds: float = 2.0
+    # Máximo de registros retenidos mientras la base de datos no acepta escrituras (se descartan los más antiguos)
+    audit_buffer_max_retained: int = 10000
+    
+    # Caché en memoria del catálogo de productos (por ID y SKU)
+    product_cache_size: int = 10000
+    product_cache_ttl_seconds: int = 300
+    product_cache_include_stock: bool = False  # False: el stock siempre se lee de la base de datos
+    
+    # Índice en memoria de códigos de barras (reconstrucción periódica para ver escrituras de otros procesos)
+    barcode_index_refresh_seconds: int = 300
+    
+    # Reservas temporales de stock para carritos abiertos (TTL por defecto y máximo, en segundos)
+    reservation_ttl_seconds: int = 900
+    reservation_max_ttl_seconds: int = 3600
+    
+    # Importación masiva de productos: filas por transacción
+    product_import_chunk_size: int = 1000
+    
+    # Alertas de inventario: ventana de vencimiento (días) mantenida en inventory_alerts
+    alert_expiry_window_days: int = 30
+    
+    # Stream de eventos (SSE): cola por cliente, máximo de clientes por proceso y latido en segundos
+    events_queue_size: int = 256
+    events_max_clients: int = 500
+    events_heartbeat_seconds: float = 15.0
+    
+    # Cortes de stock (stock_checkpoints): cada cuántos días a medianoche y minutos de espera antes de escribirlos
+    stock_checkpoint_interval_days: int = 1
+    stock_checkpoint_grace_minutes: int = 5
+    
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding='utf-8',
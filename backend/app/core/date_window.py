@@ -0,0 +1,14 @@
+from datetime import datetime
+from typing import Optional
+
+# Este helper aplica un rango de fechas semiabierto [desde, hasta) sobre una columna de timestamp
+def apply_date_window(query, column, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None):
+    """
+    Filter a query by a half-open window (column >= date_from AND column < date_to).
+    Comparing the raw column (instead of func.date(column)) lets an index on it be used.
+    """
+    if date_from is not None:
+        query = query.filter(column >= date_from)
+    if date_to is not None:
+        query = query.filter(column < date_to)
+    return query
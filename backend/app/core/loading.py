@@ -0,0 +1,59 @@
+import typing
+from functools import lru_cache
+from typing import List
+from pydantic import BaseModel
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, selectinload
+
+# Máxima profundidad de relaciones anidadas que se cargan de forma anticipada
+_MAX_DEPTH = 3
+
+
+# Esta función extrae el schema Pydantic de una anotación (List[Schema], Optional[Schema] o Schema)
+def _nested_schema(annotation):
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    for arg in typing.get_args(annotation):
+        schema = _nested_schema(arg)
+        if schema is not None:
+            return schema
+    return None
+
+
+# Esta función arma las opciones de carga de un modelo según los campos anidados que serializa el schema
+def _options(model, schema, path=None, depth: int = 0) -> list:
+    if depth >= _MAX_DEPTH:
+        return []
+    relationships = inspect(model).relationships
+    options = []
+    for name, field in schema.model_fields.items():
+        relationship = relationships.get(name)
+        nested = _nested_schema(field.annotation)
+        if relationship is None or nested is None:
+            continue
+        attribute = getattr(model, name)
+        # Colecciones: selectinload (una consulta IN por nivel, sin multiplicar filas)
+        # Muchos-a-uno: joinedload (LEFT JOIN en la misma consulta)
+        if path is None:
+            loader = selectinload(attribute) if relationship.uselist else joinedload(attribute)
+        else:
+            loader = path.selectinload(attribute) if relationship.uselist else path.joinedload(attribute)
+        options.append(loader)
+        options.extend(_options(relationship.mapper.class_, nested, loader, depth + 1))
+    return options
+
+
+# Esta función devuelve (en caché) la política de carga anticipada de un modelo para un schema de respuesta
+@lru_cache(maxsize=None)
+def eager_options(model, schema) -> List:
+    """
+    Loader options that fetch every relationship serialized by `schema` up front,
+    so serializing a page costs a fixed number of queries instead of one per row.
+    """
+    return _options(model, schema)
+
+
+# Esta función aplica a una consulta la política de carga anticipada del schema de respuesta
+def load_for(query, model, schema):
+    options = eager_options(model, schema)
+    return query.options(*options) if options else query
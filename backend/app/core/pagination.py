@@ -0,0 +1,140 @@
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple
+from fastapi import HTTPException, Response
+from sqlalchemy import DateTime, String, and_, func, literal, or_, tuple_
+from sqlalchemy.orm import Query
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Formato normalizado para comparar fechas en SQLite, donde func.now() y los valores enlazados se guardan con distinto texto
+_SQLITE_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%f"
+
+
+class InvalidCursorError(ValueError):
+    """
+    Raised when a pagination cursor cannot be decoded or does not match the endpoint ordering
+    """
+
+
+class Page(NamedTuple):
+    items: List[Any]
+    next_cursor: Optional[str]
+
+
+# Esta función codifica los valores de la última fila de la página en un cursor opaco (base64 de JSON)
+def encode_cursor(values: Sequence[Any]) -> str:
+    payload = [
+        {"dt": value.isoformat()} if isinstance(value, datetime)
+        else {"d": value.isoformat()} if isinstance(value, date)
+        else value
+        for value in values
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+# Esta función decodifica un cursor generado por encode_cursor
+def decode_cursor(cursor: str) -> List[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list):
+            raise ValueError
+        values = []
+        for value in payload:
+            if isinstance(value, dict) and "dt" in value:
+                values.append(datetime.fromisoformat(value["dt"]))
+            elif isinstance(value, dict) and "d" in value:
+                values.append(date.fromisoformat(value["d"]))
+            else:
+                values.append(value)
+        return values
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise InvalidCursorError("Cursor de paginación inválido")
+
+
+# Esta función devuelve la expresión de orden de una columna, normalizando fechas en SQLite para que orden y filtro coincidan
+def _sort_expression(query: Query, column, value: Any = None):
+    is_sqlite = query.session.get_bind().dialect.name == "sqlite"
+    if is_sqlite and isinstance(column.type, DateTime):
+        if value is None:
+            return func.strftime(_SQLITE_DATETIME_FORMAT, column)
+        bound = value.replace(tzinfo=None).isoformat(sep=" ") if isinstance(value, datetime) else value
+        return func.strftime(_SQLITE_DATETIME_FORMAT, literal(bound, String))
+    return column if value is None else literal(value, column.type)
+
+
+# Esta función pagina una consulta por conjunto de claves (keyset) u offset según se reciba cursor o no
+def paginate(
+    query: Query,
+    order: Sequence[Tuple[Any, bool]],
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100
+) -> Page:
+    """
+    Page a query over a stable ordering of (column, descending) pairs whose last column is unique (the id).
+    With a cursor the page starts right after the row it encodes (WHERE (keys) < / > (values)),
+    so deep pages cost the same as the first one and concurrent inserts do not shift rows.
+    Without a cursor the legacy offset/limit paging is used. Either way the next cursor is returned
+    when the page is full.
+    """
+    columns = [column for column, _ in order]
+
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(columns):
+            raise InvalidCursorError("El cursor no corresponde al orden de este listado")
+
+        keys = [_sort_expression(query, column) for column in columns]
+        bounds = [_sort_expression(query, column, value) for column, value in zip(columns, values)]
+        directions = {descending for _, descending in order}
+        if len(directions) == 1:
+            # Comparación de tuplas: usa directamente el índice compuesto (sort_key, id)
+            query = query.filter(tuple_(*keys) < tuple_(*bounds) if directions.pop() else tuple_(*keys) > tuple_(*bounds))
+        else:
+            conditions = []
+            for position, (key, bound) in enumerate(zip(keys, bounds)):
+                prefix = [keys[i] == bounds[i] for i in range(position)]
+                step = key < bound if order[position][1] else key > bound
+                conditions.append(and_(*prefix, step))
+            query = query.filter(or_(*conditions))
+
+    query = query.order_by(*[
+        _sort_expression(query, column).desc() if descending else _sort_expression(query, column).asc()
+        for column, descending in order
+    ])
+    if skip and not cursor:
+        query = query.offset(skip)
+    items = query.limit(limit).all()
+
+    next_cursor = None
+    if limit and len(items) == limit:
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+    return Page(items, next_cursor)
+
+
+# Esta función adapta paginate a los endpoints: cursor inválido -> 400 y el siguiente cursor viaja en la cabecera X-Next-Cursor
+def paginate_response(
+    response: Response,
+    query: Query,
+    order: Sequence[Tuple[Any, bool]],
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100
+) -> List[Any]:
+    try:
+        page = paginate(query, order, cursor, skip, limit)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return set_next_cursor(response, page)
+
+
+# Esta función publica el cursor de la siguiente página en la respuesta y devuelve los elementos
+def set_next_cursor(response: Response, page: Page) -> List[Any]:
+    if page.next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
+    return page.items
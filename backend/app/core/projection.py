@@ -0,0 +1,84 @@
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence
+from fastapi import HTTPException, Response
+from sqlalchemy import inspect
+from sqlalchemy.orm import Query, Session
+from .pagination import NEXT_CURSOR_HEADER
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa json de la librería estándar
+    orjson = None
+
+
+class InvalidFieldsError(ValueError):
+    """
+    Raised when ?fields= names a field that the listing cannot project
+    """
+
+
+# Esta clase describe qué columnas de un modelo se pueden pedir con ?fields= en un listado
+class Projection:
+    """
+    Column projection for a list endpoint: the scalar fields of the response schema that map to
+    model columns, plus optional computed SQL expressions (e.g. gross_profit).
+    Nested relationships are never projected.
+    """
+    def __init__(self, model, schema, computed: Optional[Dict[str, Any]] = None):
+        columns = inspect(model).columns
+        self.model = model
+        self.columns: Dict[str, Any] = {
+            name: getattr(model, name) for name in schema.model_fields if name in columns
+        }
+        self.columns.update(computed or {})
+
+    # Esta función valida la lista separada por comas de ?fields= y devuelve los nombres en orden (sin repetir)
+    def parse(self, fields: Optional[str]) -> List[str]:
+        if not fields:
+            return []
+        names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+        unknown = [name for name in names if name not in self.columns]
+        if unknown:
+            raise InvalidFieldsError(
+                f"Campos no disponibles: {', '.join(unknown)}. Permitidos: {', '.join(self.columns)}"
+            )
+        return names
+
+    # Esta función arma la consulta solo con las columnas pedidas (más las claves de orden, que no se devuelven)
+    def query(self, db: Session, names: Sequence[str], order_columns: Sequence[Any] = ()) -> Query:
+        selected = [self.columns[name].label(name) for name in names]
+        hidden = [column for column in order_columns if column.key not in names]
+        return db.query(*selected, *hidden)
+
+
+# Esta función adapta Projection.parse a los endpoints (campo inválido -> 400)
+def parse_fields(projection: Projection, fields: Optional[str]) -> List[str]:
+    try:
+        return projection.parse(fields)
+    except InvalidFieldsError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# Cabeceras fijadas por el endpoint en su Response que deben viajar en la respuesta proyectada
+_FORWARDED_HEADERS = (NEXT_CURSOR_HEADER, "ETag", "Cache-Control")
+
+
+def _json_default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+# Esta función serializa las tuplas de columnas directamente a JSON (sin hidratar ORM ni validar con Pydantic)
+def projected_response(rows: Sequence[Any], names: Sequence[str], response: Optional[Response] = None) -> Response:
+    content = [dict(zip(names, row)) for row in rows]
+    if orjson is not None:
+        body = orjson.dumps(content, option=orjson.OPT_UTC_Z)
+    else:
+        body = json.dumps(content, default=_json_default, separators=(",", ":")).encode("utf-8")
+
+    headers = {}
+    if response is not None:
+        headers = {name: response.headers[name] for name in _FORWARDED_HEADERS if name in response.headers}
+    return Response(content=body, media_type="application/json", headers=headers)
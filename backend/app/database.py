@@ -9,9 +9,11 @@ if db_url.startswith("postgres://"):
     db_url = db_url.replace("postgres://", "postgresql://", 1)
 
 print(f"DEBUG: Conectando a la base de datos: {db_url}")
+# connect_timeout es propio de Postgres; SQLite (base local por defecto) se comparte entre hilos de FastAPI
+connect_args = {"check_same_thread": False} if db_url.startswith("sqlite") else {"connect_timeout": 10}
 engine = create_engine(
     db_url,
-    connect_args={"connect_timeout": 10}
+    connect_args=connect_args
 )
 
 # Create session factory
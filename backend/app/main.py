@@ -19,6 +19,14 @@ from app.models.audit_log import AuditLog
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+# Estructuras de búsqueda de productos (índices trigram en Postgres / tabla FTS5 en SQLite); si no se pueden crear se busca con LIKE
+from app.services.product_search_service import ProductSearchService
+ProductSearchService.setup(engine)
+
+# Contadores de cambios por tabla para los ETag de los GET condicionales
+from app.services.change_counter_service import ChangeCounterService
+ChangeCounterService.setup(engine)
+
 # Create FastAPI app
 app = FastAPI(
     title="Product Tracker API",
@@ -40,6 +48,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 @app.get("/")
@@ -51,12 +60,65 @@ def read_root():
         "redoc": "/redoc"
     }
 
+# Precargar el índice en memoria de códigos de barras para el escaneo en caja
+@app.on_event("startup")
+def warm_barcode_index():
+    from app.database import SessionLocal
+    from app.services.barcode_index_service import BarcodeIndexService
+    db = SessionLocal()
+    try:
+        BarcodeIndexService.warm(db)
+    finally:
+        db.close()
+
+# Expirar las reservas vencidas y programar el vencimiento de las activas en el montículo en memoria
+@app.on_event("startup")
+def load_pending_reservations():
+    from app.database import SessionLocal
+    from app.services.reservation_service import ReservationService
+    db = SessionLocal()
+    try:
+        ReservationService.load_pending(db)
+    finally:
+        db.close()
+
+# Llenar el rollup diario de ventas desde el historial si está vacío (bases creadas antes de la tabla)
+@app.on_event("startup")
+def backfill_sales_rollup():
+    from app.database import SessionLocal
+    from app.services.rollup_service import RollupService
+    db = SessionLocal()
+    try:
+        written = RollupService.backfill_if_empty(db)
+        if written:
+            print(f"Rollup diario de ventas reconstruido: {written} filas")
+    finally:
+        db.close()
+
+# Reconciliar las alertas de inventario al iniciar y luego una vez por día (ventana de vencimientos)
+@app.on_event("startup")
+def schedule_alert_sweep():
+    from app.services.alert_service import AlertService
+    AlertService.sweep()
+
+# Escribir los cortes de stock pendientes y programar el siguiente (kardex y stock a una fecha)
+@app.on_event("startup")
+def schedule_stock_checkpoints():
+    from app.services.stock_ledger_service import StockLedgerService
+    StockLedgerService.run_checkpoints()
+
+# Escribir los registros de auditoría pendientes del búfer antes de apagar
+@app.on_event("shutdown")
+def flush_audit_buffer():
+    from app.services.audit_service import AuditService
+    AuditService.flush_buffer()
+
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
 
 # Import and include routers
-from app.api import auth, users, products, sales, suppliers, purchase_orders, reports, stock_movements, audit_logs, clients, returns
+from app.api import auth, users, products, sales, suppliers, purchase_orders, reports, stock_movements, audit_logs, clients, returns, reservations, events
 
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(users.router, prefix="/api/users", tags=["users"])
@@ -69,4 +131,6 @@ app.include_router(reports.router, prefix="/api/reports", tags=["reports"])
 app.include_router(audit_logs.router, prefix="/api/audit-logs", tags=["audit-logs"])
 app.include_router(clients.router, prefix="/api/clients", tags=["clients"])
 app.include_router(returns.router, prefix="/api/returns", tags=["returns"])
+app.include_router(events.router, prefix="/api/events", tags=["events"])
+app.include_router(reservations.router, prefix="/api/reservations", tags=["reservations"])
 
@@ -9,6 +9,15 @@ from app.models.product_supplier import ProductSupplier
 from app.models.audit_log import AuditLog
 from app.models.client import Client
 from app.models.return_sale import ReturnSale, ReturnItem
+from app.models.daily_sales_rollup import DailySalesRollup
+from app.models.idempotency_key import IdempotencyKey
+from app.models.product_barcode import ProductBarcode
+from app.models.stock_reservation import StockReservation, StockReservationItem
+from app.models.change_counter import ChangeCounter
+from app.models.product_tombstone import ProductTombstone
+from app.models.inventory_alert import InventoryAlert
+from app.models.product_lot import ProductLot
+from app.models.stock_checkpoint import StockCheckpoint
 
 __all__ = [
     "Product",
@@ -24,4 +33,14 @@ __all__ = [
     "Client",
     "ReturnSale",
     "ReturnItem",
+    "DailySalesRollup",
+    "IdempotencyKey",
+    "ProductBarcode",
+    "StockReservation",
+    "StockReservationItem",
+    "ChangeCounter",
+    "ProductTombstone",
+    "InventoryAlert",
+    "ProductLot",
+    "StockCheckpoint",
 ]
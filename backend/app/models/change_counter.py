@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String
+from app.database import Base
+
+# Este modelo guarda un contador de cambios por tabla; se incrementa tras cada transacción que la modifica (base de los ETag)
+class ChangeCounter(Base):
+    """
+    Per-table change counter, bumped after every committed write to the table.
+    Conditional GETs compare ETags built from these counters instead of running their query.
+    """
+    __tablename__ = "change_counters"
+
+    table_name = Column(String(100), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, UniqueConstraint
+from app.database import Base
+
+# Este modelo guarda el acumulado diario de ventas por método de pago y producto (alimenta reportes y cierres de caja)
+class DailySalesRollup(Base):
+    """
+    Daily sales rollup - one row per (sale_date, payment_method, product_id).
+    Maintained incrementally by create_sale / create_return in the same transaction.
+    """
+    __tablename__ = "daily_sales_rollup"
+    __table_args__ = (
+        UniqueConstraint("sale_date", "payment_method", "product_id", name="uq_daily_sales_rollup_key"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    sale_date = Column(Date, nullable=False, index=True)
+    payment_method = Column(String(50), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
+    
+    # Ventas del día (revenue ya descuenta la parte proporcional del descuento de la venta)
+    sales_count = Column(Integer, nullable=False, default=0)  # cada venta se cuenta en la fila de su primer item
+    units_sold = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+    discount = Column(Float, nullable=False, default=0.0)
+    cogs = Column(Float, nullable=False, default=0.0)
+    
+    # Devoluciones registradas en el día
+    units_returned = Column(Integer, nullable=False, default=0)
+    revenue_returned = Column(Float, nullable=False, default=0.0)
+    cogs_returned = Column(Float, nullable=False, default=0.0)
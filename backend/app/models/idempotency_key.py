@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from app.database import Base
+
+# Este modelo guarda las claves Idempotency-Key ya procesadas para que los reintentos devuelvan la misma respuesta
+class IdempotencyKey(Base):
+    """
+    Processed Idempotency-Key values per write endpoint (scope), evicted after their TTL
+    """
+    __tablename__ = "idempotency_keys"
+
+    scope = Column(String(50), primary_key=True)  # sale, return, purchase_order_receive
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)  # SHA-256 del cuerpo de la solicitud
+    resource_id = Column(Integer, nullable=True)  # NULL mientras la solicitud original sigue en curso
+    user_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
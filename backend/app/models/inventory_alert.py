@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from sqlalchemy.sql import func
+from app.database import Base
+
+# Este modelo guarda las alertas de inventario vigentes (stock bajo y próximos a vencer), mantenidas en cada escritura
+class InventoryAlert(Base):
+    """
+    Active inventory alerts, one row per (product, alert type) - RF17, RF24.
+    Kept up to date by the writes that change stock, min_stock, expiration_date or lots,
+    and reconciled by a daily sweep (expiry windows move with the calendar).
+    """
+    __tablename__ = "inventory_alerts"
+    __table_args__ = (
+        Index("ix_inventory_alerts_type_severity", "alert_type", "severity"),
+    )
+
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    alert_type = Column(String(20), primary_key=True)  # low_stock, expiring
+    severity = Column(String(20), nullable=False)  # critical, warning
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
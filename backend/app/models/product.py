@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Date, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Boolean, DateTime, Date, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -9,6 +9,12 @@ class Product(Base):
     Product model - RF17 (stock minimo), RF24 (expiracion), RF08 (profit calculation)
     """
     __tablename__ = "products"
+    # Índices compuestos para la paginación por cursor (sort_key, id)
+    __table_args__ = (
+        Index("ix_products_archived_id", "archived", "id"),
+        # Sincronización incremental: productos cambiados desde una versión
+        Index("ix_products_change_version_id", "change_version", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
@@ -27,10 +33,12 @@ class Product(Base):
     
     location = Column(String(255))
     
-    # Expiration tracking (RF24 - alertas de caducidad)
-    expiration_date = Column(Date, nullable=True)
+    # Expiration tracking (RF24 - alertas de caducidad); los lotes (product_lots) tienen prioridad sobre esta fecha
+    expiration_date = Column(Date, nullable=True, index=True)
     
     archived = Column(Boolean, default=False)
+    # Versión del último cambio (contador monotónico asignado al confirmar cada escritura del producto)
+    change_version = Column(BigInteger, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -39,3 +47,5 @@ class Product(Base):
     sale_items = relationship("SaleItem", back_populates="product")
     stock_movements = relationship("StockMovement", back_populates="product")
     purchase_order_items = relationship("PurchaseOrderItem", back_populates="product")
+    barcodes = relationship("ProductBarcode", back_populates="product", cascade="all, delete-orphan")
+    lots = relationship("ProductLot", back_populates="product", cascade="all, delete-orphan")
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.database import Base
+
+# Este modelo guarda los códigos de barras (EAN/UPC) y alias con los que se puede escanear un producto
+class ProductBarcode(Base):
+    """
+    Scan codes for a product: several EAN/UPC barcodes or internal aliases per product.
+    Codes are stored normalized (trimmed, upper case) and are unique across products.
+    """
+    __tablename__ = "product_barcodes"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False, index=True)
+    code = Column(String(64), unique=True, nullable=False, index=True)
+    code_type = Column(String(20), nullable=False, default="ean")  # ean, upc, alias
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Relationships
+    product = relationship("Product", back_populates="barcodes")
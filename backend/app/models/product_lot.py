@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.database import Base
+
+# Este modelo guarda los lotes de mercadería recibidos de cada producto con su vencimiento y las unidades que quedan
+class ProductLot(Base):
+    """
+    Stock lot of a product - RF24 (expiracion por lote).
+    Created when a purchase order is received; sales consume lots first-expired-first-out.
+    Units not covered by any lot (stock loaded before lots existed, returns) stay untracked.
+    """
+    __tablename__ = "product_lots"
+    __table_args__ = (
+        UniqueConstraint("product_id", "lot_code", name="uq_product_lots_product_code"),
+        # Alertas y reportes de vencimiento: rango de fechas sobre todos los productos
+        Index("ix_product_lots_expiration_product", "expiration_date", "product_id"),
+        # Asignación FEFO y consulta por producto
+        Index("ix_product_lots_product_expiration", "product_id", "expiration_date", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    lot_code = Column(String(100), nullable=False)
+    expiration_date = Column(Date, nullable=True)
+    quantity = Column(Integer, nullable=False, default=0)  # unidades que quedan del lote
+    received_quantity = Column(Integer, nullable=False, default=0)
+    purchase_order_id = Column(Integer, ForeignKey("purchase_orders.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Relationships
+    product = relationship("Product", back_populates="lots")
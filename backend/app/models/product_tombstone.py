@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Index
+from sqlalchemy.sql import func
+from app.database import Base
+
+# Este modelo registra los productos eliminados para que la sincronización incremental del POS también los borre
+class ProductTombstone(Base):
+    """
+    Deleted product marker, versioned with the same product change counter as Product.change_version
+    """
+    __tablename__ = "product_tombstones"
+    __table_args__ = (
+        Index("ix_product_tombstones_change_version", "change_version"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, nullable=False)  # sin FK: el producto ya no existe
+    sku = Column(String(100), nullable=False)
+    change_version = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now())
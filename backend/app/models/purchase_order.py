@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -9,6 +9,10 @@ class PurchaseOrder(Base):
     Purchase Order model - Orders to suppliers
     """
     __tablename__ = "purchase_orders"
+    # Índices compuestos para la paginación por cursor (sort_key, id)
+    __table_args__ = (
+        Index("ix_purchase_orders_created_at_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     supplier_id = Column(Integer, ForeignKey("suppliers.id"), nullable=False)
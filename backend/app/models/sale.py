@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -9,6 +9,10 @@ class Sale(Base):
     Sale model - RF41 (ventas que restan stock), RF08 (profit calculation)
     """
     __tablename__ = "sales"
+    # Índices compuestos para la paginación por cursor (sort_key, id)
+    __table_args__ = (
+        Index("ix_sales_created_at_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     total = Column(Float, nullable=False)
@@ -18,7 +22,7 @@ class Sale(Base):
     tax_amount = Column(Float, default=0.0)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     client_id = Column(Integer, ForeignKey("clients.id"), nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     
     # Relationships
     user = relationship("User", back_populates="sales")
@@ -39,6 +43,8 @@ class SaleItem(Base):
     quantity = Column(Integer, nullable=False)
     unit_price = Column(Float, nullable=False)  # Precio al momento de la venta
     subtotal = Column(Float, nullable=False)     # quantity * unit_price
+    unit_cost = Column(Float, nullable=True)     # Costo de compra al momento de la venta
+    line_cost = Column(Float, nullable=True)     # quantity * unit_cost (COGS de la línea)
     
     # Relationships
     sale = relationship("Sale", back_populates="items")
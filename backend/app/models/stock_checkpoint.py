@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.sql import func
+from app.database import Base
+
+# Este modelo guarda el saldo de stock de cada producto en un instante de corte (punto de partida del kardex y reportes históricos)
+class StockCheckpoint(Base):
+    """
+    Stock balance per product at checkpoint_at = SUM of its signed movements with created_at < checkpoint_at.
+    Every capture is complete: products without a row had a zero balance at that instant.
+    """
+    __tablename__ = "stock_checkpoints"
+    __table_args__ = (
+        # Último corte antes de una fecha (MAX(checkpoint_at)) y sus saldos, por producto
+        UniqueConstraint("checkpoint_at", "product_id", name="uq_stock_checkpoints_at_product"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    checkpoint_at = Column(DateTime(timezone=True), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    balance = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
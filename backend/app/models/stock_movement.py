@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -9,6 +9,12 @@ class StockMovement(Base):
     Stock movement tracking - all inventory changes
     """
     __tablename__ = "stock_movements"
+    # Índices compuestos para la paginación por cursor (sort_key, id)
+    __table_args__ = (
+        Index("ix_stock_movements_created_at_id", "created_at", "id"),
+        # Kardex por producto (saldo acumulado en orden created_at, id)
+        Index("ix_stock_movements_product_created_id", "product_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
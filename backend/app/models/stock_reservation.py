@@ -0,0 +1,47 @@
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.database import Base
+
+# Este modelo guarda las reservas temporales de stock de un carrito abierto (se liberan solas al vencer)
+class StockReservation(Base):
+    """
+    Soft hold of stock for an open cart, valid until expires_at.
+    active -> consumed (by a sale), released (by the cashier) or expired (by the expiry sweep).
+    """
+    __tablename__ = "stock_reservations"
+    __table_args__ = (
+        Index("ix_stock_reservations_status_expires_at", "status", "expires_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String(20), nullable=False, default="active")  # active, consumed, released, expired
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=True)  # venta que consumió la reserva
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Relationships
+    items = relationship("StockReservationItem", back_populates="reservation", cascade="all, delete-orphan")
+
+
+# Este modelo guarda la cantidad retenida de cada producto; las líneas activas y vigentes se restan del stock disponible
+class StockReservationItem(Base):
+    """
+    Held quantity per product. expires_at and active are copied from the reservation so that
+    the held total per product is read from the (product_id, active, expires_at) index alone.
+    """
+    __tablename__ = "stock_reservation_items"
+    __table_args__ = (
+        Index("ix_stock_reservation_items_product_active_expires", "product_id", "active", "expires_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    reservation_id = Column(Integer, ForeignKey("stock_reservations.id", ondelete="CASCADE"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    active = Column(Boolean, nullable=False, default=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+    # Relationships
+    reservation = relationship("StockReservation", back_populates="items")
@@ -1,6 +1,6 @@
 # Import all schemas
-from app.schemas.product import Product, ProductCreate, ProductUpdate
-from app.schemas.sale import Sale, SaleCreate, SaleItem, SaleItemCreate
+from app.schemas.product import Product, ProductCreate, ProductUpdate, ProductImportResult, ProductBulkUpdate, ProductBulkResult, ProductChanges
+from app.schemas.sale import Sale, SaleCreate, SaleItem, SaleItemCreate, SaleBatchCreate, SaleBatchResponse, SaleQuoteCreate, SaleQuote
 from app.schemas.supplier import Supplier, SupplierCreate, SupplierUpdate
 from app.schemas.purchase_order import PurchaseOrder, PurchaseOrderCreate, PurchaseOrderItem, PurchaseOrderReceive
 from app.schemas.stock_movement import StockMovement, StockMovementCreate
@@ -8,14 +8,20 @@ from app.schemas.user import User, UserCreate, UserUpdate
 from app.schemas.token import Token, TokenPayload
 from app.schemas.audit_log import AuditLog, AuditLogCreate
 from app.schemas.product_supplier import ProductSupplier, ProductSupplierCreate
+from app.schemas.product_barcode import ProductBarcode, ProductBarcodeCreate, ProductScan
+from app.schemas.reservation import Reservation, ReservationCreate, ProductAvailability
+from app.schemas.product_lot import ProductLot
 
 __all__ = [
-    "Product", "ProductCreate", "ProductUpdate",
-    "Sale", "SaleCreate", "SaleItem", "SaleItemCreate",
+    "Product", "ProductCreate", "ProductUpdate", "ProductImportResult", "ProductBulkUpdate", "ProductBulkResult", "ProductChanges",
+    "Sale", "SaleCreate", "SaleItem", "SaleItemCreate", "SaleBatchCreate", "SaleBatchResponse", "SaleQuoteCreate", "SaleQuote",
     "Supplier", "SupplierCreate", "SupplierUpdate",
     "PurchaseOrder", "PurchaseOrderCreate", "PurchaseOrderItem", "PurchaseOrderReceive",
     "User", "UserCreate", "UserUpdate", "Token", "TokenPayload",
     "StockMovement", "StockMovementCreate",
     "AuditLog", "AuditLogCreate",
-    "ProductSupplier", "ProductSupplierCreate"
+    "ProductSupplier", "ProductSupplierCreate",
+    "ProductBarcode", "ProductBarcodeCreate", "ProductScan",
+    "Reservation", "ReservationCreate", "ProductAvailability",
+    "ProductLot"
 ]
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, computed_field
-from typing import Optional, List
+from typing import Any, List, Literal, Optional, Union
 from datetime import date, datetime
 from app.schemas.product_supplier import ProductSupplier
 
@@ -36,6 +36,7 @@ class Product(ProductBase):
     id: int
     created_at: datetime
     updated_at: Optional[datetime] = None
+    change_version: int = 0  # versión del último cambio (sincronización incremental)
     supplier_associations: List[ProductSupplier] = []
 
     @computed_field
@@ -47,5 +48,54 @@ class Product(ProductBase):
     class Config:
         from_attributes = True
 
+# Resultado de la importación masiva (POST /api/products/import)
+class ProductImportError(BaseModel):
+    row: int  # número de fila de datos (CSV sin contar el encabezado) o de línea (NDJSON)
+    sku: Optional[str] = None
+    detail: str
+
+class ProductImportResult(BaseModel):
+    created: int
+    failed: int
+    chunks: int
+    errors: List[ProductImportError] = []
+
+# Actualización masiva por filtro (PATCH /api/products/bulk)
+class ProductBulkFilter(BaseModel):
+    ids: Optional[List[int]] = Field(None, min_length=1)
+    category: Optional[str] = None
+    supplier_id: Optional[int] = None
+    sku_prefix: Optional[str] = Field(None, min_length=1)
+    include_archived: bool = False
+
+class ProductBulkUpdate(BaseModel):
+    filter: ProductBulkFilter
+    field: str  # price_sale, price_purchase, min_stock, category, unit, location
+    operation: Literal["set", "percent", "margin"]  # margin: price_sale = price_purchase * (1 + value/100)
+    value: Optional[Union[int, float, str]] = None
+
+class ProductBulkChange(BaseModel):
+    id: int
+    sku: str
+    old: Any = None
+    new: Any = None
+
+class ProductBulkResult(BaseModel):
+    updated: int
+    changes: List[ProductBulkChange] = []
+
+# Sincronización incremental del catálogo (GET /api/products/changes)
+class ProductDeletion(BaseModel):
+    id: int
+    sku: str
+    reason: str  # deleted, archived
+    change_version: int
+
+class ProductChanges(BaseModel):
+    token: int  # enviar como since en la próxima consulta
+    has_more: bool
+    changed: List[Product] = []
+    deleted: List[ProductDeletion] = []
+
 # Force Pydantic v2 to resolve all forward references
 Product.model_rebuild()
@@ -0,0 +1,22 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class ProductBarcodeCreate(BaseModel):
+    code: str = Field(min_length=1, max_length=64)
+    code_type: str = "ean"  # ean, upc, alias
+
+class ProductBarcode(ProductBarcodeCreate):
+    id: int
+    product_id: int
+
+    class Config:
+        from_attributes = True
+
+# Respuesta mínima para el escaneo en caja (POS)
+class ProductScan(BaseModel):
+    id: int
+    sku: str
+    name: str
+    price_sale: float
+    unit: str
+    stock: Optional[int] = None  # solo con ?with_stock=true (se lee de la base de datos)
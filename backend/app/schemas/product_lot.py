@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import date, datetime
+
+class ProductLot(BaseModel):
+    id: int
+    product_id: int
+    lot_code: str
+    expiration_date: Optional[date] = None
+    quantity: int
+    received_quantity: int
+    purchase_order_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional
-from datetime import datetime
+from datetime import date, datetime
 
 # Purchase Order Item schemas
 class PurchaseOrderItemBase(BaseModel):
@@ -23,6 +23,9 @@ class PurchaseOrderItem(PurchaseOrderItemBase):
 class PurchaseOrderItemReceive(BaseModel):
     item_id: int
     received_quantity: int = Field(gt=0)
+    # Lote recibido: sin código se usa OC<id>-<item_id>; sin vencimiento el lote no genera alertas de caducidad
+    lot_code: Optional[str] = Field(default=None, min_length=1, max_length=100)
+    expiration_date: Optional[date] = None
 
 class PurchaseOrderReceive(BaseModel):
     items: List[PurchaseOrderItemReceive]
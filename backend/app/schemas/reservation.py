@@ -0,0 +1,37 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+
+class ReservationItemBase(BaseModel):
+    product_id: int
+    quantity: int = Field(gt=0)
+
+class ReservationItemCreate(ReservationItemBase):
+    pass
+
+class ReservationItem(ReservationItemBase):
+    class Config:
+        from_attributes = True
+
+class ReservationCreate(BaseModel):
+    items: List[ReservationItemCreate] = Field(min_length=1)
+    ttl_seconds: Optional[int] = Field(None, gt=0)  # None: reservation_ttl_seconds de la configuración
+
+class Reservation(BaseModel):
+    id: int
+    status: str  # active, consumed, released, expired
+    user_id: Optional[int] = None
+    sale_id: Optional[int] = None
+    expires_at: datetime
+    created_at: Optional[datetime] = None
+    items: List[ReservationItem] = []
+
+    class Config:
+        from_attributes = True
+
+# Stock disponible para vender = stock - reservas activas
+class ProductAvailability(BaseModel):
+    product_id: int
+    stock: int
+    held: int
+    available: int
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 
 # Sale Item schemas
@@ -29,6 +29,7 @@ class SaleBase(BaseModel):
 
 class SaleCreate(SaleBase):
     items: List[SaleItemCreate]
+    reservation_id: Optional[int] = None  # reserva de stock que consume la venta (POST /api/reservations)
 
 class Sale(SaleBase):
     id: int
@@ -40,3 +41,55 @@ class Sale(SaleBase):
     
     class Config:
         from_attributes = True
+
+# Offline POS batch sync schemas
+class SaleBatchEntry(SaleCreate):
+    # reservation_id no aplica a ventas fuera de línea y se ignora
+    client_sale_id: str = Field(min_length=1, max_length=255)  # ID generado por la terminal (sirve como Idempotency-Key)
+    created_at: Optional[datetime] = None  # Fecha/hora real de la venta registrada sin conexión
+
+class SaleBatchCreate(BaseModel):
+    sales: List[SaleBatchEntry] = Field(min_length=1, max_length=2000)
+
+class SaleBatchResult(BaseModel):
+    client_sale_id: str
+    status: str  # created, duplicate, rejected
+    sale_id: Optional[int] = None
+    detail: Optional[str] = None
+    shortfalls: List[Dict[str, Any]] = []
+
+class SaleBatchResponse(BaseModel):
+    created: int
+    duplicates: int
+    rejected: int
+    results: List[SaleBatchResult]
+
+# Cart quote schemas (validación previa de la venta, sin escrituras)
+class SaleQuoteItem(BaseModel):
+    product_id: int
+    quantity: int = Field(gt=0)
+    unit_price: Optional[float] = Field(None, gt=0)  # None: se cotiza con el price_sale vigente
+
+class SaleQuoteCreate(SaleBase):
+    items: List[SaleQuoteItem] = Field(min_length=1)
+    reservation_id: Optional[int] = None  # lo retenido por esta reserva cuenta como disponible
+
+class SaleQuoteLine(BaseModel):
+    product_id: int
+    name: Optional[str] = None
+    quantity: int
+    unit_price: float
+    price_sale: Optional[float] = None  # precio vigente del producto
+    price_matches: bool
+    subtotal: float
+    available: int
+    is_available: bool
+    reason: Optional[str] = None  # not_found, insufficient_stock
+
+class SaleQuote(BaseModel):
+    lines: List[SaleQuoteLine]
+    subtotal: float
+    discount: float
+    total: float
+    valid: bool
+    shortfalls: List[Dict[str, Any]] = []
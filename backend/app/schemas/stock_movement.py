@@ -20,3 +20,19 @@ class StockMovement(StockMovementBase):
 
     class Config:
         from_attributes = True
+
+# Fila del kardex: movimiento con su cantidad con signo y el saldo de stock después de aplicarlo (RF12)
+class KardexEntry(BaseModel):
+    id: int
+    created_at: datetime
+    type: str
+    quantity: int
+    signed_quantity: int
+    balance: int
+    reason: Optional[str] = None
+    reference_type: Optional[str] = None
+    reference_id: Optional[int] = None
+    user_id: Optional[int] = None
+
+    class Config:
+        from_attributes = True
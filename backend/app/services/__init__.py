@@ -1,7 +1,22 @@
 # Services package
-from app.services.stock_service import StockService
+from app.services.product_cache_service import ProductCacheService
+from app.services.product_change_service import ProductChangeService
+from app.services.event_service import EventService, TooManySubscribersError
+from app.services.lot_service import LotService
+from app.services.stock_service import StockService, InsufficientStockError
 from app.services.profit_service import ProfitService
 from app.services.alert_service import AlertService
 from app.services.audit_service import AuditService
+from app.services.rollup_service import RollupService
+from app.services.idempotency_service import IdempotencyService, IdempotencyConflictError
+from app.services.sale_service import SaleService
+from app.services.sale_batch_service import SaleBatchService
+from app.services.product_search_service import ProductSearchService
+from app.services.barcode_index_service import BarcodeIndexService
+from app.services.reservation_service import ReservationService, ReservationUnavailableError
+from app.services.product_import_service import ProductImportService
+from app.services.product_bulk_service import ProductBulkService
+from app.services.change_counter_service import ChangeCounterService
+from app.services.stock_ledger_service import StockLedgerService
 
-__all__ = ["StockService", "ProfitService", "AlertService", "AuditService"]
+__all__ = ["StockService", "InsufficientStockError", "ProfitService", "AlertService", "AuditService", "RollupService", "IdempotencyService", "IdempotencyConflictError", "SaleService", "SaleBatchService", "ProductSearchService", "ProductCacheService", "BarcodeIndexService", "ReservationService", "ReservationUnavailableError", "ProductImportService", "ProductBulkService", "ChangeCounterService", "ProductChangeService", "EventService", "TooManySubscribersError", "LotService", "StockLedgerService"]
@@ -2,25 +2,184 @@
 Alert Service - Business logic for inventory alerts
 RF17: Low stock alerts
 RF24: Expiration alerts
+Alerts live in inventory_alerts: writes that change stock, min_stock, expiration_date or lots mark their
+products with track() and the rows are reconciled right before the commit. A daily sweep rebuilds
+the table, moving products in and out of the expiry window.
+A product with open lots (product_lots) expires with its earliest lot; Product.expiration_date only
+applies to products without lots.
 """
+import threading
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from ..models import Product
+from sqlalchemy import case, delete, event, func, insert, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from typing import Dict, Iterable, Optional, Tuple
+from ..models import Product, InventoryAlert, ProductLot
+from ..config import settings
+from .event_service import EventService
 from datetime import datetime, timedelta
 
+_PENDING_KEY = "alert_pending"
+
+
 class AlertService:
-    # Esta función recupera todos los productos cuyo inventario actual está por debajo de su margen seguro mínimo (stock bajo)
+    _sweep_timer: Optional[threading.Timer] = None
+
+    # Esta función calcula qué alertas corresponden a un producto: {tipo: severidad}
     @staticmethod
-    def get_low_stock_alerts(db: Session):
+    def _expected(product, today, expiration_date) -> Dict[str, str]:
+        alerts = {}
+        if product.archived:
+            return alerts
+        if product.stock <= product.min_stock:
+            alerts["low_stock"] = "critical" if product.stock == 0 else "warning"
+        if expiration_date is not None:
+            days_until_expiry = (expiration_date - today).days
+            if 0 <= days_until_expiry <= settings.alert_expiry_window_days:
+                alerts["expiring"] = "critical" if days_until_expiry <= 7 else "warning"
+        return alerts
+
+    # Esta función calcula el vencimiento vigente de los productos con lotes abiertos: {product_id: fecha o None}
+    @staticmethod
+    def _lot_expiries(db: Session, product_ids: Iterable[int], today) -> Dict[int, object]:
         """
-        Get products with stock at or below minimum threshold (RF17)
+        Earliest expiry not yet past among the lots with units left; None when all of them are undated or expired.
+        Products without open lots are absent (their Product.expiration_date applies).
         """
-        low_stock_products = db.query(Product).filter(
-            and_(
-                Product.stock <= Product.min_stock,
-                Product.archived == False
+        return dict(db.query(
+            ProductLot.product_id,
+            func.min(case((ProductLot.expiration_date >= today, ProductLot.expiration_date)))
+        ).filter(
+            ProductLot.product_id.in_(list(product_ids)),
+            ProductLot.quantity > 0
+        ).group_by(ProductLot.product_id).all())
+
+    # Esta función anota productos cuyo stock, stock mínimo, vencimiento o estado cambió (se reconcilian al confirmar)
+    @staticmethod
+    def track(db: Session, *product_ids: int):
+        db.info.setdefault(_PENDING_KEY, set()).update(product_ids)
+
+    # Esta función reconcilia las alertas de los productos indicados (o de todas) con el estado actual de los productos
+    @staticmethod
+    def refresh(db: Session, product_ids: Optional[Iterable[int]] = None) -> Tuple[int, int, int]:
+        """
+        Diff the expected alerts against the stored ones and apply it with at most one INSERT,
+        one UPDATE per severity and one DELETE. Returns (added, changed, removed).
+        """
+        # Las sesiones no hacen autoflush: escribir antes los cambios pendientes del producto para leer su estado actual
+        db.flush()
+        today = datetime.now().date()
+        products_query = db.query(
+            Product.id, Product.stock, Product.min_stock, Product.expiration_date, Product.archived
+        )
+        alerts_query = db.query(InventoryAlert.product_id, InventoryAlert.alert_type, InventoryAlert.severity)
+        if product_ids is not None:
+            product_ids = list(product_ids)
+            if not product_ids:
+                return 0, 0, 0
+            products_query = products_query.filter(Product.id.in_(product_ids))
+            alerts_query = alerts_query.filter(InventoryAlert.product_id.in_(product_ids))
+        else:
+            # Barrido completo: solo los productos que pueden tener alguna alerta (lotes por rango sobre expiration_date, product_id)
+            cutoff_date = today + timedelta(days=settings.alert_expiry_window_days)
+            expiring_lots = db.query(ProductLot.product_id).filter(
+                ProductLot.expiration_date.between(today, cutoff_date),
+                ProductLot.quantity > 0
             )
-        ).all()
+            products_query = products_query.filter(
+                Product.archived == False,
+                (Product.stock <= Product.min_stock)
+                | Product.expiration_date.between(today, cutoff_date)
+                | Product.id.in_(expiring_lots)
+            )
+
+        products = products_query.all()
+        lot_expiries = AlertService._lot_expiries(db, [product.id for product in products], today) if products else {}
+        expected = {
+            (product.id, alert_type): severity
+            for product in products
+            for alert_type, severity in AlertService._expected(
+                product, today, lot_expiries[product.id] if product.id in lot_expiries else product.expiration_date
+            ).items()
+        }
+        current = {(row.product_id, row.alert_type): row.severity for row in alerts_query.all()}
+
+        added = [
+            {"product_id": product_id, "alert_type": alert_type, "severity": severity}
+            for (product_id, alert_type), severity in expected.items() if (product_id, alert_type) not in current
+        ]
+        changed: Dict[str, list] = {}
+        for key, severity in expected.items():
+            if key in current and current[key] != severity:
+                changed.setdefault(severity, []).append(key)
+        removed = [key for key in current if key not in expected]
+
+        for row in added:
+            EventService.emit(db, "alert.raised", **row)
+        for severity, keys in changed.items():
+            for product_id, alert_type in keys:
+                EventService.emit(db, "alert.raised", product_id=product_id, alert_type=alert_type, severity=severity)
+        for product_id, alert_type in removed:
+            EventService.emit(db, "alert.cleared", product_id=product_id, alert_type=alert_type)
+
+        alert_key = tuple_(InventoryAlert.product_id, InventoryAlert.alert_type)
+        if added:
+            AlertService._insert_alerts(db, added)
+        for severity, keys in changed.items():
+            db.execute(
+                update(InventoryAlert).where(alert_key.in_(keys)).values(severity=severity)
+                .execution_options(synchronize_session=False)
+            )
+        if removed:
+            db.execute(delete(InventoryAlert).where(alert_key.in_(removed)).execution_options(synchronize_session=False))
+        return len(added), sum(len(keys) for keys in changed.values()), len(removed)
+
+    # Esta función inserta alertas tolerando que otra transacción (barrido o escritura concurrente) ya haya insertado la misma clave
+    @staticmethod
+    def _insert_alerts(db: Session, rows: list):
+        dialect = db.get_bind().dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+            stmt = dialect_insert(InventoryAlert).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["product_id", "alert_type"],
+                set_={"severity": stmt.excluded.severity, "updated_at": func.now()}
+            )
+            db.execute(stmt)
+            return
+        db.execute(insert(InventoryAlert), rows)
+
+    # Esta función ejecuta el barrido completo en su propia sesión y programa el siguiente para la próxima medianoche
+    @staticmethod
+    def sweep(schedule: bool = True):
+        from ..database import SessionLocal
+        db = SessionLocal()
+        try:
+            AlertService.refresh(db)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"WARNING: Falló el barrido diario de alertas de inventario: {e}")
+        finally:
+            db.close()
+
+        if schedule:
+            now = datetime.now()
+            next_run = datetime.combine(now.date() + timedelta(days=1), datetime.min.time()) + timedelta(minutes=1)
+            AlertService._sweep_timer = threading.Timer((next_run - now).total_seconds(), AlertService.sweep)
+            AlertService._sweep_timer.daemon = True
+            AlertService._sweep_timer.start()
+
+    # Esta función recupera las alertas de stock bajo (productos con inventario en o por debajo del mínimo)
+    @staticmethod
+    def get_low_stock_alerts(db: Session):
+        """
+        Get products with stock at or below minimum threshold (RF17), read from inventory_alerts
+        """
+        low_stock_products = db.query(Product) \
+            .join(InventoryAlert, InventoryAlert.product_id == Product.id) \
+            .filter(InventoryAlert.alert_type == "low_stock") \
+            .order_by(Product.id) \
+            .all()
         
         alerts = []
         for product in low_stock_products:
@@ -36,39 +195,55 @@ class AlertService:
         
         return alerts
     
-    # Esta función escanea productos perecederos para encontrar cuáles están a punto de expirar dentro de los próximos 'days_ahead'
+    # Esta función lista los lotes (y productos sin lotes) que vencen dentro de los próximos 'days_ahead' días
     @staticmethod
     def get_expiring_products(db: Session, days_ahead: int = 30):
         """
-        Get products expiring within the specified days (RF24)
+        Get stock expiring within the specified days (RF24), one entry per lot.
+        Lots are read with a range scan on (expiration_date, product_id); products without open lots
+        fall back to Product.expiration_date.
         """
         today = datetime.now().date()
         cutoff_date = today + timedelta(days=days_ahead)
-        
-        expiring_products = db.query(Product).filter(
-            and_(
-                Product.expiration_date.isnot(None),
-                Product.expiration_date >= today,
-                Product.expiration_date <= cutoff_date,
+
+        expiring_lots = db.query(ProductLot, Product) \
+            .join(Product, Product.id == ProductLot.product_id) \
+            .filter(
+                ProductLot.expiration_date >= today,
+                ProductLot.expiration_date <= cutoff_date,
+                ProductLot.quantity > 0,
                 Product.archived == False
-            )
+            ).all()
+
+        open_lots = db.query(ProductLot.id).filter(ProductLot.product_id == Product.id, ProductLot.quantity > 0)
+        expiring_products = db.query(Product).filter(
+            Product.archived == False,
+            Product.expiration_date >= today,
+            Product.expiration_date <= cutoff_date,
+            ~open_lots.exists()
         ).all()
-        
+
+        entries = [(product, lot.expiration_date, lot) for lot, product in expiring_lots]
+        entries += [(product, product.expiration_date, None) for product in expiring_products]
+
         alerts = []
-        for product in expiring_products:
-            days_until_expiry = (product.expiration_date - today).days
+        for product, expiration_date, lot in entries:
+            days_until_expiry = (expiration_date - today).days
             
             alerts.append({
                 "id": product.id,
                 "name": product.name,
                 "sku": product.sku,
-                "expiration_date": product.expiration_date.isoformat(),
+                "lot_id": lot.id if lot is not None else None,
+                "lot_code": lot.lot_code if lot is not None else None,
+                "expiration_date": expiration_date.isoformat(),
                 "days_until_expiry": days_until_expiry,
+                "quantity": lot.quantity if lot is not None else product.stock,
                 "stock": product.stock,
                 "severity": "critical" if days_until_expiry <= 7 else "warning"
             })
         
-        return sorted(alerts, key=lambda x: x["days_until_expiry"])
+        return sorted(alerts, key=lambda x: (x["days_until_expiry"], x["id"]))
     
     # Esta función consolida todas las alertas (fechas de expiración y stock bajo) en un solo reporte conjunto
     @staticmethod
@@ -80,3 +255,29 @@ class AlertService:
             "low_stock": AlertService.get_low_stock_alerts(db),
             "expiring": AlertService.get_expiring_products(db)
         }
+
+    # Esta función cuenta las alertas por tipo y severidad con una agregación sobre inventory_alerts (para el indicador del panel)
+    @staticmethod
+    def get_alert_counts(db: Session) -> dict:
+        counts = {"low_stock": 0, "expiring": 0, "critical": 0, "total": 0}
+        rows = db.query(InventoryAlert.alert_type, InventoryAlert.severity, func.count()) \
+            .group_by(InventoryAlert.alert_type, InventoryAlert.severity).all()
+        for alert_type, severity, count in rows:
+            counts[alert_type] = counts.get(alert_type, 0) + count
+            counts["total"] += count
+            if severity == "critical":
+                counts["critical"] += count
+        return counts
+
+
+# Reconciliar las alertas de los productos anotados justo antes de confirmar la transacción
+@event.listens_for(Session, "before_commit")
+def _refresh_before_commit(session: Session):
+    product_ids = session.info.pop(_PENDING_KEY, None)
+    if product_ids:
+        AlertService.refresh(session, product_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session):
+    session.info.pop(_PENDING_KEY, None)
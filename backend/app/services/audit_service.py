@@ -1,9 +1,105 @@
+import threading
+import time
+from datetime import datetime, timezone
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from app.models.audit_log import AuditLog
 from app.models.user import User
-from typing import Any, Dict, Optional
+from app.config import settings
+from app.core.pagination import Page, paginate
+from typing import Any, Dict, List, Optional
+
+
+# Este búfer acumula registros de auditoría en memoria y los escribe con un INSERT masivo al llegar a un tamaño o antigüedad máxima
+class AuditBuffer:
+    """
+    Write-behind buffer for audit rows, flushed in bulk on size or age thresholds
+    """
+    def __init__(self, max_size: int = 200, max_age_seconds: float = 2.0, max_retained: int = 10000):
+        self.max_size = max_size
+        self.max_age_seconds = max_age_seconds
+        self.max_retained = max_retained
+        self._rows: List[dict] = []
+        self._lock = threading.Lock()
+        self._first_added_at: Optional[float] = None
+        self._timer: Optional[threading.Timer] = None
+        # Tras un fallo de escritura solo reintenta el temporizador (las solicitudes no esperan a una base caída)
+        self._failing = False
+
+    def add(self, row: dict):
+        dropped = False
+        with self._lock:
+            if not self._rows:
+                self._first_added_at = time.monotonic()
+                self._schedule()
+            self._rows.append(row)
+            if len(self._rows) > self.max_retained:
+                del self._rows[0]
+                dropped = True
+            due = not self._failing and (
+                len(self._rows) >= self.max_size
+                or time.monotonic() - self._first_added_at >= self.max_age_seconds
+            )
+        if dropped:
+            print("WARNING: Se descartó el registro de auditoría más antiguo (búfer lleno)")
+        if due:
+            self.flush()
+
+    # Temporizador para que los registros no queden retenidos cuando no hay más tráfico
+    def _schedule(self):
+        self._timer = threading.Timer(self.max_age_seconds, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self) -> int:
+        with self._lock:
+            rows, self._rows = self._rows, []
+            self._first_added_at = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not rows:
+            return 0
+
+        # Sesión propia: el búfer se vacía fuera de la transacción de cualquier solicitud
+        from app.database import SessionLocal
+        db = SessionLocal()
+        try:
+            db.execute(insert(AuditLog), rows)
+            db.commit()
+            self._failing = False
+        except Exception as e:
+            # Nunca propagar: el flush puede correr dentro de log_action, después del commit de la operación
+            db.rollback()
+            with self._lock:
+                self._failing = True
+                # Conservar los registros para el siguiente intento del temporizador, con un tope de memoria
+                self._rows[:0] = rows
+                dropped = len(self._rows) - self.max_retained
+                if dropped > 0:
+                    del self._rows[:dropped]
+                if self._first_added_at is None:
+                    self._first_added_at = time.monotonic()
+                    self._schedule()
+            print(f"WARNING: No se pudieron escribir {len(rows)} registros de auditoría: {e}")
+            if dropped > 0:
+                print(f"WARNING: Se descartaron {dropped} registros de auditoría antiguos (búfer lleno)")
+            return 0
+        finally:
+            db.close()
+        return len(rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
 
 class AuditService:
+    buffer = AuditBuffer(
+        max_size=settings.audit_buffer_size,
+        max_age_seconds=settings.audit_buffer_flush_seconds,
+        max_retained=settings.audit_buffer_max_retained
+    )
+
     # Función encargada de registrar cualquier cambio crítico (creación, edición, eliminación) en el historial de eventos del sistema
     @staticmethod
     def log_action(
@@ -12,10 +108,14 @@ class AuditService:
         entity_id: int,
         action: str,
         user_id: Optional[int] = None,
-        changes: Optional[Dict[str, Any]] = None
+        changes: Optional[Dict[str, Any]] = None,
+        commit: bool = True
     ):
         """
-        Record an action in the audit log
+        Record an action in the audit log.
+        With commit=False the row joins the caller's unit of work and is written by the caller's commit,
+        atomically with the change it describes. Otherwise it is committed right away, or handed to the
+        write-behind buffer when settings.audit_buffer_enabled is set.
         """
         db_log = AuditLog(
             user_id=user_id,
@@ -24,11 +124,49 @@ class AuditService:
             action=action,
             changes=changes
         )
+        if not commit:
+            db.add(db_log)
+            return db_log
+
+        if settings.audit_buffer_enabled:
+            db_log.created_at = datetime.now(timezone.utc)
+            AuditService.buffer.add({
+                "user_id": user_id,
+                "entity": entity,
+                "entity_id": entity_id,
+                "action": action,
+                "changes": changes,
+                "created_at": db_log.created_at
+            })
+            return db_log
+
         db.add(db_log)
         db.commit()
         db.refresh(db_log)
         return db_log
 
+    # Función que registra la misma acción sobre muchas entidades con un único INSERT masivo (en la transacción del llamador)
+    @staticmethod
+    def log_actions(
+        db: Session,
+        entity: str,
+        action: str,
+        changes_by_id: Dict[int, Dict[str, Any]],
+        user_id: Optional[int] = None
+    ) -> int:
+        if not changes_by_id:
+            return 0
+        db.execute(insert(AuditLog), [
+            {"user_id": user_id, "entity": entity, "entity_id": entity_id, "action": action, "changes": changes}
+            for entity_id, changes in changes_by_id.items()
+        ])
+        return len(changes_by_id)
+
+    # Función que escribe de inmediato los registros pendientes del búfer (se usa al apagar la aplicación)
+    @staticmethod
+    def flush_buffer() -> int:
+        return AuditService.buffer.flush()
+
     # Función que permite filtrar y obtener la lista histórica de modificaciones según entidad y paginación
     @staticmethod
     def get_logs(
@@ -36,8 +174,12 @@ class AuditService:
         entity: Optional[str] = None,
         entity_id: Optional[int] = None,
         skip: int = 0,
-        limit: int = 100
-    ):
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Page:
+        """
+        Audit entries newest first; returns a Page whose next_cursor continues after the last entry
+        """
         query = db.query(
             AuditLog.id,
             AuditLog.user_id,
@@ -54,4 +196,4 @@ class AuditService:
         if entity_id:
             query = query.filter(AuditLog.entity_id == entity_id)
         
-        return query.order_by(AuditLog.created_at.desc()).offset(skip).limit(limit).all()
+        return paginate(query, [(AuditLog.created_at, True), (AuditLog.id, True)], cursor, skip, limit)
@@ -0,0 +1,135 @@
+"""
+Barcode Index Service - In-memory hash index code -> POS payload for scan lookups
+Keys are SKUs plus every code in product_barcodes (normalized). Warmed at startup,
+updated by product/barcode writes and rebuilt periodically to pick up other workers' writes.
+"""
+import threading
+import time
+from typing import Dict, Iterable, Optional, Set
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from ..models import Product, ProductBarcode
+from ..config import settings
+
+# Columnas del producto que viajan en la respuesta de escaneo
+_POS_COLUMNS = (Product.id, Product.sku, Product.name, Product.price_sale, Product.unit)
+
+
+class BarcodeIndexService:
+    _codes: Dict[str, int] = {}  # código normalizado -> product_id
+    _products: Dict[int, dict] = {}  # product_id -> payload POS
+    _codes_by_product: Dict[int, Set[str]] = {}
+    _lock = threading.Lock()
+    _warmed_at: Optional[float] = None
+    _rebuilding = False
+
+    # Esta función normaliza un código escaneado (espacios y mayúsculas) para usarlo como clave
+    @staticmethod
+    def normalize(code: str) -> str:
+        return code.strip().upper()
+
+    # Esta función carga las fichas POS y sus códigos para los productos indicados (o todos los activos)
+    @staticmethod
+    def _load(db: Session, product_ids: Optional[Iterable[int]] = None):
+        products_query = db.query(*_POS_COLUMNS).filter(Product.archived == False)
+        barcodes_query = db.query(ProductBarcode.product_id, ProductBarcode.code) \
+            .join(Product, Product.id == ProductBarcode.product_id) \
+            .filter(Product.archived == False)
+        if product_ids is not None:
+            products_query = products_query.filter(Product.id.in_(product_ids))
+            barcodes_query = barcodes_query.filter(ProductBarcode.product_id.in_(product_ids))
+
+        payloads = {row.id: dict(row._mapping) for row in products_query.all()}
+        codes: Dict[int, Set[str]] = {
+            product_id: {BarcodeIndexService.normalize(payload["sku"])} for product_id, payload in payloads.items()
+        }
+        for product_id, code in barcodes_query.all():
+            codes[product_id].add(code)
+        return payloads, codes
+
+    # Esta función reemplaza (bajo el candado) las entradas de un producto en el índice
+    @staticmethod
+    def _put(product_id: int, payload: Optional[dict], codes: Set[str]):
+        for code in BarcodeIndexService._codes_by_product.pop(product_id, set()):
+            if BarcodeIndexService._codes.get(code) == product_id:
+                del BarcodeIndexService._codes[code]
+        BarcodeIndexService._products.pop(product_id, None)
+        if payload is None:
+            return
+        BarcodeIndexService._products[product_id] = payload
+        BarcodeIndexService._codes_by_product[product_id] = codes
+        for code in codes:
+            BarcodeIndexService._codes[code] = product_id
+
+    # Esta función construye el índice completo (al iniciar la aplicación y en cada reconstrucción periódica)
+    @staticmethod
+    def warm(db: Session) -> int:
+        payloads, codes = BarcodeIndexService._load(db)
+        index = {code: product_id for product_id, product_codes in codes.items() for code in product_codes}
+        with BarcodeIndexService._lock:
+            BarcodeIndexService._products = payloads
+            BarcodeIndexService._codes_by_product = codes
+            BarcodeIndexService._codes = index
+            BarcodeIndexService._warmed_at = time.monotonic()
+        return len(payloads)
+
+    # Esta función reconstruye el índice en segundo plano cuando venció el intervalo de refresco
+    @staticmethod
+    def _rebuild_if_stale():
+        warmed_at = BarcodeIndexService._warmed_at
+        if warmed_at is None or time.monotonic() - warmed_at < settings.barcode_index_refresh_seconds:
+            return
+        with BarcodeIndexService._lock:
+            if BarcodeIndexService._rebuilding:
+                return
+            BarcodeIndexService._rebuilding = True
+
+        def rebuild():
+            from ..database import SessionLocal
+            db = SessionLocal()
+            try:
+                BarcodeIndexService.warm(db)
+            finally:
+                db.close()
+                BarcodeIndexService._rebuilding = False
+
+        threading.Thread(target=rebuild, daemon=True).start()
+
+    # Esta función vuelve a leer productos escritos (llamar después del commit); los archivados o eliminados salen del índice
+    @staticmethod
+    def refresh(db: Session, *product_ids: int):
+        payloads, codes = BarcodeIndexService._load(db, product_ids)
+        with BarcodeIndexService._lock:
+            for product_id in product_ids:
+                BarcodeIndexService._put(product_id, payloads.get(product_id), codes.get(product_id, set()))
+
+    # Esta función resuelve un código escaneado: primero el índice en memoria, y ante un fallo la base de datos
+    @staticmethod
+    def lookup(db: Session, code: str) -> Optional[dict]:
+        key = BarcodeIndexService.normalize(code)
+        BarcodeIndexService._rebuild_if_stale()
+
+        product_id = BarcodeIndexService._codes.get(key)
+        if product_id is not None:
+            payload = BarcodeIndexService._products.get(product_id)
+            if payload is not None:
+                return payload
+
+        # Fallo: el producto pudo crearse en otro proceso; buscarlo (código único y luego SKU) y agregarlo al índice
+        product_id = db.query(ProductBarcode.product_id).filter(ProductBarcode.code == key).scalar()
+        if product_id is None:
+            product_id = db.query(Product.id).filter(func.lower(Product.sku) == key.lower()).limit(1).scalar()
+        if product_id is None:
+            return None
+        BarcodeIndexService.refresh(db, product_id)
+        return BarcodeIndexService._products.get(product_id)
+
+    # Esta función expone el tamaño del índice y la antigüedad de la última construcción completa
+    @staticmethod
+    def stats() -> dict:
+        warmed_at = BarcodeIndexService._warmed_at
+        return {
+            "products": len(BarcodeIndexService._products),
+            "codes": len(BarcodeIndexService._codes),
+            "age_seconds": round(time.monotonic() - warmed_at, 1) if warmed_at is not None else None
+        }
@@ -0,0 +1,123 @@
+"""
+Change Counter Service - Per-table change counters and conditional GET (ETag / If-None-Match)
+Writes are detected on the session (flushed objects and ORM bulk statements) and the counters of the
+written tables are bumped right after the commit, in their own short transaction.
+"""
+import hashlib
+from typing import Dict, Iterable, Optional
+from fastapi import Request, Response
+from sqlalchemy import event, insert, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from ..models import ChangeCounter
+
+# Tablas cuyos cambios invalidan respuestas con ETag (las demás no generan escrituras extra)
+TRACKED_TABLES = ("products", "product_supplier", "inventory_alerts", "product_lots")
+
+# Contador (no de tabla) que numera los cambios de productos para la sincronización incremental
+PRODUCT_VERSION_COUNTER = "product_change_version"
+
+_PENDING_KEY = "change_counter_pending"
+
+
+class ChangeCounterService:
+    # Esta función crea los contadores faltantes (tablas rastreadas y versión de productos) al iniciar la aplicación y en migrate_db
+    @staticmethod
+    def setup(engine: Engine):
+        with engine.begin() as conn:
+            existing = {row[0] for row in conn.execute(ChangeCounter.__table__.select().with_only_columns(ChangeCounter.table_name))}
+            missing = [
+                {"table_name": name, "version": 0}
+                for name in (*TRACKED_TABLES, PRODUCT_VERSION_COUNTER) if name not in existing
+            ]
+            if missing:
+                conn.execute(insert(ChangeCounter), missing)
+
+    # Esta función anota en la sesión las tablas rastreadas que se escribieron (se incrementan al confirmar)
+    @staticmethod
+    def mark(session: Session, *table_names: str):
+        tracked = {name for name in table_names if name in TRACKED_TABLES}
+        if tracked:
+            session.info.setdefault(_PENDING_KEY, set()).update(tracked)
+
+    # Esta función incrementa los contadores de las tablas indicadas en una transacción propia
+    @staticmethod
+    def bump(engine: Engine, table_names: Iterable[str]):
+        with engine.begin() as conn:
+            conn.execute(
+                update(ChangeCounter)
+                .where(ChangeCounter.table_name.in_(sorted(table_names)))
+                .values(version=ChangeCounter.version + 1)
+            )
+
+    # Esta función lee los contadores actuales de varias tablas con una consulta por clave primaria
+    @staticmethod
+    def versions(db: Session, table_names: Iterable[str]) -> Dict[str, int]:
+        return dict(
+            db.query(ChangeCounter.table_name, ChangeCounter.version)
+            .filter(ChangeCounter.table_name.in_(list(table_names)))
+            .all()
+        )
+
+    # Esta función arma un ETag fuerte con los contadores de las tablas y la URL pedida (ruta y parámetros), sin tocar los datos
+    @staticmethod
+    def etag(db: Session, request: Request, table_names: Iterable[str], *extra: str) -> str:
+        table_names = sorted(table_names)
+        versions = ChangeCounterService.versions(db, table_names)
+        parts = [f"{name}:{versions.get(name, 0)}" for name in table_names]
+        parts.append(request.url.path)
+        parts.extend(f"{key}={value}" for key, value in sorted(request.query_params.multi_items()))
+        parts.extend(extra)
+        return '"' + hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:20] + '"'
+
+    # Esta función resuelve un GET condicional: 304 si If-None-Match coincide; si no, deja el ETag en la respuesta
+    @staticmethod
+    def not_modified(db: Session, request: Request, response: Response, table_names: Iterable[str], *extra: str) -> Optional[Response]:
+        """
+        Usage in an endpoint, before running its query:
+            not_modified = ChangeCounterService.not_modified(db, request, response, ("products",))
+            if not_modified is not None:
+                return not_modified
+        extra adds anything else the representation depends on (e.g. today's date for expiry alerts).
+        """
+        etag = ChangeCounterService.etag(db, request, table_names, *extra)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+            if "*" in candidates or etag in candidates:
+                return Response(status_code=304, headers=headers)
+        response.headers.update(headers)
+        return None
+
+
+# Escrituras de objetos ORM (add, modificación, delete) detectadas en cada flush
+@event.listens_for(Session, "after_flush")
+def _mark_flushed(session: Session, flush_context):
+    ChangeCounterService.mark(session, *{
+        instance.__table__.name for instance in (*session.new, *session.dirty, *session.deleted)
+    })
+
+
+# Escrituras masivas: insert(Model), update(Model), delete(Model) y query.update()/delete()
+@event.listens_for(Session, "do_orm_execute")
+def _mark_bulk(state):
+    if (state.is_insert or state.is_update or state.is_delete) and state.bind_mapper is not None:
+        ChangeCounterService.mark(state.session, state.bind_mapper.local_table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_after_commit(session: Session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    try:
+        ChangeCounterService.bump(session.get_bind(), pending)
+    except Exception as e:
+        # Los datos ya se confirmaron: no convertir la solicitud en un error por el contador
+        print(f"WARNING: No se pudo incrementar el contador de cambios de {sorted(pending)}: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session):
+    session.info.pop(_PENDING_KEY, None)
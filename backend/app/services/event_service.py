@@ -0,0 +1,134 @@
+"""
+Event Service - In-process pub/sub of inventory and sales events for the SSE stream (GET /api/events)
+Writers queue events on their session with emit(); they are published only after the commit.
+Every client has a bounded queue: a client that falls behind gets its backlog replaced by one
+"resync" event (refetch through the REST endpoints) instead of growing memory or slowing writers.
+"""
+import asyncio
+import itertools
+import json
+import threading
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Optional, Set
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from ..config import settings
+
+_PENDING_KEY = "event_pending"
+
+
+class TooManySubscribersError(RuntimeError):
+    """
+    Raised when the process already serves events_max_clients streams
+    """
+
+
+# Este suscriptor representa a un cliente conectado: una cola acotada que vive en el event loop del servidor
+class EventSubscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop, types: Optional[Set[str]] = None):
+        self.loop = loop
+        self.types = types
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.events_queue_size)
+        self.resyncs = 0
+
+    # Se ejecuta en el event loop: encola el evento o, si la cola está llena, la reemplaza por un único "resync"
+    def offer(self, payload: dict):
+        if self.types is not None and payload["type"] not in self.types and payload["type"] != "resync":
+            return
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.resyncs += 1
+            self.queue.put_nowait({"type": "resync", "ts": payload["ts"]})
+
+
+class EventService:
+    _subscribers: Set[EventSubscriber] = set()
+    _lock = threading.Lock()
+    _ids = itertools.count(1)
+
+    # Esta función registra un cliente nuevo (rechaza si se alcanzó el máximo de conexiones del proceso)
+    @staticmethod
+    def subscribe(types: Optional[Set[str]] = None) -> EventSubscriber:
+        subscriber = EventSubscriber(asyncio.get_running_loop(), types)
+        with EventService._lock:
+            if len(EventService._subscribers) >= settings.events_max_clients:
+                raise TooManySubscribersError("Demasiados clientes conectados al stream de eventos")
+            EventService._subscribers.add(subscriber)
+        return subscriber
+
+    # Esta función da de baja a un cliente desconectado
+    @staticmethod
+    def unsubscribe(subscriber: EventSubscriber):
+        with EventService._lock:
+            EventService._subscribers.discard(subscriber)
+
+    # Esta función entrega eventos a todos los clientes (desde cualquier hilo; nunca bloquea a quien publica)
+    @staticmethod
+    def publish(events: List[dict]):
+        with EventService._lock:
+            subscribers = list(EventService._subscribers)
+        if not subscribers:
+            return
+        for payload in events:
+            for subscriber in subscribers:
+                try:
+                    subscriber.loop.call_soon_threadsafe(subscriber.offer, payload)
+                except RuntimeError:
+                    # El event loop del cliente ya se cerró
+                    EventService.unsubscribe(subscriber)
+
+    # Esta función encola un evento en la transacción; se publica solo si la transacción confirma
+    @staticmethod
+    def emit(db: Session, event_type: str, **data):
+        db.info.setdefault(_PENDING_KEY, []).append({
+            "type": event_type,
+            "ts": datetime.now(timezone.utc).isoformat(),
+            **data
+        })
+
+    # Esta función produce el flujo SSE de un cliente: eventos, latidos periódicos y baja al desconectarse
+    @staticmethod
+    async def stream(subscriber: EventSubscriber) -> AsyncIterator[str]:
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    payload = await asyncio.wait_for(subscriber.queue.get(), timeout=settings.events_heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    # Comentario SSE: mantiene viva la conexión a través de proxies
+                    yield ": keep-alive\n\n"
+                    continue
+                yield (
+                    f"id: {next(EventService._ids)}\n"
+                    f"event: {payload['type']}\n"
+                    f"data: {json.dumps(payload, separators=(',', ':'), default=str)}\n\n"
+                )
+        finally:
+            EventService.unsubscribe(subscriber)
+
+    # Esta función expone la cantidad de clientes conectados y su cola pendiente
+    @staticmethod
+    def stats() -> dict:
+        with EventService._lock:
+            subscribers = list(EventService._subscribers)
+        return {
+            "clients": len(subscribers),
+            "queued": sum(subscriber.queue.qsize() for subscriber in subscribers),
+            "resyncs": sum(subscriber.resyncs for subscriber in subscribers)
+        }
+
+
+# Publicar los eventos de la transacción una vez confirmada
+@event.listens_for(Session, "after_commit")
+def _publish_after_commit(session: Session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        EventService.publish(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,122 @@
+"""
+Idempotency Service - Safe retries for write endpoints (Idempotency-Key header)
+"""
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from ..models import IdempotencyKey
+from ..core.cache import LRUCache
+from ..config import settings
+
+
+class IdempotencyConflictError(ValueError):
+    """
+    Raised when a key is reused with a different payload or while its first request is still running
+    """
+
+
+class IdempotencyService:
+    # Caché LRU en proceso delante de la tabla: (scope, key) -> (request_hash, resource_id); cada entrada vence con su clave
+    _cache = LRUCache(maxsize=settings.idempotency_cache_size, ttl=settings.idempotency_ttl_hours * 3600)
+    _last_purge = 0.0
+    PURGE_INTERVAL_SECONDS = 600
+
+    # Esta función calcula la huella (SHA-256) del cuerpo de la solicitud para detectar claves reutilizadas con otro contenido
+    @staticmethod
+    def fingerprint(*parts: str) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    # Esta función devuelve el ID del recurso ya creado con esta clave o None (comprobando antes el caché en memoria)
+    @staticmethod
+    def _completed(db: Session, scope: str, key: str, request_hash: str) -> Optional[int]:
+        cached = IdempotencyService._cache.get((scope, key))
+        if cached is None:
+            now = datetime.now(timezone.utc)
+            record = db.query(IdempotencyKey).filter(
+                IdempotencyKey.scope == scope,
+                IdempotencyKey.key == key,
+                IdempotencyKey.expires_at > now
+            ).first()
+            if record is None or record.resource_id is None:
+                return None
+            cached = (record.request_hash, record.resource_id)
+            expires_at = record.expires_at if record.expires_at.tzinfo else record.expires_at.replace(tzinfo=timezone.utc)
+            remaining = (expires_at - now).total_seconds()
+            if remaining <= 0:
+                return None
+            IdempotencyService._cache.set((scope, key), cached, ttl=remaining)
+
+        stored_hash, resource_id = cached
+        if stored_hash != request_hash:
+            raise IdempotencyConflictError("La Idempotency-Key ya fue usada con una solicitud diferente")
+        return resource_id
+
+    # Esta función elimina las claves vencidas en su propia sesión (como máximo una vez cada PURGE_INTERVAL_SECONDS por proceso)
+    @staticmethod
+    def purge_expired(force: bool = False) -> int:
+        now = time.monotonic()
+        if not force and now - IdempotencyService._last_purge < IdempotencyService.PURGE_INTERVAL_SECONDS:
+            return 0
+        IdempotencyService._last_purge = now
+        from ..database import SessionLocal
+        db = SessionLocal()
+        try:
+            deleted = db.query(IdempotencyKey) \
+                .filter(IdempotencyKey.expires_at <= datetime.now(timezone.utc)) \
+                .delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+    # Esta función reserva la clave antes de ejecutar la escritura; si ya fue procesada devuelve el ID del recurso para repetir la respuesta
+    @staticmethod
+    def begin(db: Session, scope: str, key: str, request_hash: str, user_id: Optional[int] = None) -> Optional[int]:
+        """
+        Returns the resource id of a completed request with this key (replay),
+        or None after claiming the key in the current transaction.
+        """
+        resource_id = IdempotencyService._completed(db, scope, key, request_hash)
+        if resource_id is not None:
+            return resource_id
+
+        IdempotencyService.purge_expired()
+
+        # Una clave vencida que no se alcanzó a purgar se reemplaza
+        db.query(IdempotencyKey).filter(
+            IdempotencyKey.scope == scope,
+            IdempotencyKey.key == key,
+            IdempotencyKey.expires_at <= datetime.now(timezone.utc)
+        ).delete(synchronize_session=False)
+
+        db.add(IdempotencyKey(
+            scope=scope,
+            key=key,
+            request_hash=request_hash,
+            user_id=user_id,
+            expires_at=datetime.now(timezone.utc) + timedelta(hours=settings.idempotency_ttl_hours)
+        ))
+        try:
+            # El flush toma el índice único: un reintento concurrente espera aquí hasta que la solicitud original termine
+            db.flush()
+        except IntegrityError:
+            db.rollback()
+            resource_id = IdempotencyService._completed(db, scope, key, request_hash)
+            if resource_id is None:
+                raise IdempotencyConflictError("Una solicitud con esta Idempotency-Key todavía está en proceso")
+            return resource_id
+        return None
+
+    # Esta función asocia la clave reservada con el recurso creado (se llama antes del commit de la operación)
+    @staticmethod
+    def complete(db: Session, scope: str, key: str, resource_id: int):
+        record = db.get(IdempotencyKey, (scope, key))
+        if record is not None:
+            record.resource_id = resource_id
@@ -0,0 +1,80 @@
+"""
+Lot Service - Stock lots with their own expiry (RF24)
+Purchase order receptions create lots; stock decrements consume them first-expired-first-out (FEFO)
+with one locked read and one UPDATE for every lot touched.
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import case, update
+from typing import Dict, List, Optional, Tuple
+from datetime import date
+from ..models import ProductLot
+from .alert_service import AlertService
+
+
+class LotService:
+    # Esta función registra unidades recibidas en un lote (lo crea o suma al lote existente con el mismo código)
+    @staticmethod
+    def receive(db: Session, product_id: int, quantity: int, lot_code: str,
+                expiration_date: Optional[date] = None, purchase_order_id: Optional[int] = None) -> ProductLot:
+        lot = db.query(ProductLot) \
+            .filter(ProductLot.product_id == product_id, ProductLot.lot_code == lot_code) \
+            .with_for_update() \
+            .first()
+        if lot is None:
+            lot = ProductLot(
+                product_id=product_id,
+                lot_code=lot_code,
+                expiration_date=expiration_date,
+                quantity=quantity,
+                received_quantity=quantity,
+                purchase_order_id=purchase_order_id
+            )
+            db.add(lot)
+        else:
+            if expiration_date is not None and lot.expiration_date not in (None, expiration_date):
+                raise ValueError(f"El lote {lot_code} ya existe con vencimiento {lot.expiration_date.isoformat()}")
+            lot.quantity += quantity
+            lot.received_quantity += quantity
+            if lot.expiration_date is None:
+                lot.expiration_date = expiration_date
+        AlertService.track(db, product_id)
+        return lot
+
+    # Esta función descuenta unidades de los lotes de varios productos en orden FEFO y devuelve lo tomado de cada lote
+    @staticmethod
+    def allocate(db: Session, quantities: Dict[int, int]) -> Dict[int, List[Tuple[int, int]]]:
+        """
+        Dated lots by expiry first, then undated lots, oldest first. Whatever the lots do not cover
+        comes from untracked stock. Returns {product_id: [(lot_id, quantity), ...]}.
+        """
+        quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+        if not quantities:
+            return {}
+
+        lots = db.query(ProductLot.id, ProductLot.product_id, ProductLot.quantity) \
+            .filter(ProductLot.product_id.in_(quantities.keys()), ProductLot.quantity > 0) \
+            .order_by(ProductLot.product_id, ProductLot.expiration_date.is_(None), ProductLot.expiration_date, ProductLot.id) \
+            .with_for_update() \
+            .all()
+
+        remaining = dict(quantities)
+        taken: Dict[int, int] = {}
+        allocations: Dict[int, List[Tuple[int, int]]] = {}
+        for lot in lots:
+            pending = remaining[lot.product_id]
+            if pending <= 0:
+                continue
+            quantity = min(pending, lot.quantity)
+            remaining[lot.product_id] = pending - quantity
+            taken[lot.id] = quantity
+            allocations.setdefault(lot.product_id, []).append((lot.id, quantity))
+
+        if taken:
+            db.execute(
+                update(ProductLot)
+                .where(ProductLot.id.in_(taken.keys()))
+                .values(quantity=ProductLot.quantity - case(taken, value=ProductLot.id))
+                .execution_options(synchronize_session=False)
+            )
+        return allocations
+
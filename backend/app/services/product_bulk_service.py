@@ -0,0 +1,128 @@
+"""
+Product Bulk Service - Set-based updates of many products selected by a filter
+One UPDATE per request; old and new values come back from RETURNING where the database supports it
+and feed a single bulk insert of audit rows.
+"""
+from typing import Any, Dict, List
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from ..models import Product, ProductSupplier
+from .audit_service import AuditService
+from .barcode_index_service import BarcodeIndexService
+from .product_cache_service import ProductCacheService
+from .product_change_service import ProductChangeService
+from .alert_service import AlertService
+
+# Campos editables en bloque (el stock no: sus cambios pasan por movimientos de stock)
+PRICE_FIELDS = ("price_sale", "price_purchase")
+TEXT_FIELDS = ("category", "unit", "location")
+BULK_FIELDS = PRICE_FIELDS + ("min_stock",) + TEXT_FIELDS
+# Campos que forman parte de la ficha de escaneo del POS
+_POS_FIELDS = ("price_sale", "unit")
+
+
+class ProductBulkService:
+    # Esta función traduce el filtro (categoría, proveedor, IDs, prefijo de SKU) a condiciones sobre products
+    @staticmethod
+    def _conditions(criteria) -> list:
+        conditions = []
+        if criteria.ids is not None:
+            conditions.append(Product.id.in_(criteria.ids))
+        if criteria.category is not None:
+            conditions.append(Product.category == criteria.category)
+        if criteria.supplier_id is not None:
+            conditions.append(Product.id.in_(
+                select(ProductSupplier.product_id).where(ProductSupplier.supplier_id == criteria.supplier_id)
+            ))
+        if criteria.sku_prefix is not None:
+            conditions.append(Product.sku.startswith(criteria.sku_prefix, autoescape=True))
+        if not conditions:
+            raise ValueError("Indica al menos un filtro: ids, category, supplier_id o sku_prefix")
+        if not criteria.include_archived:
+            conditions.append(Product.archived == False)
+        return conditions
+
+    # Esta función valida la operación y devuelve la expresión SQL del nuevo valor del campo
+    @staticmethod
+    def _new_value(field: str, operation: str, value: Any):
+        if field not in BULK_FIELDS:
+            raise ValueError(f"Campo no editable en bloque: {field}. Permitidos: {', '.join(BULK_FIELDS)}")
+
+        if operation == "set":
+            if field in PRICE_FIELDS and (not isinstance(value, (int, float)) or value <= 0):
+                raise ValueError(f"{field} debe ser un número mayor a 0")
+            if field == "min_stock" and (not isinstance(value, int) or value < 0):
+                raise ValueError("min_stock debe ser un entero mayor o igual a 0")
+            if field in TEXT_FIELDS and not (value is None and field == "location") and not isinstance(value, str):
+                raise ValueError(f"{field} debe ser un texto")
+            return value
+
+        if not isinstance(value, (int, float)) or value <= -100:
+            raise ValueError("El porcentaje debe ser un número mayor a -100")
+        if operation == "percent":
+            if field not in PRICE_FIELDS:
+                raise ValueError("La operación percent solo aplica a price_sale y price_purchase")
+            return func.round(getattr(Product, field) * (1 + value / 100.0), 2)
+        if operation == "margin":
+            if field != "price_sale":
+                raise ValueError("La operación margin solo aplica a price_sale")
+            return func.round(Product.price_purchase * (1 + value / 100.0), 2)
+        raise ValueError(f"Operación desconocida: {operation}")
+
+    # Esta función ejecuta la actualización en bloque y devuelve el valor anterior y el nuevo de cada producto
+    @staticmethod
+    def update(db: Session, criteria, field: str, operation: str, value: Any, user_id: int = None) -> List[Dict[str, Any]]:
+        """
+        PostgreSQL: one UPDATE ... FROM (snapshot of the matched rows) ... RETURNING id, sku, old, new.
+        Other databases: the matched rows are read (and locked where supported) first, then updated by id.
+        Commits; the audit rows (one per product) go in the same transaction.
+        """
+        conditions = ProductBulkService._conditions(criteria)
+        new_value = ProductBulkService._new_value(field, operation, value)
+        column = getattr(Product, field)
+
+        if db.get_bind().dialect.name == "postgresql":
+            old = select(Product.id, column.label("old")).where(*conditions).with_for_update().subquery()
+            rows = db.execute(
+                update(Product)
+                .where(Product.id == old.c.id)
+                .values({column: new_value})
+                .returning(Product.id, Product.sku, old.c.old, column)
+                .execution_options(synchronize_session=False)
+            ).all()
+            changes = [{"id": row[0], "sku": row[1], "old": row[2], "new": row[3]} for row in rows]
+        else:
+            old_rows = db.execute(select(Product.id, Product.sku, column).where(*conditions).with_for_update()).all()
+            ids = [row[0] for row in old_rows]
+            new_values: Dict[int, Any] = {}
+            if ids:
+                statement = update(Product).where(Product.id.in_(ids)).values({column: new_value}) \
+                    .execution_options(synchronize_session=False)
+                if db.get_bind().dialect.update_returning:
+                    new_values = dict(db.execute(statement.returning(Product.id, column)).all())
+                else:
+                    db.execute(statement)
+                    new_values = dict(db.execute(select(Product.id, column).where(Product.id.in_(ids))).all())
+            changes = [{"id": id_, "sku": sku, "old": old_value, "new": new_values[id_]} for id_, sku, old_value in old_rows]
+
+        if not changes:
+            db.rollback()
+            return changes
+
+        ids = [change["id"] for change in changes]
+        AuditService.log_actions(db, "producto", "actualizar_masivo", {
+            change["id"]: {
+                "sku": change["sku"],
+                "operacion": {"field": field, "operation": operation, "value": value},
+                field: {"old": change["old"], "new": change["new"]}
+            }
+            for change in changes
+        }, user_id=user_id)
+        ProductCacheService.invalidate(db, *ids)
+        ProductChangeService.touch(db, *ids)
+        if field == "min_stock":
+            AlertService.track(db, *ids)
+        db.commit()
+        if field in _POS_FIELDS:
+            BarcodeIndexService.refresh(db, *ids)
+        return changes
@@ -0,0 +1,157 @@
+"""
+Product Cache Service - In-process product catalog cache by id and SKU
+Bounded LRU with TTL, invalidated explicitly by every product write (and again after its commit).
+Entries are also checked against products.change_version on every read, so writes made by other
+worker processes are never served stale.
+"""
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from ..models import Product
+from ..schemas import Product as ProductSchema
+from ..core.cache import LRUCache
+from ..core.loading import load_for
+from ..config import settings
+
+# Campos que cambian con cada venta/movimiento; si no se cachean se leen siempre de la base de datos
+STOCK_FIELDS = ("stock",)
+
+_PENDING_KEY = "product_cache_pending"
+
+
+class ProductCacheService:
+    # id -> ficha del producto serializada (ProductSchema) y sku -> id
+    _by_id = LRUCache(maxsize=settings.product_cache_size, ttl=settings.product_cache_ttl_seconds)
+    _by_sku = LRUCache(maxsize=settings.product_cache_size, ttl=settings.product_cache_ttl_seconds)
+    # Se incrementa en cada invalidación: una lectura que empezó antes no puede guardar datos viejos
+    _generation = 0
+    _lock = threading.Lock()
+
+    # Esta función indica si el stock se guarda en el caché o se consulta siempre en la base de datos
+    @staticmethod
+    def _include_stock() -> bool:
+        return settings.product_cache_include_stock
+
+    # Esta función guarda la ficha de un producto si ninguna invalidación ocurrió desde que se leyó
+    @staticmethod
+    def _store(product: Product, generation: int) -> dict:
+        data = ProductSchema.model_validate(product).model_dump()
+        with ProductCacheService._lock:
+            if generation != ProductCacheService._generation:
+                return data
+            entry = data if ProductCacheService._include_stock() \
+                else {key: value for key, value in data.items() if key not in STOCK_FIELDS}
+            ProductCacheService._by_id.set(product.id, entry)
+            ProductCacheService._by_sku.set(product.sku, product.id)
+        return data
+
+    # Esta función lee de la base de datos la versión de cambio y el stock actuales de los productos indicados
+    @staticmethod
+    def current(db: Session, product_ids: Iterable[int]) -> Dict[int, Tuple[int, int]]:
+        return {
+            product_id: (change_version, stock)
+            for product_id, change_version, stock in db.query(Product.id, Product.change_version, Product.stock)
+            .filter(Product.id.in_(set(product_ids))).all()
+        }
+
+    # Esta función devuelve varias fichas por ID; los faltantes y los desactualizados se cargan con una sola consulta
+    @staticmethod
+    def get_many(db: Session, product_ids: Iterable[int],
+                 current: Optional[Dict[int, Tuple[int, int]]] = None) -> Dict[int, dict]:
+        """
+        current maps product id -> (change_version, stock) as just read from the database; callers
+        that already selected those columns pass it to skip the check query. A cached entry is used
+        only if its change_version still matches, so writes from any process invalidate it.
+        """
+        product_ids = set(product_ids)
+        cached: Dict[int, dict] = {}
+        for product_id in product_ids:
+            entry = ProductCacheService._by_id.get(product_id)
+            if entry is not None:
+                cached[product_id] = entry
+
+        found: Dict[int, dict] = {}
+        if cached:
+            if current is None:
+                current = ProductCacheService.current(db, cached.keys())
+            for product_id, entry in cached.items():
+                if product_id not in current or current[product_id][0] != entry["change_version"]:
+                    continue
+                found[product_id] = entry if ProductCacheService._include_stock() \
+                    else {**entry, "stock": current[product_id][1]}
+
+        missing = product_ids - found.keys()
+        if missing:
+            generation = ProductCacheService._generation
+            for product in load_for(db.query(Product), Product, ProductSchema).filter(Product.id.in_(missing)).all():
+                found[product.id] = ProductCacheService._store(product, generation)
+        return found
+
+    # Esta función devuelve la ficha de un producto por ID (o None si no existe)
+    @staticmethod
+    def get(db: Session, product_id: int) -> Optional[dict]:
+        return ProductCacheService.get_many(db, [product_id]).get(product_id)
+
+    # Esta función devuelve la ficha de un producto por SKU (o None si no existe)
+    @staticmethod
+    def get_by_sku(db: Session, sku: str) -> Optional[dict]:
+        product_id = ProductCacheService._by_sku.get(sku)
+        if product_id is not None:
+            entry = ProductCacheService.get(db, product_id)
+            if entry is not None and entry["sku"] == sku:
+                return entry
+
+        generation = ProductCacheService._generation
+        product = load_for(db.query(Product), Product, ProductSchema).filter(Product.sku == sku).first()
+        return ProductCacheService._store(product, generation) if product is not None else None
+
+    # Esta función descarta productos del caché ahora y, si se pasa la sesión, otra vez cuando su transacción confirme
+    @staticmethod
+    def invalidate(db: Optional[Session], *product_ids: int):
+        """
+        Drop products from the cache. With a session the ids are dropped again after its commit,
+        so a read that slips in before the commit cannot leave pre-commit data behind.
+        """
+        with ProductCacheService._lock:
+            ProductCacheService._generation += 1
+            for product_id in product_ids:
+                ProductCacheService._by_id.delete(product_id)
+        if db is not None:
+            db.info.setdefault(_PENDING_KEY, set()).update(product_ids)
+
+    # Esta función invalida solo si el stock forma parte del caché (lo usan las escrituras que únicamente cambian stock)
+    @staticmethod
+    def invalidate_stock(db: Optional[Session], *product_ids: int):
+        if ProductCacheService._include_stock():
+            ProductCacheService.invalidate(db, *product_ids)
+
+    # Esta función vacía el caché completo
+    @staticmethod
+    def clear():
+        with ProductCacheService._lock:
+            ProductCacheService._generation += 1
+            ProductCacheService._by_id.clear()
+            ProductCacheService._by_sku.clear()
+
+    # Esta función expone los contadores de aciertos, fallos y desalojos
+    @staticmethod
+    def stats() -> dict:
+        return {
+            "include_stock": ProductCacheService._include_stock(),
+            "by_id": ProductCacheService._by_id.stats(),
+            "by_sku": ProductCacheService._by_sku.stats()
+        }
+
+
+# Invalidación diferida: repetir el descarte de los productos escritos cuando la transacción confirma
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        ProductCacheService.invalidate(None, *pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,123 @@
+"""
+Product Change Service - Change versions and tombstones for incremental catalog sync
+Writers call touch()/delete() before committing. The version is taken from a counter row right before
+the commit, so the counter lock is held only for the commit itself and versions become visible in
+commit order: a client that stored a token never misses a later commit with a lower version.
+"""
+from typing import Dict, List, Optional
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+from ..models import ChangeCounter, Product, ProductTombstone
+from ..schemas import Product as ProductSchema
+from ..core.loading import load_for
+from .change_counter_service import PRODUCT_VERSION_COUNTER
+
+_PENDING_KEY = "product_change_pending"
+_TOMBSTONES_KEY = "product_change_tombstones"
+
+
+class ProductChangeService:
+    # Esta función anota productos escritos en la transacción; reciben una nueva versión al confirmar
+    @staticmethod
+    def touch(db: Session, *product_ids: int):
+        db.info.setdefault(_PENDING_KEY, set()).update(product_ids)
+
+    # Esta función anota la eliminación de un producto; su marca (tombstone) se guarda con la versión del commit
+    @staticmethod
+    def delete(db: Session, product: Product):
+        db.info.setdefault(_TOMBSTONES_KEY, []).append({"product_id": product.id, "sku": product.sku})
+
+    # Esta función toma la siguiente versión del contador (bloquea su fila hasta el commit) y la asigna a lo anotado
+    @staticmethod
+    def _assign_versions(db: Session, product_ids: set, tombstones: List[dict]):
+        db.execute(
+            update(ChangeCounter)
+            .where(ChangeCounter.table_name == PRODUCT_VERSION_COUNTER)
+            .values(version=ChangeCounter.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        version = db.execute(
+            select(ChangeCounter.version).where(ChangeCounter.table_name == PRODUCT_VERSION_COUNTER)
+        ).scalar()
+        if version is None:
+            return
+        deleted_ids = {tombstone["product_id"] for tombstone in tombstones}
+        if product_ids - deleted_ids:
+            db.execute(
+                update(Product)
+                .where(Product.id.in_(product_ids - deleted_ids))
+                .values(change_version=version, updated_at=Product.updated_at)
+                .execution_options(synchronize_session=False)
+            )
+        if tombstones:
+            db.execute(insert(ProductTombstone), [{**tombstone, "change_version": version} for tombstone in tombstones])
+
+    # Esta función devuelve la versión más reciente ya confirmada (el token que obtiene un cliente al día)
+    @staticmethod
+    def current_version(db: Session) -> int:
+        return db.query(ChangeCounter.version).filter(ChangeCounter.table_name == PRODUCT_VERSION_COUNTER).scalar() or 0
+
+    # Esta función arma el delta desde un token: productos cambiados, bajas (eliminados y archivados) y el nuevo token
+    @staticmethod
+    def changes(db: Session, since: Optional[int] = None, limit: int = 1000) -> dict:
+        """
+        Without since every product is returned (full sync). Versions in (since, token] are returned;
+        when more than limit products changed, token stops at the version that fills the page and has_more is set.
+        All rows of a version always travel together, so a page may exceed limit by one write's products.
+        """
+        # El token se lee antes que los datos: una escritura que confirma en medio se repite en el próximo delta, nunca se pierde
+        head = ProductChangeService.current_version(db)
+        lower = since if since is not None else -1
+
+        token = head
+        page_end = db.query(Product.change_version) \
+            .filter(Product.change_version > lower, Product.change_version <= head) \
+            .order_by(Product.change_version) \
+            .offset(limit - 1).limit(1).scalar()
+        if page_end is not None:
+            token = page_end
+
+        products = load_for(db.query(Product), Product, ProductSchema) \
+            .filter(Product.change_version > lower, Product.change_version <= token) \
+            .order_by(Product.change_version, Product.id).all()
+        tombstones = db.query(ProductTombstone) \
+            .filter(ProductTombstone.change_version > lower, ProductTombstone.change_version <= token) \
+            .order_by(ProductTombstone.change_version, ProductTombstone.id).all() if since is not None else []
+
+        deleted: Dict[int, dict] = {
+            tombstone.product_id: {
+                "id": tombstone.product_id,
+                "sku": tombstone.sku,
+                "reason": "deleted",
+                "change_version": tombstone.change_version
+            }
+            for tombstone in tombstones
+        }
+        changed = []
+        for product in products:
+            if product.archived:
+                # Archivado: para el catálogo del POS equivale a una baja
+                if since is not None:
+                    deleted[product.id] = {
+                        "id": product.id, "sku": product.sku, "reason": "archived", "change_version": product.change_version
+                    }
+            else:
+                deleted.pop(product.id, None)
+                changed.append(product)
+
+        return {"token": token, "has_more": token < head, "changed": changed, "deleted": list(deleted.values())}
+
+
+# Numerar los cambios anotados justo antes de confirmar la transacción
+@event.listens_for(Session, "before_commit")
+def _assign_before_commit(session: Session):
+    product_ids = session.info.pop(_PENDING_KEY, None) or set()
+    tombstones = session.info.pop(_TOMBSTONES_KEY, None) or []
+    if product_ids or tombstones:
+        ProductChangeService._assign_versions(session, product_ids, tombstones)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_TOMBSTONES_KEY, None)
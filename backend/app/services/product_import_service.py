@@ -0,0 +1,186 @@
+"""
+Product Import Service - Bulk product onboarding from CSV or NDJSON uploads
+Rows are parsed as a stream and written in chunks: one SKU lookup, one INSERT ... RETURNING for
+products, bulk inserts for supplier links and initial stock movements and one audit entry per chunk.
+"""
+import csv
+import io
+import json
+from itertools import islice
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from ..models import Product, ProductBarcode, ProductSupplier, StockMovement, Supplier
+from ..schemas import ProductCreate
+from ..config import settings
+from .audit_service import AuditService
+from .barcode_index_service import BarcodeIndexService
+from .product_change_service import ProductChangeService
+from .alert_service import AlertService
+
+
+class ProductImportService:
+    # Esta función deduce el formato del archivo a partir del nombre o del content-type cuando no se indica
+    @staticmethod
+    def detect_format(filename: Optional[str], content_type: Optional[str]) -> str:
+        name = (filename or "").lower()
+        if name.endswith((".ndjson", ".jsonl")) or "ndjson" in (content_type or "") or "jsonl" in (content_type or ""):
+            return "ndjson"
+        if name.endswith(".csv") or "csv" in (content_type or ""):
+            return "csv"
+        raise ValueError("No se pudo deducir el formato del archivo; usa ?format=csv o ?format=ndjson")
+
+    # Esta función recorre el archivo fila por fila sin cargarlo completo en memoria: (número de fila, datos o error)
+    @staticmethod
+    def iter_rows(stream: IO[bytes], file_format: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+        text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+        if file_format == "csv":
+            for row_number, row in enumerate(csv.DictReader(text), 1):
+                # En CSV una celda vacía equivale a un campo omitido
+                yield row_number, {key: value for key, value in row.items() if key and value not in ("", None)}, None
+            return
+
+        for row_number, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError as e:
+                yield row_number, None, f"JSON inválido: {e}"
+                continue
+            if not isinstance(data, dict):
+                yield row_number, None, "Cada línea debe ser un objeto JSON"
+                continue
+            yield row_number, data, None
+
+    # Esta función importa todas las filas por bloques y devuelve el resumen con los errores de cada fila rechazada
+    @staticmethod
+    def import_rows(db: Session, rows: Iterator[Tuple[int, Optional[dict], Optional[str]]], user_id: int = None) -> dict:
+        created = 0
+        chunks = 0
+        errors: List[dict] = []
+        chunk_size = settings.product_import_chunk_size
+
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            chunks += 1
+            for attempt in range(2):
+                try:
+                    chunk_created, chunk_errors = ProductImportService._import_chunk(db, chunk, user_id)
+                    break
+                except IntegrityError:
+                    # Otro proceso creó alguno de estos SKU entre la consulta y el INSERT: reintentar con el estado actual
+                    db.rollback()
+                    if attempt:
+                        chunk_created = 0
+                        chunk_errors = [
+                            {"row": row_number, "sku": (data or {}).get("sku"), "detail": "Error de integridad al guardar el bloque"}
+                            for row_number, data, _ in chunk
+                        ]
+            created += chunk_created
+            errors.extend(sorted(chunk_errors, key=lambda error: error["row"]))
+
+        return {"created": created, "failed": len(errors), "chunks": chunks, "errors": errors}
+
+    # Esta función valida un bloque (esquema, SKU y proveedor con consultas por conjunto) y escribe las filas válidas en una transacción
+    @staticmethod
+    def _import_chunk(db: Session, chunk: list, user_id: int = None) -> Tuple[int, List[dict]]:
+        errors: List[dict] = []
+        valid: List[Tuple[int, ProductCreate]] = []
+        for row_number, data, parse_error in chunk:
+            if parse_error is not None:
+                errors.append({"row": row_number, "sku": None, "detail": parse_error})
+                continue
+            try:
+                valid.append((row_number, ProductCreate.model_validate(data)))
+            except ValidationError as e:
+                detail = "; ".join(
+                    f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+                )
+                errors.append({"row": row_number, "sku": data.get("sku"), "detail": detail})
+
+        skus = {product.sku for _, product in valid}
+        existing = {sku for sku, in db.query(Product.sku).filter(Product.sku.in_(skus)).all()} if skus else set()
+        # Un SKU no puede coincidir con el código de barras de otro producto (mismo índice de escaneo)
+        barcode_owners = dict(
+            db.query(ProductBarcode.code, ProductBarcode.product_id)
+            .filter(ProductBarcode.code.in_({BarcodeIndexService.normalize(sku) for sku in skus})).all()
+        ) if skus else {}
+        supplier_ids = {product.supplier_id for _, product in valid if product.supplier_id}
+        suppliers = {
+            supplier_id for supplier_id, in db.query(Supplier.id).filter(Supplier.id.in_(supplier_ids)).all()
+        } if supplier_ids else set()
+
+        accepted: List[Tuple[int, ProductCreate]] = []
+        seen: Dict[str, int] = {}
+        for row_number, product in valid:
+            code = BarcodeIndexService.normalize(product.sku)
+            if product.sku in existing:
+                detail = f"Product with SKU {product.sku} already exists"
+            elif code in barcode_owners:
+                detail = f"El código {code} ya está asignado al producto #{barcode_owners[code]}"
+            elif product.sku in seen:
+                detail = f"SKU {product.sku} repetido en la fila {seen[product.sku]}"
+            elif product.supplier_id and product.supplier_id not in suppliers:
+                detail = f"Supplier {product.supplier_id} not found"
+            else:
+                seen[product.sku] = row_number
+                accepted.append((row_number, product))
+                continue
+            errors.append({"row": row_number, "sku": product.sku, "detail": detail})
+
+        if not accepted:
+            return 0, errors
+
+        # Productos con un único INSERT ... RETURNING (en el orden del bloque)
+        product_ids = db.execute(
+            insert(Product).returning(Product.id, sort_by_parameter_order=True),
+            [product.model_dump(exclude={"supplier_id"}) for _, product in accepted]
+        ).scalars().all()
+
+        supplier_rows, movement_rows = [], []
+        for (_, product), product_id in zip(accepted, product_ids):
+            if product.supplier_id:
+                supplier_rows.append({
+                    "product_id": product_id,
+                    "supplier_id": product.supplier_id,
+                    "cost_price_by_supplier": product.price_purchase
+                })
+            if product.stock > 0:
+                movement_rows.append({
+                    "product_id": product_id,
+                    "type": "IN",
+                    "quantity": product.stock,
+                    "reason": f"Stock inicial al crear producto '{product.name}'",
+                    "user_id": user_id,
+                    "reference_type": "product_create",
+                    "reference_id": product_id
+                })
+        if supplier_rows:
+            db.execute(insert(ProductSupplier), supplier_rows)
+        if movement_rows:
+            db.execute(insert(StockMovement), movement_rows)
+
+        # Un solo registro de auditoría por bloque con el resumen de lo importado
+        AuditService.log_action(
+            db=db,
+            entity="producto",
+            entity_id=product_ids[0],
+            action="importar",
+            user_id=user_id,
+            changes={
+                "created": len(product_ids),
+                "rows": [accepted[0][0], accepted[-1][0]],
+                "product_ids": list(product_ids)
+            },
+            commit=False
+        )
+        ProductChangeService.touch(db, *product_ids)
+        AlertService.track(db, *product_ids)
+        db.commit()
+        BarcodeIndexService.refresh(db, *product_ids)
+        return len(product_ids), errors
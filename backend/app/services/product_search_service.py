@@ -0,0 +1,194 @@
+"""
+Product Search Service - Index-backed typeahead search over product name and SKU
+Postgres: pg_trgm GIN indexes. SQLite: FTS5 shadow table (trigram tokenizer) kept in sync by triggers.
+"""
+from sqlalchemy import case, column, func, literal_column, or_, select, table, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Query
+from ..models import Product
+
+_SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, sku, content='products', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, sku) VALUES (new.id, new.name, new.sku);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, sku) VALUES ('delete', old.id, old.name, old.sku);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, sku ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, sku) VALUES ('delete', old.id, old.name, old.sku);
+        INSERT INTO products_fts(rowid, name, sku) VALUES (new.id, new.name, new.sku);
+    END
+    """,
+]
+
+_POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (lower(name) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_products_sku_trgm ON products USING gin (lower(sku) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_products_sku_prefix ON products (lower(sku) text_pattern_ops)",
+]
+
+_products_fts = table("products_fts", column("rowid"))
+
+
+class ProductSearchService:
+    # Candidatos que FTS5 entrega ordenados por relevancia antes de aplicar filtros y paginación
+    SQLITE_CANDIDATES = 500
+    # Fracción mínima de trigramas del término que debe contener un resultado aproximado (como pg_trgm.similarity_threshold)
+    MIN_TRIGRAM_RATIO = 0.3
+
+    # Queda en True cuando setup() confirma que existen pg_trgm (Postgres) o la tabla FTS5 (SQLite); si no, se busca con LIKE
+    indexed = False
+
+    # Esta función crea (si faltan) las estructuras de búsqueda del motor en uso; es idempotente
+    @staticmethod
+    def setup(engine: Engine):
+        """
+        Create the search structures for the engine in use. Failures (e.g. a managed
+        Postgres role without CREATE EXTENSION privilege) are logged, not raised:
+        search then falls back to plain LIKE matching.
+        """
+        dialect = engine.dialect.name
+        statements = _SQLITE_DDL if dialect == "sqlite" else _POSTGRES_DDL if dialect == "postgresql" else []
+        if not statements:
+            return
+
+        if dialect == "postgresql":
+            # Cada sentencia en su propia transacción: sin permiso para CREATE EXTENSION se conserva el índice de prefijo de SKU
+            for statement in statements:
+                try:
+                    with engine.begin() as conn:
+                        conn.execute(text(statement))
+                except SQLAlchemyError as e:
+                    print(f"WARNING: No se pudo aplicar '{statement}' para la búsqueda de productos: {e}")
+        else:
+            try:
+                with engine.begin() as conn:
+                    created = not ProductSearchService._has_index(conn, dialect)
+                    for statement in statements:
+                        conn.execute(text(statement))
+                    if created:
+                        # Tabla sombra nueva sobre productos existentes: indexarlos una vez
+                        conn.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+            except SQLAlchemyError as e:
+                print(f"WARNING: No se pudo crear la tabla FTS5 de búsqueda de productos; se buscará con LIKE: {e}")
+
+        try:
+            with engine.connect() as conn:
+                ProductSearchService.indexed = ProductSearchService._has_index(conn, dialect)
+        except SQLAlchemyError as e:
+            print(f"WARNING: No se pudo verificar el índice de búsqueda de productos; se buscará con LIKE: {e}")
+            ProductSearchService.indexed = False
+
+    # Esta función indica si el motor tiene disponible la estructura de búsqueda (extensión pg_trgm o tabla products_fts)
+    @staticmethod
+    def _has_index(conn, dialect: str) -> bool:
+        if dialect == "postgresql":
+            return conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+        return conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'")
+        ).first() is not None
+
+    # Esta función escapa los comodines de LIKE del término buscado
+    @staticmethod
+    def _like_escape(term: str) -> str:
+        return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+    # Esta función devuelve los trigramas distintos del término, en orden
+    @staticmethod
+    def _trigrams(term: str) -> list:
+        return list(dict.fromkeys(term[i:i + 3] for i in range(len(term) - 2)))
+
+    # Esta función cita un texto como frase de FTS5 (con el tokenizador trigram equivale a buscar la subcadena)
+    @staticmethod
+    def _fts_phrase(value: str) -> str:
+        return '"' + value.replace('"', '""') + '"'
+
+    # Esta función arma la consulta MATCH de FTS5: los trigramas del término unidos con OR toleran errores de tipeo
+    @staticmethod
+    def _fts_match(trigrams: list) -> str:
+        return " OR ".join(ProductSearchService._fts_phrase(trigram) for trigram in trigrams)
+
+    # Esta función aplica la búsqueda a una consulta de productos y la ordena por relevancia
+    @staticmethod
+    def apply(query: Query, search: str) -> Query:
+        """
+        Filter and rank a Product query by `search`:
+        SKU prefix matches first, then name/SKU substring matches, then similar (misspelt) names.
+        """
+        term = search.strip().lower()
+        if not term:
+            return query
+
+        pattern = ProductSearchService._like_escape(term)
+        sku_prefix = func.lower(Product.sku).like(f"{pattern}%", escape="\\")
+        contains = or_(
+            func.lower(Product.name).like(f"%{pattern}%", escape="\\"),
+            func.lower(Product.sku).like(f"%{pattern}%", escape="\\")
+        )
+        dialect = query.session.get_bind().dialect.name
+
+        if dialect == "postgresql" and ProductSearchService.indexed:
+            # %> (word_similarity) y LIKE '%term%' se resuelven con los índices GIN de trigramas
+            similar = func.lower(Product.name).op("%>")(term)
+            score = func.greatest(
+                func.word_similarity(term, func.lower(Product.name)),
+                func.similarity(term, func.lower(Product.sku))
+            )
+            return query.filter(or_(sku_prefix, contains, similar)).order_by(
+                case((sku_prefix, 0), (contains, 1), else_=2),
+                score.desc(),
+                Product.id
+            )
+
+        if dialect == "sqlite" and ProductSearchService.indexed and len(term) >= 3:
+            fts_column = literal_column("products_fts")
+
+            # 1) Coincidencias exactas de subcadena resueltas por el índice FTS5
+            substring_ids = select(_products_fts.c.rowid).select_from(_products_fts) \
+                .where(fts_column.op("MATCH")(ProductSearchService._fts_phrase(term)))
+            exact = query.filter(Product.id.in_(substring_ids))
+            if exact.with_entities(Product.id).limit(1).first() is not None:
+                return exact.order_by(
+                    case((sku_prefix, 0), else_=1),
+                    case((sku_prefix, func.lower(Product.sku)), else_=""),
+                    func.length(Product.name),
+                    Product.id
+                )
+
+            # 2) Sin coincidencias exactas: búsqueda aproximada por trigramas compartidos (errores de tipeo)
+            trigrams = ProductSearchService._trigrams(term)
+            candidates = (
+                select(_products_fts.c.rowid.label("product_id"), func.bm25(fts_column).label("rank"))
+                .select_from(_products_fts)
+                .where(fts_column.op("MATCH")(ProductSearchService._fts_match(trigrams)))
+                .order_by(literal_column("rank"))
+                .limit(ProductSearchService.SQLITE_CANDIDATES)
+                .subquery()
+            )
+            # Trigramas del término presentes en nombre o SKU (solo se evalúa sobre los candidatos de FTS5)
+            shared = sum(
+                case((or_(func.instr(func.lower(Product.name), trigram) > 0, func.instr(func.lower(Product.sku), trigram) > 0), 1), else_=0)
+                for trigram in trigrams
+            )
+            threshold = max(1, round(len(trigrams) * ProductSearchService.MIN_TRIGRAM_RATIO))
+            return query.join(candidates, candidates.c.product_id == Product.id) \
+                .filter(shared >= threshold) \
+                .order_by(shared.desc(), candidates.c.rank, Product.id)
+
+        # Términos de 1-2 caracteres (por debajo de un trigrama), motores sin índice de búsqueda u otros motores
+        return query.filter(or_(sku_prefix, contains)).order_by(
+            case((sku_prefix, 0), else_=1),
+            Product.id
+        )
@@ -4,67 +4,120 @@ RF08: Calculate gross profits
 """
 from sqlalchemy.orm import Session
 from sqlalchemy import func
+from datetime import datetime
+from typing import Optional
 from ..models import Product, Sale, SaleItem
+from ..core.date_window import apply_date_window
 
 class ProfitService:
+    # Esta función agrega las líneas de venta por producto (solo sale_items, y sales si se pide ventana de fechas)
+    @staticmethod
+    def _aggregate_by_product(db: Session, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None):
+        """
+        Grouped revenue/cost/units per product from sale_items alone.
+        COGS uses the unit cost captured at sale time (SaleItem.line_cost).
+        """
+        query = db.query(
+            SaleItem.product_id.label("product_id"),
+            func.coalesce(func.sum(SaleItem.quantity), 0).label("units"),
+            func.coalesce(func.sum(SaleItem.subtotal), 0).label("revenue"),
+            func.coalesce(func.sum(SaleItem.line_cost), 0).label("cost")
+        )
+        if date_from is not None or date_to is not None:
+            query = query.join(Sale, Sale.id == SaleItem.sale_id)
+            query = apply_date_window(query, Sale.created_at, date_from, date_to)
+        return query.group_by(SaleItem.product_id).subquery()
+
+    # Esta función transforma una fila agregada (ingresos, costo, unidades) en el diccionario de rentabilidad
+    @staticmethod
+    def _profit_row(product_id: int, product_name: str, units, revenue, cost):
+        revenue = float(revenue or 0)
+        cost = float(cost or 0)
+        gross_profit = revenue - cost
+        margin_percentage = (gross_profit / revenue * 100) if revenue > 0 else 0
+
+        return {
+            "product_id": product_id,
+            "product_name": product_name,
+            "units_sold": int(units or 0),
+            "total_revenue": round(revenue, 2),
+            "total_cost": round(cost, 2),
+            "gross_profit": round(gross_profit, 2),
+            "margin_percentage": round(margin_percentage, 2)
+        }
+
     # Esta función calcula detalladamente la ganancia bruta y margen de un solo producto
     @staticmethod
     def calculate_product_profit(db: Session, product_id: int):
         """
         Calculate gross profit for a specific product (RF08)
         """
-        product = db.query(Product).filter(Product.id == product_id).first()
+        product = db.query(Product.id, Product.name).filter(Product.id == product_id).first()
         if not product:
             raise ValueError(f"Product {product_id} not found")
-        
-        # Obtiene todas las ventas realizadas de este producto para calcular los ingresos
-        sales_items = db.query(SaleItem).filter(SaleItem.product_id == product_id).all()
-        
-        total_revenue = 0
-        total_cost = 0
-        total_units_sold = 0
-        
-        for item in sales_items:
-            total_revenue += item.subtotal
-            total_cost += (product.price_purchase * item.quantity)
-            total_units_sold += item.quantity
-        
-        gross_profit = total_revenue - total_cost
-        margin_percentage = (float(gross_profit) / float(total_revenue) * 100) if total_revenue > 0 else 0
-        
-        return {
-            "product_id": product_id,
-            "product_name": product.name,
-            "units_sold": total_units_sold,
-            "total_revenue": round(float(total_revenue), 2),
-            "total_cost": round(float(total_cost), 2),
-            "gross_profit": round(float(gross_profit), 2),
-            "margin_percentage": round(float(margin_percentage), 2)
-        }
-    
-    # Esta función calcula la ganancia global combinando las ganancias de todos los productos vigentes
+
+        # Agregar en SQL las ventas del producto en lugar de recorrer cada SaleItem en Python
+        units, revenue, cost = db.query(
+            func.coalesce(func.sum(SaleItem.quantity), 0),
+            func.coalesce(func.sum(SaleItem.subtotal), 0),
+            func.coalesce(func.sum(SaleItem.line_cost), 0)
+        ).filter(SaleItem.product_id == product_id).one()
+
+        return ProfitService._profit_row(product.id, product.name, units, revenue, cost)
+
+    # Esta función calcula la ganancia global y el desglose por producto en consultas agrupadas (sin recorrer el catálogo)
     @staticmethod
-    def calculate_total_profit(db: Session):
+    def calculate_total_profit(
+        db: Session,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        category: Optional[str] = None,
+        skip: int = 0,
+        limit: Optional[int] = None
+    ):
         """
-        Calculate total gross profit across all products
+        Calculate total gross profit across all products.
+        sale_items are aggregated per product first; products are joined only
+        once per aggregated row (name, archived and category filters).
         """
-        products = db.query(Product).filter(Product.archived == False).all()
-        
-        total_profit = 0
-        total_revenue = 0
-        products_data = []
-        
-        for product in products:
-            profit_data = ProfitService.calculate_product_profit(db, product.id)
-            total_profit += profit_data["gross_profit"]
-            total_revenue += profit_data["total_revenue"]
-            
-            if profit_data["units_sold"] > 0:  # Only include products that have sold
-                products_data.append(profit_data)
-        
+        per_product = ProfitService._aggregate_by_product(db, date_from, date_to)
+
+        def with_product(query):
+            query = query.select_from(per_product) \
+                .join(Product, Product.id == per_product.c.product_id) \
+                .filter(Product.archived == False)
+            if category:
+                query = query.filter(Product.category == category)
+            return query
+
+        total_revenue, total_cost, total_products = with_product(db.query(
+            func.coalesce(func.sum(per_product.c.revenue), 0),
+            func.coalesce(func.sum(per_product.c.cost), 0),
+            func.count(per_product.c.product_id)
+        )).one()
+
+        breakdown_query = with_product(db.query(
+            Product.id,
+            Product.name,
+            per_product.c.units,
+            per_product.c.revenue,
+            per_product.c.cost
+        )).order_by(Product.id).offset(skip)
+        if limit is not None:
+            breakdown_query = breakdown_query.limit(limit)
+
+        products_data = [
+            ProfitService._profit_row(row[0], row[1], row[2], row[3], row[4])
+            for row in breakdown_query.all()
+        ]
+
+        total_revenue = float(total_revenue or 0)
+        total_profit = total_revenue - float(total_cost or 0)
+
         return {
-            "total_gross_profit": round(float(total_profit), 2),
-            "total_revenue": round(float(total_revenue), 2),
-            "overall_margin": round((float(total_profit) / float(total_revenue) * 100) if total_revenue > 0 else 0, 2),
+            "total_gross_profit": round(total_profit, 2),
+            "total_revenue": round(total_revenue, 2),
+            "overall_margin": round((total_profit / total_revenue * 100) if total_revenue > 0 else 0, 2),
+            "total_products": int(total_products or 0),
             "products": products_data
         }
@@ -0,0 +1,197 @@
+"""
+Reservation Service - Time-limited stock holds for open carts
+Available-to-sell = stock - active, unexpired holds. Expired holds are reclaimed by an in-process
+expiry heap; reads already ignore holds past their expires_at, so the sweep only has to keep the
+active set (and the statuses) tidy.
+"""
+import heapq
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from ..models import Product, StockReservation, StockReservationItem
+from ..config import settings
+from .stock_service import StockService, InsufficientStockError
+from .sale_service import SaleService
+
+
+class ReservationUnavailableError(ValueError):
+    """
+    Raised when a reservation cannot be consumed or released (unknown, expired or already closed)
+    """
+
+
+class ReservationService:
+    # Montículo en memoria (vencimiento, reservation_id) de las reservas activas creadas o cargadas por este proceso
+    _heap: List[Tuple[datetime, int]] = []
+    _lock = threading.Lock()
+    _timer: Optional[threading.Timer] = None
+    _timer_due: Optional[datetime] = None
+
+    # Esta función crea una reserva: bloquea los productos, valida stock menos reservas vigentes e inserta las líneas en bloque
+    @staticmethod
+    def create(db: Session, items: list, ttl_seconds: Optional[int] = None, user_id: int = None) -> StockReservation:
+        """
+        Hold quantities for ttl_seconds (default reservation_ttl_seconds, capped at reservation_max_ttl_seconds).
+        Raises InsufficientStockError listing every line that cannot be held. Commits.
+        """
+        ttl = ttl_seconds or settings.reservation_ttl_seconds
+        if ttl > settings.reservation_max_ttl_seconds:
+            raise ValueError(f"La reserva no puede superar {settings.reservation_max_ttl_seconds} segundos")
+
+        quantities = SaleService.cart_quantities(items)
+        # El bloqueo de filas serializa reservas y ventas concurrentes sobre los mismos productos
+        products = StockService.lock_products(db, quantities.keys())
+        shortfalls = StockService._shortfalls(products, quantities, StockService.available(db, products))
+        if shortfalls:
+            raise InsufficientStockError(shortfalls)
+
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+        reservation = StockReservation(status="active", user_id=user_id, expires_at=expires_at)
+        db.add(reservation)
+        db.flush()
+        db.execute(insert(StockReservationItem), [
+            {
+                "reservation_id": reservation.id,
+                "product_id": product_id,
+                "quantity": quantity,
+                "active": True,
+                "expires_at": expires_at
+            }
+            for product_id, quantity in quantities.items()
+        ])
+        db.commit()
+        db.refresh(reservation)
+
+        ReservationService._schedule(expires_at, reservation.id)
+        return reservation
+
+    # Esta función cierra una reserva activa y vigente con un UPDATE condicional (sin transacción propia: el llamador confirma)
+    @staticmethod
+    def _close(db: Session, reservation_id: int, status: str, sale_id: int = None):
+        now = datetime.now(timezone.utc)
+        closed = db.query(StockReservation).filter(
+            StockReservation.id == reservation_id,
+            StockReservation.status == "active",
+            StockReservation.expires_at > now
+        ).update({StockReservation.status: status, StockReservation.sale_id: sale_id}, synchronize_session=False)
+
+        if not closed:
+            reservation = db.get(StockReservation, reservation_id)
+            if reservation is None:
+                raise ReservationUnavailableError(f"Reservation {reservation_id} not found")
+            if reservation.status == "active":
+                raise ReservationUnavailableError(f"La reserva {reservation_id} venció")
+            raise ReservationUnavailableError(f"La reserva {reservation_id} ya no está activa ({reservation.status})")
+
+        db.query(StockReservationItem) \
+            .filter(StockReservationItem.reservation_id == reservation_id, StockReservationItem.active == True) \
+            .update({StockReservationItem.active: False}, synchronize_session=False)
+
+    # Esta función marca la reserva como consumida por una venta; lo retenido vuelve a estar disponible para esa misma venta
+    @staticmethod
+    def consume(db: Session, reservation_id: int, sale_id: int):
+        """
+        Call inside the sale transaction, before reducing stock. A rollback of the sale restores the hold.
+        """
+        ReservationService._close(db, reservation_id, "consumed", sale_id=sale_id)
+
+    # Esta función libera una reserva antes de su vencimiento (carrito cancelado)
+    @staticmethod
+    def release(db: Session, reservation_id: int):
+        ReservationService._close(db, reservation_id, "released")
+        db.commit()
+
+    # Esta función devuelve stock, retenido y disponible de varios productos con dos consultas
+    @staticmethod
+    def availability(db: Session, product_ids: List[int]) -> List[dict]:
+        stocks = dict(db.query(Product.id, Product.stock).filter(Product.id.in_(product_ids)).all())
+        held = StockService.held_quantities(db, stocks.keys()) if stocks else {}
+        return [
+            {
+                "product_id": product_id,
+                "stock": stock,
+                "held": held.get(product_id, 0),
+                "available": max(stock - held.get(product_id, 0), 0)
+            }
+            for product_id, stock in stocks.items()
+        ]
+
+    # Esta función agrega una reserva al montículo y adelanta el temporizador si vence antes que la próxima programada
+    @staticmethod
+    def _schedule(expires_at: datetime, reservation_id: int):
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        with ReservationService._lock:
+            heapq.heappush(ReservationService._heap, (expires_at, reservation_id))
+            ReservationService._arm()
+
+    # Temporizador único apuntando al vencimiento más próximo del montículo (se llama con el candado tomado)
+    @staticmethod
+    def _arm():
+        if not ReservationService._heap:
+            return
+        due = ReservationService._heap[0][0]
+        if ReservationService._timer is not None:
+            if ReservationService._timer_due <= due:
+                return
+            ReservationService._timer.cancel()
+        delay = max((due - datetime.now(timezone.utc)).total_seconds(), 0) + 0.05
+        ReservationService._timer = threading.Timer(delay, ReservationService._sweep)
+        ReservationService._timer.daemon = True
+        ReservationService._timer_due = due
+        ReservationService._timer.start()
+
+    # Esta función saca del montículo las reservas vencidas y las marca como expiradas con dos UPDATE en bloque
+    @staticmethod
+    def _sweep():
+        now = datetime.now(timezone.utc)
+        with ReservationService._lock:
+            ReservationService._timer = None
+            ReservationService._timer_due = None
+            due_ids = []
+            while ReservationService._heap and ReservationService._heap[0][0] <= now:
+                due_ids.append(heapq.heappop(ReservationService._heap)[1])
+
+        try:
+            if due_ids:
+                from ..database import SessionLocal
+                db = SessionLocal()
+                try:
+                    ReservationService.expire(db, due_ids)
+                finally:
+                    db.close()
+        finally:
+            with ReservationService._lock:
+                ReservationService._arm()
+
+    # Esta función marca como expiradas las reservas activas ya vencidas (las indicadas o todas)
+    @staticmethod
+    def expire(db: Session, reservation_ids: Optional[List[int]] = None) -> int:
+        now = datetime.now(timezone.utc)
+        query = db.query(StockReservation).filter(
+            StockReservation.status == "active",
+            StockReservation.expires_at <= now
+        )
+        if reservation_ids is not None:
+            query = query.filter(StockReservation.id.in_(reservation_ids))
+        expired_ids = [reservation_id for reservation_id, in query.with_entities(StockReservation.id).all()]
+        if expired_ids:
+            db.query(StockReservation).filter(StockReservation.id.in_(expired_ids)) \
+                .update({StockReservation.status: "expired"}, synchronize_session=False)
+            db.query(StockReservationItem) \
+                .filter(StockReservationItem.reservation_id.in_(expired_ids), StockReservationItem.active == True) \
+                .update({StockReservationItem.active: False}, synchronize_session=False)
+        db.commit()
+        return len(expired_ids)
+
+    # Esta función expira lo vencido y carga en el montículo las reservas activas (al iniciar la aplicación)
+    @staticmethod
+    def load_pending(db: Session) -> int:
+        ReservationService.expire(db)
+        pending = db.query(StockReservation.expires_at, StockReservation.id) \
+            .filter(StockReservation.status == "active").all()
+        for expires_at, reservation_id in pending:
+            ReservationService._schedule(expires_at, reservation_id)
+        return len(pending)
@@ -0,0 +1,354 @@
+"""
+Rollup Service - Incremental daily sales rollup
+Feeds sales summary, top products and daily closure (RF10) without scanning sales/sale_items
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case, text
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import date, datetime, time
+from typing import Dict, Iterable, Optional, Tuple
+from ..models import DailySalesRollup, Sale, SaleItem, ReturnSale, ReturnItem
+from ..core.date_window import apply_date_window
+
+ROLLUP_COLUMNS = (
+    "sales_count", "units_sold", "revenue", "discount", "cogs",
+    "units_returned", "revenue_returned", "cogs_returned"
+)
+
+RollupKey = Tuple[date, str, int]
+
+class RollupService:
+    # Esta función suma los deltas recibidos sobre las filas del rollup (INSERT ... ON CONFLICT DO UPDATE cuando el motor lo soporta)
+    @staticmethod
+    def _upsert(db: Session, deltas: Dict[RollupKey, Dict[str, float]]):
+        """
+        Add deltas to rollup rows keyed by (sale_date, payment_method, product_id)
+        """
+        if not deltas:
+            return
+
+        values = [
+            {
+                "sale_date": sale_date,
+                "payment_method": payment_method,
+                "product_id": product_id,
+                **{column: row.get(column, 0) for column in ROLLUP_COLUMNS}
+            }
+            for (sale_date, payment_method, product_id), row in deltas.items()
+        ]
+
+        dialect = db.get_bind().dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+            stmt = insert(DailySalesRollup).values(values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["sale_date", "payment_method", "product_id"],
+                set_={
+                    column: getattr(DailySalesRollup, column) + getattr(stmt.excluded, column)
+                    for column in ROLLUP_COLUMNS
+                }
+            )
+            db.execute(stmt)
+            return
+
+        # Motores sin upsert nativo: leer-modificar-escribir dentro de la misma transacción
+        for value in values:
+            row = db.query(DailySalesRollup).filter(
+                DailySalesRollup.sale_date == value["sale_date"],
+                DailySalesRollup.payment_method == value["payment_method"],
+                DailySalesRollup.product_id == value["product_id"]
+            ).with_for_update().first()
+            if row is None:
+                db.add(DailySalesRollup(**value))
+            else:
+                for column in ROLLUP_COLUMNS:
+                    setattr(row, column, getattr(row, column) + value[column])
+        db.flush()
+
+    # Esta función acumula un delta dentro del diccionario de filas pendientes de escribir
+    @staticmethod
+    def _accumulate(deltas: Dict[RollupKey, Dict[str, float]], key: RollupKey, **values):
+        row = deltas.setdefault(key, {})
+        for column, value in values.items():
+            row[column] = row.get(column, 0) + value
+
+    # Esta función acumula los deltas de una venta (descuento repartido por línea, la venta se cuenta en su primera línea)
+    @staticmethod
+    def _sale_deltas(deltas: Dict[RollupKey, Dict[str, float]], sale: Sale, lines: Iterable[dict], sale_date: date):
+        lines = list(lines)
+        gross = sum(line["subtotal"] for line in lines)
+        share = (sale.discount or 0) / gross if gross > 0 else 0
+
+        for index, line in enumerate(lines):
+            line_discount = line["subtotal"] * share
+            RollupService._accumulate(
+                deltas, (sale_date, sale.payment_method, line["product_id"]),
+                sales_count=1 if index == 0 else 0,
+                units_sold=line["quantity"],
+                revenue=line["subtotal"] - line_discount,
+                discount=line_discount,
+                cogs=line["line_cost"] or 0
+            )
+
+    # Esta función calcula el día de filas ya escritas con la misma expresión que rebuild (func.date en la zona horaria de la base de datos)
+    @staticmethod
+    def days_of(db: Session, model, ids: Iterable[int]) -> Dict[int, date]:
+        """
+        Rollup day of flushed Sale / ReturnSale rows, so incremental rows and rebuild() agree on the day
+        whatever the timezones of the application server and the database.
+        """
+        return {
+            row_id: RollupService._as_date(day)
+            for row_id, day in db.query(model.id, func.date(model.created_at)).filter(model.id.in_(list(ids))).all()
+        }
+
+    # Esta función devuelve el día actual según la base de datos (el mismo calendario que las filas del rollup)
+    @staticmethod
+    def current_day(db: Session) -> date:
+        return RollupService._as_date(db.query(func.current_date()).scalar())
+
+    # Esta función registra una venta en el rollup del día (se llama antes del commit de create_sale, con la venta ya escrita)
+    @staticmethod
+    def record_sale(db: Session, sale: Sale, lines: Iterable[dict], sale_date: Optional[date] = None):
+        """
+        Add a sale to the rollup. The sale discount is split across lines
+        proportionally to their subtotal so revenue per row stays net.
+        """
+        if sale_date is None:
+            sale_date = RollupService.days_of(db, Sale, [sale.id])[sale.id]
+        deltas: Dict[RollupKey, Dict[str, float]] = {}
+        RollupService._sale_deltas(deltas, sale, lines, sale_date)
+        RollupService._upsert(db, deltas)
+
+    # Esta función registra varias ventas con un único upsert (sincronización por lotes)
+    @staticmethod
+    def record_sales(db: Session, sales: Iterable[Tuple[Sale, Iterable[dict], date]]):
+        deltas: Dict[RollupKey, Dict[str, float]] = {}
+        for sale, lines, sale_date in sales:
+            RollupService._sale_deltas(deltas, sale, lines, sale_date)
+        RollupService._upsert(db, deltas)
+
+    # Esta función registra una devolución en el rollup del día, valorizada al precio neto de la venta original
+    @staticmethod
+    def record_return(db: Session, sale: Sale, items: Iterable, return_id: Optional[int] = None,
+                      return_date: Optional[date] = None):
+        """
+        Add returned units to the rollup, using the original sale's payment
+        method, net unit price and captured unit cost for each returned product.
+        The day is taken from the flushed return (return_id) unless return_date is given.
+        """
+        items = list(items)
+        if not items:
+            return
+        if return_date is None:
+            return_date = RollupService.days_of(db, ReturnSale, [return_id])[return_id]
+        product_ids = {item.product_id for item in items}
+
+        # Precio y costo unitario de cada producto dentro de la venta original (una sola consulta agrupada)
+        sold = {
+            row.product_id: (float(row.subtotal or 0), float(row.line_cost or 0), int(row.quantity or 0))
+            for row in db.query(
+                SaleItem.product_id,
+                func.sum(SaleItem.subtotal).label("subtotal"),
+                func.sum(SaleItem.line_cost).label("line_cost"),
+                func.sum(SaleItem.quantity).label("quantity")
+            ).filter(SaleItem.sale_id == sale.id, SaleItem.product_id.in_(product_ids))
+             .group_by(SaleItem.product_id).all()
+        }
+
+        gross = (sale.total or 0) + (sale.discount or 0)
+        net_factor = (sale.total or 0) / gross if gross > 0 else 0
+
+        deltas: Dict[RollupKey, Dict[str, float]] = {}
+        for item in items:
+            subtotal, line_cost, quantity = sold.get(item.product_id, (0.0, 0.0, 0))
+            unit_price = subtotal / quantity if quantity else 0
+            unit_cost = line_cost / quantity if quantity else 0
+            RollupService._accumulate(
+                deltas, (return_date, sale.payment_method, item.product_id),
+                units_returned=item.quantity,
+                revenue_returned=item.quantity * unit_price * net_factor,
+                cogs_returned=item.quantity * unit_cost
+            )
+
+        RollupService._upsert(db, deltas)
+
+    # Esta función convierte el resultado de func.date() (date en PostgreSQL, texto en SQLite) a date
+    @staticmethod
+    def _as_date(value) -> date:
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        return date.fromisoformat(str(value))
+
+    # Esta función arma el rango de timestamps [desde 00:00, hasta 00:00) a partir de fechas
+    @staticmethod
+    def _day_bounds(date_from: Optional[date], date_to: Optional[date]):
+        start = datetime.combine(date_from, time.min) if date_from else None
+        end = datetime.combine(date_to, time.min) if date_to else None
+        return start, end
+
+    # Esta función agrupa las ventas históricas por día, método de pago y producto (mismas reglas que record_sale)
+    @staticmethod
+    def _sales_aggregates(db: Session, date_from: Optional[date] = None, date_to: Optional[date] = None):
+        first_items = db.query(
+            SaleItem.sale_id.label("sale_id"),
+            func.min(SaleItem.id).label("first_id")
+        ).group_by(SaleItem.sale_id).subquery()
+
+        gross = Sale.total + Sale.discount
+        share = case((gross > 0, Sale.discount / gross), else_=0)
+        sale_day = func.date(Sale.created_at)
+
+        query = db.query(
+            sale_day.label("sale_date"),
+            Sale.payment_method,
+            SaleItem.product_id,
+            func.sum(case((SaleItem.id == first_items.c.first_id, 1), else_=0)).label("sales_count"),
+            func.sum(SaleItem.quantity).label("units_sold"),
+            func.sum(SaleItem.subtotal - SaleItem.subtotal * share).label("revenue"),
+            func.sum(SaleItem.subtotal * share).label("discount"),
+            func.sum(SaleItem.line_cost).label("cogs")
+        ).select_from(SaleItem) \
+         .join(Sale, Sale.id == SaleItem.sale_id) \
+         .join(first_items, first_items.c.sale_id == Sale.id)
+
+        start, end = RollupService._day_bounds(date_from, date_to)
+        query = apply_date_window(query, Sale.created_at, start, end)
+        return query.group_by(sale_day, Sale.payment_method, SaleItem.product_id)
+
+    # Esta función agrupa las devoluciones históricas por día, método de pago de la venta y producto
+    @staticmethod
+    def _return_aggregates(db: Session, date_from: Optional[date] = None, date_to: Optional[date] = None):
+        sold = db.query(
+            SaleItem.sale_id.label("sale_id"),
+            SaleItem.product_id.label("product_id"),
+            (func.sum(SaleItem.subtotal) / func.sum(SaleItem.quantity)).label("unit_price"),
+            (func.sum(SaleItem.line_cost) / func.sum(SaleItem.quantity)).label("unit_cost")
+        ).group_by(SaleItem.sale_id, SaleItem.product_id).subquery()
+
+        gross = Sale.total + Sale.discount
+        net_factor = case((gross > 0, Sale.total / gross), else_=0)
+        return_day = func.date(ReturnSale.created_at)
+
+        query = db.query(
+            return_day.label("sale_date"),
+            Sale.payment_method,
+            ReturnItem.product_id,
+            func.sum(ReturnItem.quantity).label("units_returned"),
+            func.sum(ReturnItem.quantity * func.coalesce(sold.c.unit_price, 0) * net_factor).label("revenue_returned"),
+            func.sum(ReturnItem.quantity * func.coalesce(sold.c.unit_cost, 0)).label("cogs_returned")
+        ).select_from(ReturnItem) \
+         .join(ReturnSale, ReturnSale.id == ReturnItem.return_id) \
+         .join(Sale, Sale.id == ReturnSale.sale_id) \
+         .outerjoin(sold, (sold.c.sale_id == Sale.id) & (sold.c.product_id == ReturnItem.product_id))
+
+        start, end = RollupService._day_bounds(date_from, date_to)
+        query = apply_date_window(query, ReturnSale.created_at, start, end)
+        return query.group_by(return_day, Sale.payment_method, ReturnItem.product_id)
+
+    # Esta función reconstruye el rollup a partir del historial (backfill); sin fechas reconstruye todo
+    @staticmethod
+    def rebuild(db: Session, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                chunk_size: int = 1000) -> int:
+        """
+        Delete the rollup rows in [date_from, date_to) and recompute them from
+        sales and returns. Rows are streamed and upserted in chunks.
+        """
+        delete_query = db.query(DailySalesRollup)
+        if date_from is not None:
+            delete_query = delete_query.filter(DailySalesRollup.sale_date >= date_from)
+        if date_to is not None:
+            delete_query = delete_query.filter(DailySalesRollup.sale_date < date_to)
+        delete_query.delete(synchronize_session=False)
+
+        written = 0
+        for aggregates, columns in (
+            (RollupService._sales_aggregates(db, date_from, date_to),
+             ("sales_count", "units_sold", "revenue", "discount", "cogs")),
+            (RollupService._return_aggregates(db, date_from, date_to),
+             ("units_returned", "revenue_returned", "cogs_returned")),
+        ):
+            deltas: Dict[RollupKey, Dict[str, float]] = {}
+            for row in aggregates.yield_per(chunk_size):
+                key = (RollupService._as_date(row.sale_date), row.payment_method, row.product_id)
+                RollupService._accumulate(deltas, key, **{column: getattr(row, column) or 0 for column in columns})
+                if len(deltas) >= chunk_size:
+                    RollupService._upsert(db, deltas)
+                    written += len(deltas)
+                    deltas = {}
+            RollupService._upsert(db, deltas)
+            written += len(deltas)
+
+        db.commit()
+        return written
+
+    # Esta función llena el rollup desde el historial cuando la tabla todavía está vacía (primer arranque con el rollup)
+    @staticmethod
+    def backfill_if_empty(db: Session) -> int:
+        """
+        Rebuild the whole rollup if it has no rows yet, so the reports that read it
+        do not show zeros on databases created before the table existed.
+        Returns the rows written (0 when the rollup was already populated).
+        """
+        if db.bind.dialect.name == "postgresql":
+            # Varios procesos pueden arrancar a la vez: el bloqueo deja que solo el primero reconstruya
+            db.execute(text("LOCK TABLE daily_sales_rollup IN SHARE ROW EXCLUSIVE MODE"))
+        if db.query(DailySalesRollup.sale_date).first() is not None:
+            db.commit()
+            return 0
+        return RollupService.rebuild(db)
+
+    # Esta función compara el rollup contra las tablas de ventas/devoluciones y devuelve las diferencias por día y método de pago
+    @staticmethod
+    def check_consistency(db: Session, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                          tolerance: float = 0.01):
+        """
+        Compare rollup totals per (sale_date, payment_method) against the raw tables
+        """
+        fields = (
+            "sales_count", "units_sold", "revenue", "discount", "cogs",
+            "units_returned", "revenue_returned", "cogs_returned"
+        )
+
+        expected: Dict[Tuple[date, str], Dict[str, float]] = {}
+        for aggregates, columns in (
+            (RollupService._sales_aggregates(db, date_from, date_to),
+             ("sales_count", "units_sold", "revenue", "discount", "cogs")),
+            (RollupService._return_aggregates(db, date_from, date_to),
+             ("units_returned", "revenue_returned", "cogs_returned")),
+        ):
+            for row in aggregates.yield_per(1000):
+                bucket = expected.setdefault((RollupService._as_date(row.sale_date), row.payment_method), {})
+                for column in columns:
+                    bucket[column] = bucket.get(column, 0) + float(getattr(row, column) or 0)
+
+        actual_query = db.query(
+            DailySalesRollup.sale_date,
+            DailySalesRollup.payment_method,
+            *[func.sum(getattr(DailySalesRollup, column)).label(column) for column in fields]
+        )
+        if date_from is not None:
+            actual_query = actual_query.filter(DailySalesRollup.sale_date >= date_from)
+        if date_to is not None:
+            actual_query = actual_query.filter(DailySalesRollup.sale_date < date_to)
+        actual = {
+            (row.sale_date, row.payment_method): {column: float(getattr(row, column) or 0) for column in fields}
+            for row in actual_query.group_by(DailySalesRollup.sale_date, DailySalesRollup.payment_method).all()
+        }
+
+        mismatches = []
+        for key in sorted(set(expected) | set(actual)):
+            for column in fields:
+                expected_value = expected.get(key, {}).get(column, 0)
+                actual_value = actual.get(key, {}).get(column, 0)
+                if abs(expected_value - actual_value) > tolerance:
+                    mismatches.append({
+                        "date": key[0].isoformat(),
+                        "payment_method": key[1],
+                        "field": column,
+                        "expected": round(expected_value, 2),
+                        "actual": round(actual_value, 2)
+                    })
+        return mismatches
@@ -0,0 +1,241 @@
+"""
+Sale Batch Service - Offline POS synchronization
+Replays sales captured without connectivity in chunked transactions with bulk inserts
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime, timedelta, timezone
+from typing import Dict
+from ..models import Sale, SaleItem, StockMovement, IdempotencyKey
+from ..schemas.sale import SaleCreate
+from ..config import settings
+from .stock_service import StockService, InsufficientStockError
+from .rollup_service import RollupService
+from .audit_service import AuditService
+from .idempotency_service import IdempotencyService
+from .sale_service import SaleService
+from .event_service import EventService
+
+class SaleBatchService:
+    CHUNK_SIZE = 100
+
+    # Esta función sincroniza un lote ordenado de ventas fuera de línea y devuelve el resultado de cada una
+    @staticmethod
+    def sync(db: Session, entries: list, user_id: int = None):
+        """
+        Process client-stamped sales in order, CHUNK_SIZE per transaction.
+        client_sale_id doubles as the sale Idempotency-Key, so replays are reported as duplicates.
+        """
+        results: Dict[int, dict] = {}
+        seen: Dict[str, tuple] = {}  # client_sale_id -> (huella, sale_id)
+
+        for start in range(0, len(entries), SaleBatchService.CHUNK_SIZE):
+            chunk = list(enumerate(entries[start:start + SaleBatchService.CHUNK_SIZE], start))
+            for attempt in range(2):
+                chunk_seen = dict(seen)
+                try:
+                    results.update(SaleBatchService._process_chunk(db, chunk, chunk_seen, user_id))
+                    seen.update(chunk_seen)
+                    break
+                except (SQLAlchemyError, InsufficientStockError) as e:
+                    # Otra terminal escribió lo mismo en paralelo (o el bloque falló en la BD): reintentar una vez
+                    # con el estado actualizado; si vuelve a fallar solo se rechaza este bloque
+                    db.rollback()
+                    if attempt:
+                        for index, entry in chunk:
+                            results[index] = {
+                                "client_sale_id": entry.client_sale_id,
+                                "status": "rejected",
+                                "detail": f"Error sincronizando el bloque: {str(e)}"
+                            }
+
+        ordered = [results[index] for index in range(len(entries))]
+        return {
+            "created": sum(1 for result in ordered if result["status"] == "created"),
+            "duplicates": sum(1 for result in ordered if result["status"] == "duplicate"),
+            "rejected": sum(1 for result in ordered if result["status"] == "rejected"),
+            "results": ordered
+        }
+
+    # Esta función calcula la huella de la venta igual que create_sale para reconocer reintentos hechos en línea
+    @staticmethod
+    def _fingerprint(entry) -> str:
+        sale = SaleCreate.model_validate(entry.model_dump(exclude={"client_sale_id", "created_at"}))
+        return IdempotencyService.fingerprint(sale.model_dump_json())
+
+    # Esta función marca como duplicadas las ventas repetidas dentro del lote, apuntando a la venta creada por su primera aparición
+    @staticmethod
+    def _resolve_repeated(results: Dict[int, dict], repeated: list, seen: Dict[str, tuple]):
+        for index, client_sale_id, request_hash in repeated:
+            first_hash, sale_id = seen[client_sale_id]
+            if first_hash != request_hash:
+                results[index] = {
+                    "client_sale_id": client_sale_id,
+                    "status": "rejected",
+                    "detail": "El client_sale_id ya fue usado con una venta diferente"
+                }
+            else:
+                results[index] = {"client_sale_id": client_sale_id, "status": "duplicate", "sale_id": sale_id}
+
+    # Esta función procesa un bloque en una sola transacción: valida contra stock simulado y escribe todo con INSERT masivos
+    @staticmethod
+    def _process_chunk(db: Session, chunk: list, seen: Dict[str, tuple], user_id: int = None):
+        results: Dict[int, dict] = {}
+        now = datetime.now(timezone.utc)
+        hashes = {index: SaleBatchService._fingerprint(entry) for index, entry in chunk}
+
+        # Ventas ya sincronizadas antes (misma clave en idempotency_keys)
+        existing = {
+            record.key: record
+            for record in db.query(IdempotencyKey).filter(
+                IdempotencyKey.scope == "sale",
+                IdempotencyKey.key.in_({entry.client_sale_id for _, entry in chunk}),
+                IdempotencyKey.expires_at > now
+            ).all()
+        }
+
+        product_ids = {item.product_id for _, entry in chunk for item in entry.items}
+        products = StockService.lock_products(db, product_ids)
+        # Las ventas fuera de línea ya entregaron la mercadería: se validan contra el stock, no contra las reservas
+        available = {product_id: product.stock for product_id, product in products.items()}
+
+        accepted = []
+        repeated = []
+        for index, entry in chunk:
+            if entry.client_sale_id in seen:
+                # Repetida dentro del mismo lote: se resuelve cuando la primera aparición tenga ID
+                repeated.append((index, entry.client_sale_id, hashes[index]))
+                continue
+
+            record = existing.get(entry.client_sale_id)
+            if record is not None:
+                if record.request_hash != hashes[index] or record.resource_id is None:
+                    results[index] = {
+                        "client_sale_id": entry.client_sale_id,
+                        "status": "rejected",
+                        "detail": "El client_sale_id ya fue usado con una venta diferente o sigue en proceso"
+                    }
+                else:
+                    results[index] = {"client_sale_id": entry.client_sale_id, "status": "duplicate", "sale_id": record.resource_id}
+                continue
+
+            quantities = SaleService.cart_quantities(entry.items)
+
+            shortfalls = StockService._shortfalls(products, quantities, available)
+            if shortfalls:
+                results[index] = {
+                    "client_sale_id": entry.client_sale_id,
+                    "status": "rejected",
+                    "detail": "; ".join(shortfall["message"] for shortfall in shortfalls),
+                    "shortfalls": shortfalls
+                }
+                continue
+
+            for product_id, quantity in quantities.items():
+                available[product_id] -= quantity
+            seen[entry.client_sale_id] = (hashes[index], None)
+            accepted.append((index, entry, quantities))
+
+        if not accepted:
+            db.commit()  # liberar los bloqueos de productos
+            SaleBatchService._resolve_repeated(results, repeated, seen)
+            return results
+
+        # Cabeceras de venta con un único INSERT ... RETURNING (en el orden del lote)
+        sale_ids = db.execute(
+            insert(Sale).returning(Sale.id, sort_by_parameter_order=True),
+            [
+                {
+                    "total": SaleService.cart_total(entry.items, entry.discount),
+                    "discount": entry.discount,
+                    "payment_method": entry.payment_method,
+                    "tax_rate": entry.tax_rate,
+                    "tax_amount": entry.tax_amount,
+                    "client_id": entry.client_id,
+                    "user_id": user_id,
+                    "created_at": entry.created_at or now
+                }
+                for _, entry, _ in accepted
+            ]
+        ).scalars().all()
+
+        # Día del rollup de cada venta, con la misma expresión que RollupService.rebuild
+        sale_days = RollupService.days_of(db, Sale, sale_ids)
+
+        total_quantities: Dict[int, int] = {}
+        item_rows, movement_rows, key_rows, rollup_sales = [], [], [], []
+        for (index, entry, quantities), sale_id in zip(accepted, sale_ids):
+            lines = []
+            for item in entry.items:
+                unit_cost = products[item.product_id].price_purchase
+                lines.append({
+                    "sale_id": sale_id,
+                    "product_id": item.product_id,
+                    "quantity": item.quantity,
+                    "unit_price": item.unit_price,
+                    "subtotal": item.quantity * item.unit_price,
+                    "unit_cost": unit_cost,
+                    "line_cost": item.quantity * unit_cost
+                })
+            item_rows.extend(lines)
+
+            for product_id, quantity in quantities.items():
+                total_quantities[product_id] = total_quantities.get(product_id, 0) + quantity
+                movement_rows.append({
+                    "product_id": product_id,
+                    "type": "SALE",
+                    "quantity": quantity,
+                    "reason": "Venta sincronizada (fuera de línea)",
+                    "reference_type": "sale",
+                    "reference_id": sale_id,
+                    "user_id": user_id
+                })
+
+            key_rows.append({
+                "scope": "sale",
+                "key": entry.client_sale_id,
+                "request_hash": hashes[index],
+                "resource_id": sale_id,
+                "user_id": user_id,
+                "expires_at": now + timedelta(hours=settings.idempotency_ttl_hours)
+            })
+
+            rollup_sales.append((entry, lines, sale_days[sale_id]))
+
+            seen[entry.client_sale_id] = (hashes[index], sale_id)
+            results[index] = {"client_sale_id": entry.client_sale_id, "status": "created", "sale_id": sale_id}
+            EventService.emit(
+                db, "sale.created",
+                sale_id=sale_id, total=SaleService.cart_total(entry.items, entry.discount),
+                items_count=len(lines), client_id=entry.client_id
+            )
+
+        # Ventas sin partidas: no hay stock que descontar ni filas de detalle que insertar
+        if total_quantities:
+            StockService.apply_decrement(db, total_quantities, products)
+        if item_rows:
+            db.execute(insert(SaleItem), item_rows)
+        if movement_rows:
+            db.execute(insert(StockMovement), movement_rows)
+        db.execute(insert(IdempotencyKey), key_rows)
+        RollupService.record_sales(db, rollup_sales)
+
+        # Una sola entrada de auditoría por bloque, dentro de la misma transacción
+        AuditService.log_action(
+            db=db,
+            entity="venta",
+            entity_id=sale_ids[0],
+            action="sincronizar_lote",
+            user_id=user_id,
+            changes={
+                "sale_ids": list(sale_ids),
+                "count": len(sale_ids),
+                "total": round(sum(row["subtotal"] for row in item_rows) - sum(entry.discount for _, entry, _ in accepted), 2)
+            },
+            commit=False
+        )
+        db.commit()
+
+        SaleBatchService._resolve_repeated(results, repeated, seen)
+        return results
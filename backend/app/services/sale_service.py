@@ -0,0 +1,75 @@
+"""
+Sale Service - Cart arithmetic and validation shared by create_sale, the batch sync and the quote endpoint
+"""
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional
+from ..models import Product
+from .stock_service import StockService
+
+
+class SaleService:
+    # Esta función agrupa las cantidades del carrito por producto (un producto puede venir en varias líneas)
+    @staticmethod
+    def cart_quantities(items: Iterable) -> Dict[int, int]:
+        quantities: Dict[int, int] = {}
+        for item in items:
+            if item.quantity <= 0:
+                raise ValueError("La cantidad debe ser mayor a 0")
+            quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+        return quantities
+
+    # Esta función calcula el total de la venta: suma de (cantidad x precio) de cada línea menos el descuento
+    @staticmethod
+    def cart_total(items: Iterable, discount: float, unit_prices: Optional[List[float]] = None) -> float:
+        """
+        unit_prices (by line position) replaces the line prices, e.g. quotes priced at the current price_sale
+        """
+        items = list(items)
+        if unit_prices is None:
+            unit_prices = [item.unit_price for item in items]
+        return sum(item.quantity * unit_price for item, unit_price in zip(items, unit_prices)) - discount
+
+    # Esta función cotiza un carrito sin escribir nada: un solo SELECT ... IN para precios y stock de todas las líneas
+    @staticmethod
+    def quote(db: Session, cart) -> dict:
+        """
+        Price and validate a cart exactly as create_sale would, without locking or writing.
+        Availability (stock minus other carts' holds) is a snapshot: the sale re-checks it under row locks.
+        """
+        quantities = SaleService.cart_quantities(cart.items)
+        products = {
+            product.id: product
+            for product in db.query(Product).filter(Product.id.in_(quantities.keys())).all()
+        }
+        available = StockService.available(db, products, getattr(cart, "reservation_id", None))
+        shortfalls = StockService._shortfalls(products, quantities, available)
+        short_by_product = {shortfall["product_id"]: shortfall for shortfall in shortfalls}
+
+        lines = []
+        for item in cart.items:
+            product = products.get(item.product_id)
+            price_sale = product.price_sale if product is not None else None
+            unit_price = item.unit_price if item.unit_price is not None else (price_sale or 0.0)
+            shortfall = short_by_product.get(item.product_id)
+            lines.append({
+                "product_id": item.product_id,
+                "name": product.name if product is not None else None,
+                "quantity": item.quantity,
+                "unit_price": unit_price,
+                "price_sale": price_sale,
+                "price_matches": price_sale is not None and abs(unit_price - price_sale) < 0.005,
+                "subtotal": item.quantity * unit_price,
+                "available": available.get(item.product_id, 0),
+                "is_available": shortfall is None,
+                "reason": shortfall["reason"] if shortfall else None
+            })
+
+        subtotal = sum(line["subtotal"] for line in lines)
+        return {
+            "lines": lines,
+            "subtotal": subtotal,
+            "discount": cart.discount,
+            "total": SaleService.cart_total(cart.items, cart.discount, [line["unit_price"] for line in lines]),
+            "valid": not shortfalls,
+            "shortfalls": shortfalls
+        }
@@ -0,0 +1,208 @@
+"""
+Stock Ledger Service - Balances derived from stock_movements (RF12 kardex)
+Running balances are computed in SQL with SUM() OVER (ORDER BY created_at, id), seeded from the
+nearest stock checkpoint so reading late in a product's history does not replay it from the start.
+A scheduled job writes a checkpoint every stock_checkpoint_interval_days at midnight; stock at any
+past instant is that checkpoint plus the movements since.
+"""
+import threading
+from sqlalchemy.orm import Session
+from sqlalchemy import case, func, insert, select, tuple_, union_all
+from sqlalchemy.exc import IntegrityError
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Optional, Tuple
+from ..models import Product, StockMovement, StockCheckpoint
+from ..config import settings
+from ..core.pagination import Page, encode_cursor, decode_cursor, InvalidCursorError, _sort_expression
+
+# Tipos de movimiento que suman stock; el resto (SALE, OUT, EXIT, ADJUSTMENT) lo descuenta
+INBOUND_TYPES = ("IN", "ENTRY", "RETURN")
+
+
+class StockLedgerService:
+    _checkpoint_timer: Optional[threading.Timer] = None
+
+    # Esta función devuelve la cantidad con signo de un movimiento (+ entradas, - salidas) como expresión SQL
+    @staticmethod
+    def signed_quantity():
+        return case((StockMovement.type.in_(INBOUND_TYPES), StockMovement.quantity), else_=-StockMovement.quantity)
+
+    # Esta función busca el último corte de stock anterior o igual a un instante: (checkpoint_at, saldo del producto)
+    @staticmethod
+    def nearest_checkpoint(db: Session, product_id: int, at: datetime) -> Optional[Tuple[datetime, int]]:
+        checkpoint_at = db.query(func.max(StockCheckpoint.checkpoint_at)) \
+            .filter(StockCheckpoint.checkpoint_at <= at).scalar()
+        if checkpoint_at is None:
+            return None
+        balance = db.query(StockCheckpoint.balance) \
+            .filter(StockCheckpoint.checkpoint_at == checkpoint_at, StockCheckpoint.product_id == product_id) \
+            .scalar()
+        return checkpoint_at, balance or 0
+
+    # Esta función escribe el corte de stock de todos los productos en un instante a partir del corte anterior
+    @staticmethod
+    def capture(db: Session, at: datetime) -> int:
+        """
+        Balances at `at` = previous checkpoint + movements in [previous, at), in one grouped query.
+        Only non-zero balances are stored. Returns the rows written (0 if that checkpoint already exists).
+        """
+        if db.query(StockCheckpoint.id).filter(StockCheckpoint.checkpoint_at == at).first() is not None:
+            return 0
+
+        previous_at = db.query(func.max(StockCheckpoint.checkpoint_at)) \
+            .filter(StockCheckpoint.checkpoint_at < at).scalar()
+        balances: Dict[int, int] = {}
+        deltas = db.query(StockMovement.product_id, func.sum(StockLedgerService.signed_quantity())) \
+            .filter(StockMovement.created_at < at)
+        if previous_at is not None:
+            balances = dict(
+                db.query(StockCheckpoint.product_id, StockCheckpoint.balance)
+                .filter(StockCheckpoint.checkpoint_at == previous_at).all()
+            )
+            deltas = deltas.filter(StockMovement.created_at >= previous_at)
+        for product_id, delta in deltas.group_by(StockMovement.product_id).all():
+            balances[product_id] = balances.get(product_id, 0) + int(delta or 0)
+
+        rows = [
+            {"checkpoint_at": at, "product_id": product_id, "balance": balance}
+            for product_id, balance in balances.items() if balance
+        ]
+        if rows:
+            db.execute(insert(StockCheckpoint), rows)
+        return len(rows)
+
+    # Esta función arma una página del kardex de un producto: cada movimiento con su cantidad con signo y el saldo acumulado
+    @staticmethod
+    def kardex(db: Session, product_id: int, since: Optional[datetime] = None,
+               cursor: Optional[str] = None, limit: int = 100) -> Page:
+        """
+        Chronological (created_at, id) page. The first page starts at `since` (or the first movement),
+        with the window seeded from the nearest checkpoint; the next cursor carries the last balance,
+        so following pages only read their own rows.
+        """
+        movements = db.query(StockMovement).filter(StockMovement.product_id == product_id)
+        order_key = tuple_(
+            _sort_expression(movements, StockMovement.created_at), _sort_expression(movements, StockMovement.id)
+        )
+        seed = 0
+        if cursor:
+            values = decode_cursor(cursor)
+            if len(values) != 3 or not isinstance(values[0], datetime) or not isinstance(values[2], int):
+                raise InvalidCursorError("El cursor no corresponde al kardex")
+            after_at, after_id, seed = values
+            movements = movements.filter(order_key > tuple_(
+                _sort_expression(movements, StockMovement.created_at, after_at),
+                _sort_expression(movements, StockMovement.id, after_id)
+            ))
+        elif since is not None:
+            checkpoint = StockLedgerService.nearest_checkpoint(db, product_id, since)
+            if checkpoint is not None:
+                checkpoint_at, seed = checkpoint
+                movements = movements.filter(StockMovement.created_at >= checkpoint_at)
+
+        signed = StockLedgerService.signed_quantity()
+        ledger = movements.with_entities(
+            StockMovement.id,
+            StockMovement.created_at,
+            StockMovement.type,
+            StockMovement.quantity,
+            signed.label("signed_quantity"),
+            (seed + func.sum(signed).over(order_by=(StockMovement.created_at, StockMovement.id))).label("balance"),
+            StockMovement.reason,
+            StockMovement.reference_type,
+            StockMovement.reference_id,
+            StockMovement.user_id
+        ).subquery()
+
+        query = db.query(ledger)
+        if since is not None and not cursor:
+            query = query.filter(
+                _sort_expression(query, ledger.c.created_at) >= _sort_expression(query, ledger.c.created_at, since)
+            )
+        items = query.order_by(ledger.c.created_at, ledger.c.id).limit(limit).all()
+
+        next_cursor = None
+        if limit and len(items) == limit:
+            last = items[-1]
+            next_cursor = encode_cursor([last.created_at, last.id, int(last.balance)])
+        return Page(items, next_cursor)
+
+    # Esta función devuelve la medianoche local (con zona horaria) que inicia un día
+    @staticmethod
+    def day_start(day: date) -> datetime:
+        return datetime.combine(day, time.min).astimezone()
+
+    # Esta función escribe los cortes pendientes hasta la última medianoche del intervalo y programa el siguiente
+    @staticmethod
+    def run_checkpoints(schedule: bool = True):
+        """
+        Without checkpoints the first one is the last midnight (one full replay of the history);
+        afterwards every interval is captured in order, catching up after downtime.
+        A checkpoint is written stock_checkpoint_grace_minutes after its instant so that movements
+        stamped just before midnight have been committed.
+        """
+        from ..database import SessionLocal
+        interval = timedelta(days=settings.stock_checkpoint_interval_days)
+        grace = timedelta(minutes=settings.stock_checkpoint_grace_minutes)
+        next_at = None
+        db = SessionLocal()
+        try:
+            last_at = db.query(func.max(StockCheckpoint.checkpoint_at)).scalar()
+            next_at = last_at + interval if last_at is not None \
+                else StockLedgerService.day_start((datetime.now().astimezone() - grace).date())
+            if next_at.tzinfo is None:
+                next_at = next_at.astimezone()
+            while next_at + grace <= datetime.now().astimezone():
+                StockLedgerService.capture(db, next_at)
+                db.commit()
+                next_at += interval
+        except IntegrityError:
+            # Otro proceso escribió el mismo corte
+            db.rollback()
+        except Exception as e:
+            db.rollback()
+            print(f"WARNING: Falló la escritura de cortes de stock: {e}")
+        finally:
+            db.close()
+
+        if schedule:
+            # Si no se pudo leer el último corte, reintentar en una hora
+            delay = max((next_at + grace - datetime.now().astimezone()).total_seconds(), 60) if next_at else 3600
+            StockLedgerService._checkpoint_timer = threading.Timer(delay, StockLedgerService.run_checkpoints)
+            StockLedgerService._checkpoint_timer.daemon = True
+            StockLedgerService._checkpoint_timer.start()
+
+    # Esta función calcula el stock de cada producto en un instante: último corte + movimientos desde entonces, en una consulta agrupada
+    @staticmethod
+    def stock_as_of(db: Session, at: datetime):
+        """
+        Returns (checkpoint_at or None, rows of Product columns + quantity) for products with a non-zero balance.
+        Cost is O(products + movements since the checkpoint).
+        """
+        checkpoint_at = db.query(func.max(StockCheckpoint.checkpoint_at)) \
+            .filter(StockCheckpoint.checkpoint_at <= at).scalar()
+
+        movements = select(
+            StockMovement.product_id.label("product_id"),
+            StockLedgerService.signed_quantity().label("quantity")
+        ).where(StockMovement.created_at < at)
+        if checkpoint_at is not None:
+            movements = movements.where(StockMovement.created_at >= checkpoint_at)
+            balances = union_all(
+                select(StockCheckpoint.product_id.label("product_id"), StockCheckpoint.balance.label("quantity"))
+                .where(StockCheckpoint.checkpoint_at == checkpoint_at),
+                movements
+            ).subquery()
+        else:
+            balances = movements.subquery()
+
+        quantity = func.sum(balances.c.quantity)
+        rows = db.query(
+            Product.id, Product.name, Product.sku, Product.category,
+            Product.price_purchase, Product.price_sale, quantity.label("quantity")
+        ).join(balances, balances.c.product_id == Product.id) \
+         .group_by(Product.id, Product.name, Product.sku, Product.category, Product.price_purchase, Product.price_sale) \
+         .having(quantity != 0) \
+         .order_by(Product.id) \
+         .all()
+        return checkpoint_at, rows
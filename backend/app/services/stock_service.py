@@ -3,10 +3,159 @@ Stock Service - Business logic for stock management
 RF41: Automatic stock reduction on sales
 """
 from sqlalchemy.orm import Session
-from ..models import Product, StockMovement
-from datetime import datetime
+from sqlalchemy import case, func, insert
+from typing import Dict, Iterable, List, Optional
+from ..models import Product, StockMovement, StockReservationItem
+from .product_cache_service import ProductCacheService
+from .product_change_service import ProductChangeService
+from .alert_service import AlertService
+from .event_service import EventService
+from .lot_service import LotService
+from datetime import datetime, timezone
+
+class InsufficientStockError(ValueError):
+    """
+    Raised when one or more lines cannot be served; carries every shortfall at once
+    """
+    def __init__(self, shortfalls: List[dict]):
+        self.shortfalls = shortfalls
+        super().__init__("; ".join(shortfall["message"] for shortfall in shortfalls))
+
 
 class StockService:
+    # Esta función carga varios productos en una sola consulta IN, bloqueando sus filas donde el motor lo soporta (FOR UPDATE)
+    @staticmethod
+    def lock_products(db: Session, product_ids) -> Dict[int, Product]:
+        return {
+            product.id: product
+            for product in db.query(Product)
+                .filter(Product.id.in_(list(product_ids)))
+                .with_for_update()
+                .all()
+        }
+
+    # Esta función suma las cantidades retenidas por reservas activas y vigentes (lectura sobre el índice product_id, active, expires_at)
+    @staticmethod
+    def held_quantities(db: Session, product_ids: Iterable[int], exclude_reservation_id: Optional[int] = None) -> Dict[int, int]:
+        query = db.query(StockReservationItem.product_id, func.sum(StockReservationItem.quantity)).filter(
+            StockReservationItem.product_id.in_(list(product_ids)),
+            StockReservationItem.active == True,
+            StockReservationItem.expires_at > datetime.now(timezone.utc)
+        )
+        if exclude_reservation_id is not None:
+            query = query.filter(StockReservationItem.reservation_id != exclude_reservation_id)
+        return dict(query.group_by(StockReservationItem.product_id).all())
+
+    # Esta función calcula el stock disponible para vender (stock menos reservas activas) de los productos ya cargados
+    @staticmethod
+    def available(db: Session, products: Dict[int, Product], exclude_reservation_id: Optional[int] = None) -> Dict[int, int]:
+        held = StockService.held_quantities(db, products.keys(), exclude_reservation_id) if products else {}
+        return {
+            product_id: max(product.stock - held.get(product_id, 0), 0)
+            for product_id, product in products.items()
+        }
+
+    # Esta función aplica el descuento de stock de todas las filas con un único UPDATE condicional
+    @staticmethod
+    def apply_decrement(db: Session, quantities: Dict[int, int], products: Dict[int, Product]):
+        """
+        UPDATE products SET stock = stock - :q WHERE id IN (...) AND stock >= :q, then the lots are consumed FEFO.
+        Raises InsufficientStockError if any row did not satisfy the guard.
+        """
+        # Filas bloqueadas: el stock resultante se conoce sin volver a leerlo
+        new_stock = {
+            product_id: products[product_id].stock - quantity
+            for product_id, quantity in quantities.items() if product_id in products
+        }
+        requested = case(quantities, value=Product.id)
+        updated = db.query(Product) \
+            .filter(Product.id.in_(quantities.keys()), Product.stock >= requested) \
+            .update({Product.stock: Product.stock - requested}, synchronize_session=False)
+
+        for product in products.values():
+            db.expire(product, ["stock"])
+        ProductCacheService.invalidate_stock(db, *quantities.keys())
+        ProductChangeService.touch(db, *quantities.keys())
+        AlertService.track(db, *quantities.keys())
+        for product_id, stock in new_stock.items():
+            EventService.emit(db, "stock.changed", product_id=product_id, stock=stock)
+
+        if updated != len(quantities):
+            # Otra transacción ganó la carrera: informar el faltante con el stock actual (el llamador hace rollback)
+            fresh = {
+                product.id: product
+                for product in db.query(Product).filter(Product.id.in_(quantities.keys())).all()
+            }
+            raise InsufficientStockError(StockService._shortfalls(fresh, quantities))
+
+        LotService.allocate(db, quantities)
+
+    # Esta función descuenta el stock de varios productos en bloque: una lectura IN con bloqueo, un UPDATE condicional y un INSERT masivo de movimientos
+    @staticmethod
+    def reduce_stock_batch(db: Session, quantities: Dict[int, int], reason: str,
+                           reference_type: str = "sale", reference_id: int = None, user_id: int = None):
+        """
+        Reduce stock for several products atomically (RF41).
+        Units held by other carts' active reservations are not available; a reservation consumed
+        earlier in the same transaction no longer counts as held.
+        Returns {product_id: Product}; raises InsufficientStockError listing every short line.
+        """
+        if not quantities:
+            return {}
+
+        products = StockService.lock_products(db, quantities.keys())
+
+        shortfalls = StockService._shortfalls(products, quantities, StockService.available(db, products))
+        if shortfalls:
+            raise InsufficientStockError(shortfalls)
+
+        StockService.apply_decrement(db, quantities, products)
+
+        db.execute(insert(StockMovement), [
+            {
+                "product_id": product_id,
+                "type": "SALE" if reference_type == "sale" else "OUT",
+                "quantity": quantity,
+                "reason": reason,
+                "reference_type": reference_type,
+                "reference_id": reference_id,
+                "user_id": user_id
+            }
+            for product_id, quantity in quantities.items()
+        ])
+
+        return products
+
+    # Esta función arma la lista de faltantes (producto inexistente o stock insuficiente) por cada línea solicitada
+    @staticmethod
+    def _shortfalls(products: Dict[int, Product], quantities: Dict[int, int], available: Optional[Dict[int, int]] = None):
+        shortfalls = []
+        for product_id, quantity in quantities.items():
+            product = products.get(product_id)
+            if product is None:
+                shortfalls.append({
+                    "product_id": product_id,
+                    "reason": "not_found",
+                    "requested": quantity,
+                    "available": 0,
+                    "message": f"Product {product_id} not found"
+                })
+                continue
+            # available permite validar contra un stock simulado en memoria (sincronización por lotes)
+            stock = available.get(product_id, product.stock) if available is not None else product.stock
+            if stock < quantity:
+                shortfalls.append({
+                    "product_id": product_id,
+                    "reason": "insufficient_stock",
+                    "requested": quantity,
+                    "available": stock,
+                    "message": (
+                        f"No hay stock disponible de {product.name}" if stock <= 0 else
+                        f"Stock insuficiente de {product.name}. Disponible: {stock}, solicitado: {quantity}"
+                    )
+                })
+        return shortfalls
+
     # Esta función se encarga de reducir la cantidad de stock de un producto tras una venta o salida
     @staticmethod
     def reduce_stock(db: Session, product_id: int, quantity: int, reason: str, 
@@ -14,29 +163,11 @@ class StockService:
         """
         Reduce stock for a product (RF41)
         """
-        product = db.query(Product).filter(Product.id == product_id).first()
-        if not product:
-            raise ValueError(f"Product {product_id} not found")
-        
-        if product.stock < quantity:
-            raise ValueError(f"Insufficient stock for {product.name}. Available: {product.stock}, Requested: {quantity}")
-        
-        # Update stock
-        product.stock -= quantity
-        
-        # Create stock movement record
-        movement = StockMovement(
-            product_id=product_id,
-            type="SALE" if reference_type == "sale" else "OUT",
-            quantity=quantity,
-            reason=reason,
-            reference_type=reference_type,
-            reference_id=reference_id,
-            user_id=user_id
+        products = StockService.reduce_stock_batch(
+            db, {product_id: quantity}, reason,
+            reference_type=reference_type, reference_id=reference_id, user_id=user_id
         )
-        db.add(movement)
-        
-        return product
+        return products[product_id]
     
     # Esta función incrementa el stock de un producto cuando se recibe mercadería o una devolución
     @staticmethod
@@ -51,6 +182,10 @@ class StockService:
         
         # Update stock
         product.stock += quantity
+        ProductCacheService.invalidate_stock(db, product_id)
+        ProductChangeService.touch(db, product_id)
+        AlertService.track(db, product_id)
+        EventService.emit(db, "stock.changed", product_id=product_id, stock=product.stock)
         
         # Create stock movement record
         movement = StockMovement(
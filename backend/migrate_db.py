@@ -0,0 +1,118 @@
+import sys
+import os
+import argparse
+
+# Add the current directory to sys.path to allow imports from 'app'
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import inspect, select, update, func, text
+from app.database import engine, Base, SessionLocal
+from app.models import Product, SaleItem, ChangeCounter
+from app.services.product_search_service import ProductSearchService
+from app.services.change_counter_service import ChangeCounterService, PRODUCT_VERSION_COUNTER
+from app.services.alert_service import AlertService
+from app.services.stock_ledger_service import StockLedgerService
+from app.services.rollup_service import RollupService
+
+# Esta función agrega a las tablas existentes las columnas nuevas de los modelos (create_all solo crea tablas faltantes)
+def add_missing_columns():
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    print(f"AVISO: {table.name}.{column.name} es NOT NULL sin valor por defecto; agréguela manualmente.")
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                default = ""
+                if column.server_default is not None:
+                    arg = column.server_default.arg
+                    default = f" DEFAULT '{arg}'" if isinstance(arg, str) else f" DEFAULT {arg.compile(dialect=engine.dialect)}"
+                print(f"Agregando columna {table.name}.{column.name} ({column_type})...")
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{default}"))
+
+# Esta función crea los índices declarados en los modelos que todavía no existen en la base de datos
+def create_missing_indexes():
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+# Esta función completa unit_cost/line_cost de las líneas de venta históricas en lotes por rango de ID
+def backfill_sale_item_costs(batch_size: int = 5000):
+    db = SessionLocal()
+    try:
+        max_id = db.query(func.max(SaleItem.id)).scalar() or 0
+        purchase_price = select(Product.price_purchase).where(Product.id == SaleItem.product_id).scalar_subquery()
+
+        updated = 0
+        for start in range(0, max_id + 1, batch_size):
+            result = db.execute(
+                update(SaleItem)
+                .where(SaleItem.id >= start, SaleItem.id < start + batch_size, SaleItem.unit_cost.is_(None))
+                .values(unit_cost=purchase_price, line_cost=SaleItem.quantity * purchase_price)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            updated += result.rowcount or 0
+        print(f"Líneas de venta con costo completado: {updated}")
+    finally:
+        db.close()
+
+# Esta función asigna una versión distinta (su ID) a los productos existentes sin versión y adelanta el contador de versiones
+def backfill_product_change_versions():
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            update(Product)
+            .where(Product.change_version == 0)
+            .values(change_version=Product.id, updated_at=Product.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        max_version = db.query(func.max(Product.change_version)).scalar() or 0
+        db.execute(
+            update(ChangeCounter)
+            .where(ChangeCounter.table_name == PRODUCT_VERSION_COUNTER, ChangeCounter.version < max_version)
+            .values(version=max_version)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        print(f"Productos con versión de cambio asignada: {result.rowcount or 0}")
+    finally:
+        db.close()
+
+# Esta función reconstruye el rollup diario de ventas si todavía no tiene filas (los reportes solo leen el rollup)
+def backfill_sales_rollup():
+    db = SessionLocal()
+    try:
+        written = RollupService.backfill_if_empty(db)
+        print(f"Filas del rollup diario de ventas reconstruidas: {written}")
+    finally:
+        db.close()
+
+def migrate(batch_size: int = 5000):
+    print("--- Iniciando migración de la base de datos ---")
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    create_missing_indexes()
+    ProductSearchService.setup(engine)
+    ChangeCounterService.setup(engine)
+    backfill_sale_item_costs(batch_size)
+    backfill_product_change_versions()
+    backfill_sales_rollup()
+    AlertService.sweep(schedule=False)
+    StockLedgerService.run_checkpoints(schedule=False)
+    print("--- Migración completada con éxito ---")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aplicar columnas, índices y backfills pendientes")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Filas por lote en los backfills")
+    args = parser.parse_args()
+    migrate(args.batch_size)
@@ -0,0 +1,51 @@
+import sys
+import os
+import argparse
+from datetime import date
+
+# Add the current directory to sys.path to allow imports from 'app'
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import engine, Base, SessionLocal
+from app.services.rollup_service import RollupService
+
+# Este script reconstruye (backfill) el rollup diario de ventas desde el historial y verifica su consistencia
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruir o verificar la tabla daily_sales_rollup")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="Fecha inicial incluida (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="Fecha final excluida (YYYY-MM-DD)")
+    parser.add_argument("--check", action="store_true", help="Solo verificar la consistencia, sin reconstruir")
+    args = parser.parse_args()
+
+    # Crear la tabla del rollup si todavía no existe
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        if not args.check:
+            print("--- Reconstruyendo daily_sales_rollup ---")
+            written = RollupService.rebuild(db, args.date_from, args.date_to)
+            print(f"Filas escritas: {written}")
+
+        print("--- Verificando consistencia del rollup ---")
+        mismatches = RollupService.check_consistency(db, args.date_from, args.date_to)
+        for mismatch in mismatches:
+            print(
+                f"[DIFERENCIA] {mismatch['date']} {mismatch['payment_method']} {mismatch['field']}: "
+                f"esperado={mismatch['expected']} rollup={mismatch['actual']}"
+            )
+        if mismatches:
+            print(f"--- {len(mismatches)} diferencias encontradas ---")
+            return 1
+
+        print("--- Rollup consistente ---")
+        return 0
+    except Exception as e:
+        print(f"ERROR durante la reconstrucción: {e}")
+        db.rollback()
+        return 1
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
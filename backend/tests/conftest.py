@@ -0,0 +1,46 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# La API se importa contra una base SQLite temporal (antes de cargar app.config)
+_DB_DIR = tempfile.mkdtemp(prefix="product_tracker_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from app.main import app
+from app.api.deps import get_current_active_user
+from app.database import SessionLocal, engine as db_engine
+from app.models import User
+
+
+# Este fixture crea el usuario administrador de las pruebas y salta la autenticación JWT
+@pytest.fixture(scope="session")
+def user():
+    db = SessionLocal()
+    try:
+        user = User(username="tests", email="tests@example.com", hashed_password="x", full_name="Tests", role="admin", is_active=True)
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        db.expunge(user)
+        return user
+    finally:
+        db.close()
+
+
+# Este fixture levanta la API (con sus eventos de arranque) una sola vez para toda la sesión de pruebas
+@pytest.fixture(scope="session")
+def client(user):
+    app.dependency_overrides[get_current_active_user] = lambda: user
+    with TestClient(app) as client:
+        yield client
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture(scope="session")
+def engine():
+    return db_engine
@@ -0,0 +1,49 @@
+from contextlib import contextmanager
+from typing import Iterator, List
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Este contador registra las sentencias SQL ejecutadas por un engine mientras está activo
+class QueryCounter:
+    """
+    Counts statements executed on an engine; used to check that list endpoints run a fixed number of queries
+    """
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+# Este context manager cuenta las consultas ejecutadas dentro del bloque
+@contextmanager
+def count_queries(engine: Engine) -> Iterator[QueryCounter]:
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter._record)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", counter._record)
+
+
+# Este context manager falla si el bloque ejecuta más (o distinta cantidad) de consultas que las esperadas
+@contextmanager
+def assert_query_count(engine: Engine, expected: int, at_most: bool = False) -> Iterator[QueryCounter]:
+    """
+    Usage:
+        with assert_query_count(engine, 3):
+            client.get("/api/sales/?limit=100")
+    """
+    with count_queries(engine) as counter:
+        yield counter
+    failed = counter.count > expected if at_most else counter.count != expected
+    if failed:
+        executed = "\n".join(f"  {index + 1}. {statement}" for index, statement in enumerate(counter.statements))
+        raise AssertionError(
+            f"Se esperaban {'como máximo ' if at_most else ''}{expected} consultas y se ejecutaron {counter.count}:\n{executed}"
+        )
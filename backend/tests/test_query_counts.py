@@ -0,0 +1,97 @@
+"""
+Fixed query counts for the list endpoints: the eager-loading policy (app/core/loading.py) must keep the
+number of statements independent of the page size, so an N+1 regression fails here.
+"""
+import pytest
+
+from app.services import ProductCacheService
+from query_count import assert_query_count
+
+ROWS = 12
+PAGE_SIZES = (5, 10)
+
+
+# Este fixture carga un proveedor con catálogo, productos, ventas, devoluciones y órdenes de compra (dos partidas cada una)
+@pytest.fixture(scope="module")
+def seeded(client):
+    supplier = client.post("/api/suppliers/", json={"name": "Proveedor pruebas"}).json()
+    products = []
+    for index in range(ROWS):
+        response = client.post("/api/products/", json={
+            "name": f"Producto {index}", "sku": f"QC-{index:03d}", "category": "pruebas",
+            "price_purchase": 1.0, "price_sale": 2.0, "unit": "u", "stock": 100, "min_stock": 1,
+            "supplier_id": supplier["id"]
+        })
+        assert response.status_code == 201, response.text
+        products.append(response.json())
+
+    for index in range(ROWS):
+        first, second = products[index], products[(index + 1) % ROWS]
+        sale = client.post("/api/sales/", json={"payment_method": "efectivo", "items": [
+            {"product_id": first["id"], "quantity": 2, "unit_price": 2.0},
+            {"product_id": second["id"], "quantity": 1, "unit_price": 2.0}
+        ]})
+        assert sale.status_code == 201, sale.text
+        returned = client.post("/api/returns/", json={
+            "sale_id": sale.json()["id"], "reason": "pruebas",
+            "items": [{"product_id": first["id"], "quantity": 1}, {"product_id": second["id"], "quantity": 1}]
+        })
+        assert returned.status_code == 200, returned.text
+        order = client.post("/api/purchase-orders/", json={"supplier_id": supplier["id"], "items": [
+            {"product_id": first["id"], "quantity": 5, "unit_cost": 1.0},
+            {"product_id": second["id"], "quantity": 5, "unit_cost": 1.0}
+        ]})
+        assert order.status_code == 201, order.text
+
+    # Segundo proveedor con un catálogo más corto (el catálogo no se pagina: se compara por tamaño)
+    small = client.post("/api/suppliers/", json={"name": "Proveedor pruebas (corto)"}).json()
+    for product in products[:PAGE_SIZES[0]]:
+        response = client.post(f"/api/suppliers/{small['id']}/catalogue", json={
+            "product_id": product["id"], "supplier_id": small["id"], "cost_price_by_supplier": 1.0
+        })
+        assert response.status_code == 200, response.text
+    return {"suppliers": {PAGE_SIZES[0]: small, ROWS: supplier}, "products": products}
+
+
+# Esta función pide una página y verifica la cantidad exacta de consultas ejecutadas
+def _assert_page(client, engine, url: str, limit: int, expected: int):
+    with assert_query_count(engine, expected):
+        response = client.get(url, params={"limit": limit})
+    assert response.status_code == 200, response.text
+    assert len(response.json()) == limit
+
+
+@pytest.mark.parametrize("limit", PAGE_SIZES)
+def test_products_list_cold_cache(client, engine, seeded, limit):
+    ProductCacheService.clear()
+    _assert_page(client, engine, "/api/products/", limit, 4)
+
+
+@pytest.mark.parametrize("limit", PAGE_SIZES)
+def test_products_list_warm_cache(client, engine, seeded, limit):
+    client.get("/api/products/", params={"limit": limit})
+    _assert_page(client, engine, "/api/products/", limit, 2)
+
+
+@pytest.mark.parametrize("limit", PAGE_SIZES)
+def test_sales_list(client, engine, seeded, limit):
+    _assert_page(client, engine, "/api/sales/", limit, 2)
+
+
+@pytest.mark.parametrize("limit", PAGE_SIZES)
+def test_returns_list(client, engine, seeded, limit):
+    _assert_page(client, engine, "/api/returns/", limit, 2)
+
+
+@pytest.mark.parametrize("limit", PAGE_SIZES)
+def test_purchase_orders_list(client, engine, seeded, limit):
+    _assert_page(client, engine, "/api/purchase-orders/", limit, 2)
+
+
+@pytest.mark.parametrize("size", (PAGE_SIZES[0], ROWS))
+def test_supplier_catalogue(client, engine, seeded, size):
+    supplier = seeded["suppliers"][size]
+    with assert_query_count(engine, 1):
+        response = client.get(f"/api/suppliers/{supplier['id']}/catalogue")
+    assert response.status_code == 200, response.text
+    assert len(response.json()) == size